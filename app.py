@@ -3,14 +3,161 @@ import os
 import io
 import csv
 import json
+import math
+import threading
 from datetime import datetime
 from flask import Flask, render_template, jsonify, request, Response
 from dotenv import load_dotenv
-from fmp_client import FMPClient
+from ath_index import AthIndex
+from budget_ledger import BudgetLedger
+from cassette import Cassette
+from fmp_client import FMPClient, DEFAULT_RATE, DEFAULT_BURST, FMP_BASE_URL
+from jobs import ScanJobManager, JobQueueFull, QUEUED, RUNNING
+from market_hours import last_session_date
+from metrics import Registry
+from price_store import PriceStore
+from rate_limiter import TokenBucket
+from reports import write_report, report_name
+from response_cache import ResponseCache
+from scan_archive import ScanArchive
+from scan_diff import diff_sorted
+from scan_planner import ScanStats
 from scanner import Scanner
 
 load_dotenv(override=True)
 
+# Concurrent FMP requests per scan; 1 runs the pipeline serially.
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", "4"))
+
+# One limiter for the whole process so concurrent scans share the rate.
+RATE_LIMITER = TokenBucket(rate=DEFAULT_RATE, burst=DEFAULT_BURST)
+
+# Local state (response cache etc.) lives under this directory.
+DEFAULT_CACHE_DIR = "cache"
+CACHE_DIR = os.getenv("SCANNER_CACHE_DIR", DEFAULT_CACHE_DIR)
+RESPONSE_CACHE = ResponseCache(os.path.join(CACHE_DIR, "responses"))
+ATH_INDEX = AthIndex(os.path.join(CACHE_DIR, "ath_index.json"))
+# A symbol whose history FMP revised (e.g. for a split) is resynced from
+# scratch, and its ATH has to be rebuilt from the new history too.
+PRICE_STORE = PriceStore(
+    os.path.join(CACHE_DIR, "prices"), on_reset=ATH_INDEX.drop
+)
+SCAN_STATS = ScanStats(os.path.join(CACHE_DIR, "scan_stats.json"))
+
+# Daily FMP quota shared by every scan and every worker process. Opened
+# on first use, so importing the app creates no files.
+BUDGET_LEDGER = None
+_LEDGER_LOCK = threading.Lock()
+
+
+def budget_ledger() -> BudgetLedger:
+    """The process-wide budget ledger, opened on first call."""
+    global BUDGET_LEDGER
+    with _LEDGER_LOCK:
+        if BUDGET_LEDGER is None:
+            BUDGET_LEDGER = BudgetLedger(
+                os.path.join(CACHE_DIR, "budget.sqlite"),
+                daily_limit=int(os.getenv("FMP_DAILY_LIMIT", "250")),
+            )
+        return BUDGET_LEDGER
+
+# Optionally record FMP traffic to, or replay it from, a cassette file
+# (FMP_CASSETTE_MODE is "record" or "replay") for offline benchmarks.
+CASSETTE = (
+    Cassette(
+        os.getenv("FMP_CASSETTE"),
+        mode=os.getenv("FMP_CASSETTE_MODE", "replay"),
+        latency_scale=float(os.getenv("FMP_CASSETTE_LATENCY", "0")),
+    )
+    if os.getenv("FMP_CASSETTE") else None
+)
+
+
+def require_own_cache_dir(reason: str, cache_dir: str = None):
+    """Refuse to run traffic that is not live FMP data against the default
+    cache directory, where its responses, bars and ATHs would be taken as
+    fresh by later live scans.
+
+    Raises RuntimeError unless SCANNER_CACHE_DIR points somewhere else.
+    """
+    cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+    if os.path.abspath(cache_dir) == os.path.abspath(DEFAULT_CACHE_DIR):
+        raise RuntimeError(
+            f"{reason} needs its own SCANNER_CACHE_DIR, separate from "
+            f"{DEFAULT_CACHE_DIR}/"
+        )
+
+
+# FMP itself, or a stand-in such as fake_fmp_server.py
+BASE_URL = os.getenv("FMP_BASE_URL", FMP_BASE_URL)
+
+if CASSETTE is not None and CASSETTE.replaying:
+    require_own_cache_dir("Replaying an FMP cassette")
+if BASE_URL.rstrip("/") != FMP_BASE_URL:
+    # Also keeps fake calls off the real key's daily ledger
+    require_own_cache_dir(f"FMP_BASE_URL={BASE_URL}")
+
+# Reports are saved as pretty JSON, or as gzipped columns with
+# REPORT_FORMAT=compact. Every saved report is also indexed in the scan
+# archive for history queries; like the ledger, it is opened on first use.
+OUTPUT_DIR = "output"
+REPORT_FORMAT = os.getenv("REPORT_FORMAT", "json")
+SCAN_ARCHIVE = None
+_ARCHIVE_LOCK = threading.Lock()
+
+
+def scan_archive() -> ScanArchive:
+    """The process-wide scan archive, opened (and migrated) on first call."""
+    global SCAN_ARCHIVE
+    with _ARCHIVE_LOCK:
+        if SCAN_ARCHIVE is None:
+            SCAN_ARCHIVE = ScanArchive(os.getenv(
+                "SCAN_ARCHIVE",
+                os.path.join(OUTPUT_DIR, "scan_archive.sqlite"),
+            ))
+        return SCAN_ARCHIVE
+
+# Most calls one scan may spend, if that much of the daily quota is left.
+SCAN_CALL_BUDGET = 200
+
+# Scans run in the background; at most this many may be queued or running.
+MAX_PENDING_SCANS = int(os.getenv("MAX_PENDING_SCANS", "4"))
+
+# Seconds between keepalive comments on idle event streams
+SSE_KEEPALIVE = 15
+
+# Seconds a completed scan is reused for identical settings, as long as
+# no market session has closed since (0 disables the cache).
+SCAN_RESULT_TTL = int(os.getenv("SCAN_RESULT_TTL", "3600"))
+
+DEFAULT_CONFIG = {
+    "market_cap_min": 1_000_000_000,
+    "volume_min": 500_000,
+    "ath_min": 10.0,
+    "ath_max": 60.0,
+    "top_n": 15,
+}
+
+
+def normalize_config(overrides: dict) -> dict:
+    """DEFAULT_CONFIG with known overrides coerced to the defaults' types,
+    so equivalent requests ("15", 15, 15.0) share one scan and cache key.
+
+    Raises ValueError for a value that is not a finite number.
+    """
+    config = dict(DEFAULT_CONFIG)
+    for key, value in overrides.items():
+        if key not in config:
+            continue
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            number = math.nan
+        if not math.isfinite(number):
+            raise ValueError(f"Invalid value for {key}: {value!r}")
+        config[key] = int(number) if isinstance(config[key], int) else number
+    return config
+
 
 def create_app(testing=False):
     app = Flask(__name__)
@@ -19,10 +166,154 @@ def create_app(testing=False):
     # Store latest scan results in memory for CSV download
     app.latest_scan = None
 
+    app.metrics = metrics = Registry()
+    scans_started = metrics.counter(
+        "scanner_scans_started_total", "Scans that began running."
+    )
+    scans_finished = metrics.counter(
+        "scanner_scans_finished_total",
+        "Scans that ended, by final status.", labels=("status",),
+    )
+    scan_duration = metrics.histogram(
+        "scanner_scan_duration_seconds", "Run time of scans that started."
+    )
+    fmp_calls = metrics.counter(
+        "scanner_fmp_calls_total",
+        "FMP API requests, by endpoint and response status.",
+        labels=("endpoint", "status"),
+    )
+    csv_downloads = metrics.counter(
+        "scanner_csv_downloads_total", "CSV exports served."
+    )
+    scan_requests = metrics.counter(
+        "scanner_scan_requests_total",
+        "Scan requests, by whether they started a scan, joined one in "
+        "flight or were served from the result cache.",
+        labels=("outcome",),
+    )
+
     @app.route("/")
     def index():
         return render_template("index.html")
 
+    def execute_scan(job):
+        """Run one scan job on the background executor."""
+        api_key = os.getenv("FMP_API_KEY")
+        ledger = budget_ledger()
+        # Plan the scan around what is really left of today's quota
+        call_budget = min(SCAN_CALL_BUDGET, ledger.remaining(api_key))
+        client = FMPClient(
+            api_key=api_key,
+            call_budget=call_budget,
+            rate_limiter=RATE_LIMITER,
+            cache=RESPONSE_CACHE,
+            cancel_event=job.cancel_event,
+            ledger=ledger,
+            cassette=CASSETTE,
+            base_url=BASE_URL,
+            on_call=lambda endpoint, status: fmp_calls.inc(
+                endpoint=endpoint, status=status
+            ),
+        )
+        scans_started.inc()
+        try:
+            scanner = Scanner(
+                client=client,
+                config=job.config,
+                max_workers=SCAN_WORKERS,
+                price_store=PRICE_STORE,
+                ath_index=ATH_INDEX,
+                stats=SCAN_STATS,
+            )
+
+            def on_progress(message):
+                job.report_progress(
+                    message,
+                    calls_made=client.calls_made,
+                    call_budget=client.call_budget,
+                )
+
+            results = scanner.run_scan(
+                progress_callback=on_progress,
+                leaderboard_callback=job.update_leaderboard,
+            )
+        finally:
+            client.close()
+
+        results["scan_metadata"]["daily_budget_remaining"] = (
+            ledger.remaining(api_key)
+        )
+        # Partial results would hide the full scan a retry could give
+        job.cacheable = "budget_warning" not in results["scan_metadata"]
+        app.latest_scan = results
+        _save_report(results)
+        return results
+
+    def scan_finished(job):
+        scans_finished.inc(status=job.status)
+        if job.started_at is not None:
+            scan_duration.observe(job.finished_at - job.started_at)
+
+    app.scan_jobs = ScanJobManager(
+        execute_scan, max_pending=MAX_PENDING_SCANS,
+        on_finish=scan_finished, result_ttl=SCAN_RESULT_TTL,
+        freshness=lambda: last_session_date().isoformat(),
+    )
+
+    # Everything below is read from its owner only when /metrics is scraped
+    def jobs_by_status():
+        jobs = app.scan_jobs.active_jobs()
+        return {
+            (status,): sum(j.status == status for j in jobs)
+            for status in (QUEUED, RUNNING)
+        }
+
+    def running_jobs_total(field):
+        return lambda: sum(
+            getattr(j, field) or 0 for j in app.scan_jobs.active_jobs()
+        )
+
+    metrics.gauge(
+        "scanner_scan_jobs_in_flight", "Scan jobs queued or running.",
+        labels=("status",), callback=jobs_by_status,
+    )
+    metrics.gauge(
+        "scanner_scan_calls_made",
+        "FMP calls made so far by the scans in flight.",
+        callback=running_jobs_total("calls_made"),
+    )
+    metrics.gauge(
+        "scanner_scan_call_budget",
+        "Combined call budget of the scans in flight.",
+        callback=running_jobs_total("call_budget"),
+    )
+    metrics.gauge(
+        "scanner_fmp_daily_budget_remaining",
+        "FMP calls left today on the shared daily quota.",
+        callback=lambda: budget_ledger().remaining(os.getenv("FMP_API_KEY")),
+    )
+    metrics.gauge(
+        "scanner_fmp_daily_limit", "FMP calls allowed per day.",
+        callback=lambda: budget_ledger().daily_limit,
+    )
+    metrics.gauge(
+        "scanner_response_cache_hit_ratio",
+        "Share of response cache lookups that were hits.",
+        callback=lambda: RESPONSE_CACHE.stats()["hit_ratio"],
+    )
+    metrics.counter(
+        "scanner_response_cache_lookups_total",
+        "Response cache lookups, by result.", labels=("result",),
+        callback=lambda: {
+            ("hit",): RESPONSE_CACHE.hits, ("miss",): RESPONSE_CACHE.misses,
+        },
+    )
+    metrics.counter(
+        "scanner_rate_limit_wait_seconds_total",
+        "Time spent waiting on the shared FMP rate limiter.",
+        callback=lambda: RATE_LIMITER.wait_seconds,
+    )
+
     @app.route("/api/scan", methods=["POST"])
     def run_scan():
         api_key = os.getenv("FMP_API_KEY")
@@ -31,37 +322,176 @@ def create_app(testing=False):
                 "error": "FMP API key not configured. Add your key to the .env file."
             }), 400
 
+        overrides = request.json if request.is_json and request.json else {}
+        try:
+            config = normalize_config(overrides)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
         try:
-            config = {
-                "market_cap_min": 1_000_000_000,
-                "volume_min": 500_000,
-                "ath_min": 10.0,
-                "ath_max": 60.0,
-                "top_n": 15,
-            }
-            if request.is_json and request.json:
-                config.update({
-                    k: v for k, v in request.json.items() if k in config
-                })
-
-            client = FMPClient(api_key=api_key)
-            scanner = Scanner(client=client, config=config)
-            results = scanner.run_scan()
-
-            app.latest_scan = results
-            _save_report(results)
-
-            return jsonify(results)
-
-        except Exception as e:
-            return jsonify({"error": str(e)}), 500
+            job, created = app.scan_jobs.submit(config)
+        except JobQueueFull as e:
+            return jsonify({"error": str(e)}), 429
+
+        cached = job.done and not created
+        if cached:
+            app.latest_scan = job.result
+        scan_requests.inc(
+            outcome="cached" if cached else "joined" if not created
+            else "started"
+        )
+        return jsonify({
+            "job_id": job.id,
+            "status": job.status,
+            "duplicate": not created,
+            "cached": cached,
+            "data_age_seconds": (
+                round(app.scan_jobs.data_age(job), 1) if cached else None
+            ),
+        }), 200 if cached else 202
+
+    @app.route("/api/scan/<job_id>", methods=["GET"])
+    def scan_status(job_id):
+        job = app.scan_jobs.get(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown scan job"}), 404
+        return jsonify({
+            **job.to_dict(),
+            "data_age_seconds": app.scan_jobs.data_age(job),
+        })
+
+    @app.route("/api/scan/<job_id>/events")
+    def scan_events(job_id):
+        """Server-Sent Events stream of a job's progress and leaderboard."""
+        job = app.scan_jobs.get(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown scan job"}), 404
+        last_id = request.headers.get("Last-Event-ID", type=int) or 0
+
+        def stream():
+            nonlocal last_id
+            while True:
+                events = job.events_since(last_id, timeout=SSE_KEEPALIVE)
+                if not events:
+                    yield ": keepalive\n\n"
+                    continue
+                for event in events:
+                    last_id = event["id"]
+                    yield (
+                        f"id: {event['id']}\n"
+                        f"event: {event['event']}\n"
+                        f"data: {json.dumps(event['data'])}\n\n"
+                    )
+                    if event["event"] in ("done", "error"):
+                        return
+
+        return Response(
+            stream(),
+            mimetype="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no",
+            },
+        )
+
+    @app.route("/api/scan/<job_id>", methods=["DELETE"])
+    def cancel_scan(job_id):
+        job = app.scan_jobs.cancel(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown scan job"}), 404
+        # Others joined this scan: it keeps running for them
+        return jsonify({
+            **job.to_dict(),
+            "detached": not job.cancel_event.is_set(),
+        })
+
+    @app.route("/api/budget")
+    def budget():
+        """Today's FMP quota usage, shared across all scans."""
+        return jsonify(budget_ledger().status(os.getenv("FMP_API_KEY")))
+
+    @app.route("/api/scans")
+    def list_scans():
+        """Archived scans, newest first."""
+        return jsonify(scan_archive().list_scans(
+            since=request.args.get("since"),
+            until=request.args.get("until"),
+            limit=request.args.get("limit", 100, type=int),
+        ))
+
+    @app.route("/api/scans/<int:scan_id>")
+    def archived_scan(scan_id):
+        result = scan_archive().get_scan(scan_id)
+        if result is None:
+            return jsonify({"error": "Unknown scan"}), 404
+        return jsonify(result)
+
+    @app.route("/api/history")
+    def history():
+        """Archived stock rows by symbol, sector and score band."""
+        args = request.args
+        return jsonify(scan_archive().history(
+            symbol=args.get("symbol"),
+            sector=args.get("sector"),
+            min_score=args.get("min_score", type=float),
+            max_score=args.get("max_score", type=float),
+            since=args.get("since"),
+            until=args.get("until"),
+            limit=args.get("limit", 1000, type=int),
+        ))
+
+    @app.route("/api/diff")
+    def scan_diff():
+        """What changed between two archived scans. to defaults to the
+        latest scan and from to the previous scan with the same config."""
+        archive = scan_archive()
+        new_id = request.args.get("to", type=int)
+        if new_id is None:
+            new_id = archive.latest_scan_id()
+        old_id = request.args.get("from", type=int)
+        if old_id is None and new_id is not None:
+            old_id = archive.previous_scan_id(new_id)
+        old = archive.scan_info(old_id) if old_id is not None else None
+        new = archive.scan_info(new_id) if new_id is not None else None
+        if old is None or new is None:
+            return jsonify(
+                {"error": "Need two archived scans to compare"}
+            ), 404
+        return jsonify({
+            "from": old,
+            "to": new,
+            **diff_sorted(
+                archive.ranked_stocks(old_id),
+                archive.ranked_stocks(new_id),
+            ),
+        })
+
+    @app.route("/metrics")
+    def prometheus_metrics():
+        """Counters and gauges in the Prometheus text format."""
+        return Response(
+            metrics.render(),
+            mimetype="text/plain; version=0.0.4; charset=utf-8",
+        )
 
     @app.route("/api/csv")
     def download_csv():
         if not app.latest_scan:
             return jsonify({"error": "No scan data available. Run a scan first."}), 400
+        return csv_response(app.latest_scan)
 
-        stocks = app.latest_scan.get("stocks", [])
+    @app.route("/api/scan/<job_id>/csv")
+    def download_job_csv(job_id):
+        """The CSV of one job, whichever scan finished last."""
+        job = app.scan_jobs.get(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown scan job"}), 404
+        if job.status != "completed":
+            return jsonify({"error": "Scan has not completed"}), 409
+        return csv_response(job.result)
+
+    def csv_response(results: dict):
+        stocks = results.get("stocks", [])
         output = io.StringIO()
         writer = csv.writer(output)
         writer.writerow([
@@ -86,6 +516,7 @@ def create_app(testing=False):
                 stock.get("score", ""),
             ])
 
+        csv_downloads.inc()
         return Response(
             output.getvalue(),
             mimetype="text/csv",
@@ -99,12 +530,15 @@ def create_app(testing=False):
 
 
 def _save_report(results: dict):
-    """Save scan results as JSON to output directory."""
-    os.makedirs("output", exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filepath = f"output/scan_{timestamp}.json"
-    with open(filepath, "w") as f:
-        json.dump(results, f, indent=2)
+    """Save scan results to the output directory and archive them.
+
+    The archive id is added to the results' scan_metadata, so the page
+    can ask for the diff of exactly this scan.
+    """
+    path = write_report(results, OUTPUT_DIR, REPORT_FORMAT)
+    results["scan_metadata"]["scan_id"] = scan_archive().add_scan(
+        results, source=report_name(path)
+    )
 
 
 if __name__ == "__main__":
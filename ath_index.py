@@ -0,0 +1,185 @@
+"""Persisted running all-time-high per symbol."""
+import json
+import os
+import threading
+from datetime import date
+import numpy as np
+import file_lock
+from market_hours import last_session_date
+
+
+class AthIndex:
+    """Maps symbol -> ATH value, ATH date and last bar date seen.
+
+    Entries are updated incrementally: only bars newer than the last bar
+    already folded in are looked at. When an entry has been synced through
+    the last completed session the scanner can use its ATH directly
+    without touching price history.
+
+    Entries built from a PriceStore remember the store's version() of the
+    symbol's history; once another process drops and rebuilds that
+    history, the stale entry is rebuilt from scratch instead of extended.
+
+    Changes are kept in memory until save() is called, which merges them
+    into the file under a lock, so processes sharing it only overwrite the
+    symbols they changed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = None
+        self._changed = set()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _load(self) -> dict:
+        if self._entries is None:
+            self._entries = self._read()
+        return self._entries
+
+    def get(self, symbol: str) -> dict | None:
+        with self._lock:
+            entry = self._load().get(symbol)
+            return dict(entry) if entry else None
+
+    def is_fresh(self, symbol: str, as_of: date = None) -> bool:
+        """True if the entry covers every session up to as_of."""
+        as_of = as_of or last_session_date()
+        entry = self.get(symbol)
+        return (
+            entry is not None
+            and entry.get("synced_through") is not None
+            and entry["synced_through"] >= as_of.isoformat()
+        )
+
+    def update(
+        self, symbol: str, bars: list[dict], synced_through: str = None
+    ) -> dict | None:
+        """Fold new bars into the symbol's running ATH and return the entry.
+
+        Bars at or before the entry's last_date are skipped, so passing the
+        full history again is harmless.
+        """
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(symbol)
+            last = entry["last_date"] if entry else None
+            for bar in bars:
+                day = bar.get("date")
+                if last is not None and (not day or day <= last):
+                    continue
+                high = bar.get("high")
+                if high is None:
+                    continue
+                if entry is None:
+                    entry = {"ath": high, "ath_date": day, "last_date": None,
+                             "synced_through": None}
+                elif high > entry["ath"]:
+                    entry["ath"] = high
+                    entry["ath_date"] = day
+                if day and (entry["last_date"] is None
+                            or day > entry["last_date"]):
+                    entry["last_date"] = day
+            if entry is None:
+                return None
+            if synced_through:
+                entry["synced_through"] = synced_through
+            entries[symbol] = entry
+            self._changed.add(symbol)
+            return dict(entry)
+
+    def update_columns(
+        self, symbol: str, dates: np.ndarray, highs: np.ndarray,
+        synced_through: str = None, version: str = None,
+    ) -> dict | None:
+        """update() for column arrays (oldest first), e.g. PriceStore
+        views. NaN highs are skipped.
+
+        version is the store's version() of the history; an entry built
+        from another version is discarded and rebuilt from these columns.
+        """
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        highs = np.asarray(highs, dtype=float)
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(symbol)
+            if (
+                entry is not None and version is not None
+                and entry.get("version") != version
+            ):
+                entry = None
+            if entry is not None and entry["last_date"] is not None:
+                newer = dates > np.datetime64(entry["last_date"])
+                dates, highs = dates[newer], highs[newer]
+            valid = ~np.isnan(highs)
+            if valid.any():
+                # First occurrence of the max, like update()
+                i = int(np.flatnonzero(valid)[np.argmax(highs[valid])])
+                high, day = float(highs[i]), str(dates[i])
+                if entry is None:
+                    entry = {"ath": high, "ath_date": day,
+                             "last_date": None, "synced_through": None}
+                elif high > entry["ath"]:
+                    entry["ath"] = high
+                    entry["ath_date"] = day
+                last = str(dates[valid].max())
+                if entry["last_date"] is None or last > entry["last_date"]:
+                    entry["last_date"] = last
+            if entry is None:
+                return None
+            if synced_through:
+                entry["synced_through"] = synced_through
+            if version is not None:
+                entry["version"] = version
+            entries[symbol] = entry
+            self._changed.add(symbol)
+            return dict(entry)
+
+    def drop(self, symbol: str):
+        """Forget a symbol, e.g. after its history was revised."""
+        with self._lock:
+            if self._load().pop(symbol, None) is not None:
+                self._changed.add(symbol)
+
+    def save(self):
+        """Merge this process's changes into the file, if there are any.
+
+        Symbols changed elsewhere since the file was read are picked up.
+        """
+        with self._lock:
+            if not self._changed:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            fd = file_lock.open_lock_file(f"{self.path}.lock")
+            try:
+                file_lock.lock(fd)
+                try:
+                    entries = self._read()
+                    for symbol in self._changed:
+                        entry = self._entries.get(symbol)
+                        if entry is None:
+                            entries.pop(symbol, None)
+                        else:
+                            entries[symbol] = entry
+                    tmp = f"{self.path}.tmp"
+                    with open(tmp, "w") as f:
+                        json.dump(entries, f, separators=(",", ":"))
+                    os.replace(tmp, self.path)
+                finally:
+                    file_lock.unlock(fd)
+            finally:
+                os.close(fd)
+            self._entries = entries
+            self._changed = set()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._load())
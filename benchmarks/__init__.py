@@ -0,0 +1 @@
+"""Performance benchmarks (run with python -m benchmarks.scan_bench)."""
@@ -0,0 +1,351 @@
+"""End-to-end Scanner benchmarks against synthetic or replayed FMP data.
+
+Run from the repository root:
+
+    python -m benchmarks.scan_bench run --sizes 100,1000,10000
+    python -m benchmarks.scan_bench compare base.json new.json
+
+``run`` starts fake_fmp_server in a subprocess for each universe size
+(or replays a cassette with --cassette), scans it with the real Scanner
+and FMPClient, and writes one JSON file of results. ``compare`` prints
+the change of every metric between two such files and exits with 1 if
+any got worse by more than --threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+from ath_index import AthIndex
+from cassette import Cassette
+from fake_fmp_server import synthetic_universe
+from fmp_client import FMPClient
+from price_store import PriceStore
+from rate_limiter import TokenBucket
+from response_cache import ResponseCache
+from scanner import Scanner
+from stock_universe import SP500
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+
+DEFAULT_SIZES = (100, 1000, 10000)
+
+# Metrics compared between runs; all of them are better when lower.
+COMPARED = ("wall_seconds", "api_calls", "bytes_received",
+            "peak_memory_bytes")
+
+DEFAULT_THRESHOLD = 0.10
+
+# Effectively unthrottled, so wall time measures the scanner itself.
+UNLIMITED_RATE = 1e6
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class FakeServerProcess:
+    """fake_fmp_server.py in a subprocess, so its work and memory stay
+    out of the measurements."""
+
+    def __init__(self, symbols: int, latency: float = 0.0,
+                 jitter: float = 0.0, seed: int = 0):
+        self.args = [
+            sys.executable, str(ROOT / "fake_fmp_server.py"),
+            "--port", "0", "--symbols", str(symbols),
+            "--latency", str(latency), "--jitter", str(jitter),
+            "--seed", str(seed),
+        ]
+        self.proc = None
+        self.base_url = None
+
+    def __enter__(self):
+        self.proc = subprocess.Popen(
+            self.args, stdout=subprocess.PIPE, text=True, cwd=ROOT
+        )
+        line = self.proc.stdout.readline()
+        self.base_url = line.rsplit(" ", 1)[-1].strip()
+        return self
+
+    def __exit__(self, *exc):
+        self.proc.terminate()
+        self.proc.wait(10)
+
+    def stats(self) -> dict:
+        url = self.base_url.replace("/stable", "/_stats")
+        return requests.get(url, timeout=10).json()
+
+
+def _timed_scan(scanner: Scanner) -> tuple[dict, dict]:
+    """Run a scan; stage times come from the scan's own metadata."""
+    start = time.perf_counter()
+    result = scanner.run_scan()
+    wall = time.perf_counter() - start
+    return result, {
+        "wall_seconds": round(wall, 4),
+        "stages": result["scan_metadata"]["stage_seconds"],
+    }
+
+
+def _make_scanner(client, universe, workers, state_dir):
+    kwargs = {}
+    if state_dir is not None:
+        ath_index = AthIndex(os.path.join(state_dir, "ath.json"))
+        kwargs = {
+            "price_store": PriceStore(
+                os.path.join(state_dir, "prices"), on_reset=ath_index.drop
+            ),
+            "ath_index": ath_index,
+        }
+    return Scanner(client, max_workers=workers, universe=universe, **kwargs)
+
+
+def run_case(
+    name: str, client_factory, universe: list[dict], workers: int,
+    repeat: int, warm: bool, server: FakeServerProcess = None,
+) -> dict:
+    """Benchmark one scenario; wall and stage times are medians."""
+    timings = []
+    with tempfile.TemporaryDirectory() as state_dir:
+        cache_dir = os.path.join(state_dir, "responses") if warm else None
+        state = state_dir if warm else None
+        if warm:
+            # Fill the local stores once; the timed runs are repeat scans.
+            with client_factory(cache_dir) as client:
+                _make_scanner(client, universe, workers, state).run_scan()
+
+        before = server.stats() if server else None
+        for _ in range(repeat):
+            with client_factory(cache_dir) as client:
+                result, timing = _timed_scan(
+                    _make_scanner(client, universe, workers, state)
+                )
+                timing["api_calls"] = client.calls_made
+            timings.append(timing)
+        after = server.stats() if server else None
+
+        # Memory is measured on a separate run: tracemalloc slows the
+        # interpreter down too much to time the same scan.
+        with client_factory(cache_dir) as client:
+            scanner = _make_scanner(client, universe, workers, state)
+            tracemalloc.start()
+            try:
+                scanner.run_scan()
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+    meta = result["scan_metadata"]
+    bytes_received = None
+    if before is not None:
+        sent = after["bytes_sent"] - before["bytes_sent"]
+        bytes_received = sent // repeat
+    return {
+        "name": name,
+        "symbols": len(universe),
+        "workers": workers,
+        "warm": warm,
+        "repeat": repeat,
+        "wall_seconds": statistics.median(
+            t["wall_seconds"] for t in timings
+        ),
+        "stages": {
+            stage: statistics.median(
+                t["stages"].get(stage, 0.0) for t in timings
+            )
+            for stage in timings[0]["stages"]
+        },
+        "api_calls": statistics.median_low(
+            t["api_calls"] for t in timings
+        ),
+        "bytes_received": bytes_received,
+        "peak_memory_bytes": peak,
+        "candidates": meta["total_candidates"],
+        "passed_filters": meta["passed_filters"],
+        "stocks": len(result["stocks"]),
+    }
+
+
+def _client_factory(budget: int, **kwargs):
+    def make(cache_dir):
+        return FMPClient(
+            api_key="benchmark",
+            call_budget=budget,
+            rate_limiter=TokenBucket(rate=UNLIMITED_RATE, burst=1000),
+            cache=ResponseCache(cache_dir) if cache_dir else None,
+            **kwargs,
+        )
+    return make
+
+
+def run(args) -> dict:
+    results = []
+    modes = [False, True] if args.warm else [False]
+    if args.cassette:
+        factory = _client_factory(
+            args.budget,
+            cassette=Cassette(args.cassette, latency_scale=args.latency),
+        )
+        for warm in modes:
+            name = f"replay-{Path(args.cassette).stem}" + (
+                "-warm" if warm else ""
+            )
+            print(f"  {name}...", file=sys.stderr, flush=True)
+            results.append(run_case(
+                name, factory, list(SP500), args.workers, args.repeat, warm
+            ))
+    else:
+        for size in args.sizes:
+            universe = synthetic_universe(size)
+            with FakeServerProcess(
+                size, latency=args.latency, jitter=args.jitter
+            ) as server:
+                factory = _client_factory(
+                    args.budget, base_url=server.base_url
+                )
+                for warm in modes:
+                    name = f"synthetic-{size}" + ("-warm" if warm else "")
+                    print(f"  {name}...", file=sys.stderr, flush=True)
+                    results.append(run_case(
+                        name, factory, universe, args.workers, args.repeat,
+                        warm, server=server,
+                    ))
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "workers": args.workers,
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "budget": args.budget,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(base: dict, new: dict, threshold: float) -> list[dict]:
+    """Per benchmark and metric: old, new, relative change and whether it
+    regressed by more than threshold."""
+    rows = []
+    old_by_name = {r["name"]: r for r in base["results"]}
+    for result in new["results"]:
+        old = old_by_name.get(result["name"])
+        if old is None:
+            continue
+        for metric in COMPARED:
+            before, after = old.get(metric), result.get(metric)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before if before else (
+                0.0 if after == before else float("inf")
+            )
+            rows.append({
+                "name": result["name"],
+                "metric": metric,
+                "old": before,
+                "new": after,
+                "change": change,
+                "regressed": change > threshold,
+            })
+    return rows
+
+
+def _print_run(report: dict):
+    print(f"{'benchmark':<24}{'wall s':>9}{'calls':>8}{'MB recv':>9}"
+          f"{'peak MB':>9}{'stocks':>8}")
+    for r in report["results"]:
+        recv = (f"{r['bytes_received'] / 1e6:.2f}"
+                if r["bytes_received"] is not None else "-")
+        print(f"{r['name']:<24}{r['wall_seconds']:>9.3f}"
+              f"{r['api_calls']:>8}{recv:>9}"
+              f"{r['peak_memory_bytes'] / 1e6:>9.1f}{r['stocks']:>8}")
+
+
+def _print_compare(rows: list[dict], threshold: float):
+    print(f"{'benchmark':<24}{'metric':<20}{'old':>12}{'new':>12}"
+          f"{'change':>9}")
+    for row in rows:
+        flag = "  REGRESSION" if row["regressed"] else ""
+        print(f"{row['name']:<24}{row['metric']:<20}{row['old']:>12}"
+              f"{row['new']:>12}{row['change']:>+9.1%}{flag}")
+    bad = sum(row["regressed"] for row in rows)
+    print(f"\n{bad} regression(s) over {threshold:.0%}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark Scanner.run_scan end to end."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_p = sub.add_parser("run", help="run benchmarks and write JSON")
+    run_p.add_argument(
+        "--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+        type=lambda v: [int(x) for x in v.split(",")],
+        help="synthetic universe sizes (default: %(default)s)",
+    )
+    run_p.add_argument("--cassette",
+                       help="replay this cassette instead of the fake server")
+    run_p.add_argument("--workers", type=int, default=4)
+    run_p.add_argument("--latency", type=float, default=0.0,
+                       help="server latency in seconds, or the latency "
+                            "scale when replaying")
+    run_p.add_argument("--jitter", type=float, default=0.0)
+    run_p.add_argument("--budget", type=int, default=100_000)
+    run_p.add_argument("--repeat", type=int, default=3)
+    run_p.add_argument("--warm", action="store_true",
+                       help="also time repeat scans with warm local stores")
+    run_p.add_argument("--output", help="JSON file to write "
+                       "(default: benchmarks/results/<commit>.json)")
+
+    cmp_p = sub.add_parser("compare", help="compare two result files")
+    cmp_p.add_argument("base")
+    cmp_p.add_argument("new")
+    cmp_p.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                       help="allowed relative increase (default: "
+                            "%(default)s)")
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        rows = compare(base, new, args.threshold)
+        _print_compare(rows, args.threshold)
+        return 1 if any(row["regressed"] for row in rows) else 0
+
+    report = run(args)
+    output = args.output or str(
+        RESULTS_DIR / f"{report['commit'] or 'local'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    _print_run(report)
+    print(f"\nWrote {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
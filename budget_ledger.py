@@ -0,0 +1,120 @@
+"""Daily FMP call quota shared by every process using the same API key."""
+import hashlib
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# FMP free tier allows 250 calls per UTC day.
+DAILY_LIMIT = 250
+
+
+class BudgetLedger:
+    """SQLite ledger of API calls made per API key and UTC day.
+
+    Every FMPClient (in any thread or process) that shares the ledger file
+    reserves each call here before making it, so concurrent scans and
+    gunicorn workers can't jointly exceed the daily quota. Reservations
+    run in a ``BEGIN IMMEDIATE`` transaction, which SQLite serialises
+    across processes. API keys are stored hashed.
+    """
+
+    def __init__(
+        self, path: str, daily_limit: int = DAILY_LIMIT, clock=None,
+    ):
+        self.path = path
+        self.daily_limit = daily_limit
+        self._clock = clock or (lambda: datetime.now(timezone.utc))
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS usage ("
+                " key_hash TEXT NOT NULL,"
+                " day TEXT NOT NULL,"
+                " used INTEGER NOT NULL DEFAULT 0,"
+                " exhausted INTEGER NOT NULL DEFAULT 0,"
+                " PRIMARY KEY (key_hash, day))"
+            )
+
+    @contextmanager
+    def _connect(self):
+        # Autocommit mode; reserve() opens its own transaction.
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _hash(api_key: str) -> str:
+        return hashlib.sha256((api_key or "").encode()).hexdigest()[:32]
+
+    def today(self) -> str:
+        """Current UTC day, which is when FMP resets the quota."""
+        return self._clock().astimezone(timezone.utc).date().isoformat()
+
+    def _row(self, conn, key_hash: str, day: str) -> tuple[int, bool]:
+        row = conn.execute(
+            "SELECT used, exhausted FROM usage WHERE key_hash = ? AND day = ?",
+            (key_hash, day),
+        ).fetchone()
+        return (row[0], bool(row[1])) if row else (0, False)
+
+    def reserve(self, api_key: str, calls: int = 1) -> bool:
+        """Claim calls from today's quota. False if not enough is left."""
+        key_hash, day = self._hash(api_key), self.today()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            used, exhausted = self._row(conn, key_hash, day)
+            if exhausted or used + calls > self.daily_limit:
+                conn.execute("ROLLBACK")
+                return False
+            conn.execute(
+                "INSERT INTO usage (key_hash, day, used) VALUES (?, ?, ?) "
+                "ON CONFLICT (key_hash, day) DO UPDATE "
+                "SET used = used + excluded.used",
+                (key_hash, day, calls),
+            )
+            conn.execute("COMMIT")
+            return True
+
+    def release(self, api_key: str, calls: int = 1):
+        """Hand back reserved calls that were never made."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE usage SET used = MAX(0, used - ?) "
+                "WHERE key_hash = ? AND day = ?",
+                (calls, self._hash(api_key), self.today()),
+            )
+
+    def mark_exhausted(self, api_key: str):
+        """Record that FMP refused a call (429): nothing is left today."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO usage (key_hash, day, exhausted) "
+                "VALUES (?, ?, 1) ON CONFLICT (key_hash, day) "
+                "DO UPDATE SET exhausted = 1",
+                (self._hash(api_key), self.today()),
+            )
+
+    def used(self, api_key: str) -> int:
+        with self._connect() as conn:
+            return self._row(conn, self._hash(api_key), self.today())[0]
+
+    def remaining(self, api_key: str) -> int:
+        """Calls still available today for this key."""
+        return self.status(api_key)["remaining"]
+
+    def status(self, api_key: str) -> dict:
+        """Today's usage, for the UI and /api/budget."""
+        day = self.today()
+        with self._connect() as conn:
+            used, exhausted = self._row(conn, self._hash(api_key), day)
+        return {
+            "day": day,
+            "daily_limit": self.daily_limit,
+            "used": used,
+            "remaining": 0 if exhausted else max(0, self.daily_limit - used),
+        }
@@ -0,0 +1,105 @@
+"""Record FMP responses to a file and replay them without the network."""
+import gzip
+import json
+import os
+import threading
+import time
+from collections import deque
+from response_cache import ResponseCache
+
+RECORD = "record"
+REPLAY = "replay"
+
+
+class CassetteMiss(KeyError):
+    """Raised on replay for a request the cassette never recorded."""
+    pass
+
+
+class Cassette:
+    """Gzipped JSON-lines log of FMP requests and responses.
+
+    In record mode every request FMPClient sends is appended with its
+    status, body and how long it took. In replay mode the same requests
+    are answered from the file: repeats of one request are served in the
+    order they were recorded, and the last one is reused once they run
+    out. latency_scale sleeps for the recorded time multiplied by that
+    factor (0 answers at once, 1 matches the original run).
+
+    The API key is never written. Each record is its own gzip member, so
+    a cassette being recorded is always readable. Safe to share between
+    threads.
+    """
+
+    def __init__(
+        self, path: str, mode: str = REPLAY, latency_scale: float = 0.0,
+        sleep=time.sleep,
+    ):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._entries = None  # key -> deque of recorded responses
+        self.recorded = 0
+        self.played = 0
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    def record(
+        self, endpoint: str, params: dict, status: int, body,
+        elapsed: float,
+    ):
+        """Append one request and its response."""
+        line = json.dumps(
+            {
+                "endpoint": endpoint,
+                "params": {
+                    k: v for k, v in params.items() if k != "apikey"
+                },
+                "status": status,
+                "body": body,
+                "elapsed": round(elapsed, 4),
+            },
+            separators=(",", ":"),
+            default=str,
+        )
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with gzip.open(self.path, "at") as f:
+                f.write(line + "\n")
+            self.recorded += 1
+
+    def _load(self) -> dict:
+        if self._entries is None:
+            self._entries = {}
+            with gzip.open(self.path, "rt") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    key = ResponseCache.make_key(
+                        entry["endpoint"], entry["params"]
+                    )
+                    self._entries.setdefault(key, deque()).append(entry)
+        return self._entries
+
+    def play(self, endpoint: str, params: dict) -> tuple[int, object]:
+        """Recorded (status, body) for a request, after any replayed
+        latency."""
+        key = ResponseCache.make_key(endpoint, params)
+        with self._lock:
+            queue = self._load().get(key)
+            if not queue:
+                raise CassetteMiss(key)
+            entry = queue.popleft() if len(queue) > 1 else queue[0]
+            self.played += 1
+        if self.latency_scale:
+            self._sleep(entry["elapsed"] * self.latency_scale)
+        return entry["status"], entry["body"]
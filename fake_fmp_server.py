@@ -0,0 +1,378 @@
+"""Local stand-in for the FMP stable API, serving synthetic market data.
+
+Run in-process with FakeFMPServer, or as a subprocess:
+
+    python fake_fmp_server.py --port 8765 --symbols 2000 --latency 0.05
+
+and point FMPClient(base_url=...) (or FMP_BASE_URL) at
+http://127.0.0.1:8765/stable.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from collections import Counter, deque
+from datetime import date, timedelta
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+from market_hours import last_session_date
+from stock_universe import SP500, SECTOR_MAP
+
+FIELDS = ("open", "high", "low", "close", "volume")
+
+# Bars generated per symbol; a little more than the 5 years scans ask for.
+HISTORY_DAYS = 1500
+
+
+def synthetic_universe(size: int = None) -> list[dict]:
+    """The S&P 500 list, padded with made-up symbols up to size.
+
+    Synthetic symbols are spread evenly over the GICS sectors. With a size
+    below the S&P 500 count the list is cut short instead.
+    """
+    if size is None or size <= len(SP500):
+        return list(SP500[:size])
+    sectors = sorted(SECTOR_MAP)
+    extra = [
+        {
+            "symbol": f"SYN{i:05d}",
+            "name": f"Synthetic {i}",
+            "sector": sectors[i % len(sectors)],
+        }
+        for i in range(size - len(SP500))
+    ]
+    return list(SP500) + extra
+
+
+def _trading_days(end: date, count: int) -> list[str]:
+    """The last count weekdays up to end, oldest first."""
+    days = []
+    day = end
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day.isoformat())
+        day -= timedelta(days=1)
+    return days[::-1]
+
+
+class SyntheticMarket:
+    """Deterministic random-walk prices for a universe of symbols.
+
+    The same seed and as_of always produce the same data, so scans against
+    the fake server are reproducible.
+    """
+
+    def __init__(
+        self, universe: list[dict] = None, seed: int = 0, as_of: date = None,
+    ):
+        self.universe = universe if universe is not None else list(SP500)
+        self.by_symbol = {s["symbol"]: s for s in self.universe}
+        self.seed = seed
+        self.as_of = as_of or last_session_date()
+        self.days = _trading_days(self.as_of, HISTORY_DAYS)
+        self._bars = lru_cache(maxsize=4096)(self._generate)
+
+    def _rng(self, *parts) -> np.random.Generator:
+        key = "|".join(str(p) for p in (self.seed, *parts))
+        return np.random.default_rng(zlib.crc32(key.encode()))
+
+    def _generate(self, symbol: str) -> dict:
+        """Column arrays (oldest first) for one symbol's history."""
+        rng = self._rng(symbol)
+        n = len(self.days)
+        start = rng.uniform(20, 400)
+        vol = rng.uniform(0.01, 0.03)
+        drift = rng.uniform(-0.0006, 0.0009)
+        base_volume = rng.uniform(3e5, 2e7)
+        close = np.maximum(
+            1.0, start * np.exp(np.cumsum(rng.normal(drift, vol, n)))
+        )
+        open_ = np.concatenate(([start], close[:-1]))
+        wick = np.abs(rng.normal(0, vol / 2, (2, n)))
+        return {
+            "open": np.round(open_, 2).tolist(),
+            "high": np.round(
+                np.maximum(open_, close) * (1 + wick[0]), 2
+            ).tolist(),
+            "low": np.round(
+                np.minimum(open_, close) * (1 - wick[1]), 2
+            ).tolist(),
+            "close": np.round(close, 2).tolist(),
+            "volume": (base_volume * rng.uniform(0.5, 1.5, n))
+            .astype(int).tolist(),
+        }
+
+    def history(
+        self, symbol: str, timeseries: int = None, from_date: str = None,
+        to_date: str = None,
+    ) -> list[dict]:
+        """Daily bars, newest first, like FMP's EOD endpoint."""
+        if symbol not in self.by_symbol:
+            return []
+        columns = self._bars(symbol)
+        indexes = range(len(self.days))
+        if from_date:
+            indexes = [
+                i for i in indexes
+                if self.days[i] >= from_date
+                and (not to_date or self.days[i] <= to_date)
+            ]
+        elif timeseries:
+            indexes = indexes[-int(timeseries):]
+        return [
+            {
+                "symbol": symbol,
+                "date": self.days[i],
+                **{field: columns[field][i] for field in FIELDS},
+            }
+            for i in reversed(indexes)
+        ]
+
+    def quote(self, symbol: str) -> dict | None:
+        stock = self.by_symbol.get(symbol)
+        if stock is None:
+            return None
+        bars = self._bars(symbol)
+        close, prev = bars["close"][-1], bars["close"][-2]
+        shares = float(self._rng(symbol, "shares").uniform(5e7, 5e9))
+        return {
+            "symbol": symbol,
+            "name": stock["name"],
+            "price": close,
+            "change": round(close - prev, 2),
+            "changePercentage": round((close / prev - 1) * 100, 4),
+            "dayLow": bars["low"][-1],
+            "dayHigh": bars["high"][-1],
+            "yearHigh": max(bars["high"][-252:]),
+            "yearLow": min(bars["low"][-252:]),
+            "volume": bars["volume"][-1],
+            "averageVolume": sum(bars["volume"][-50:]) // 50,
+            "marketCap": int(close * shares),
+            "open": bars["open"][-1],
+            "previousClose": prev,
+            "exchange": "NASDAQ" if zlib.crc32(symbol.encode()) % 2
+            else "NYSE",
+        }
+
+    def sector_performance(self, day: str) -> list[dict]:
+        """One entry per sector and exchange, like FMP's snapshot."""
+        present = {s["sector"] for s in self.universe}
+        result = []
+        for gics in sorted(present):
+            rng = self._rng("sector", gics, day)
+            for exchange in ("NASDAQ", "NYSE"):
+                result.append({
+                    "date": day,
+                    "sector": SECTOR_MAP.get(gics, gics),
+                    "exchange": exchange,
+                    "averageChange": round(float(rng.normal(0.1, 1.2)), 4),
+                })
+        return result
+
+
+class FakeFMPServer:
+    """Threaded HTTP server answering FMP stable API requests.
+
+    latency (plus up to jitter extra) seconds are slept before each
+    response. A share error_rate of requests fail with 500. After
+    daily_limit requests, or above max_per_second requests in any one
+    second, requests get FMP's 429 "Limit Reach". Requests without an
+    apikey get 401.
+
+    requests counts accepted requests per endpoint; status_counts counts
+    responses by status code. The same counters are served as JSON at
+    /_stats (not counted themselves), for a server in another process.
+    """
+
+    def __init__(
+        self, market: SyntheticMarket = None, host: str = "127.0.0.1",
+        port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+        error_rate: float = 0.0, daily_limit: int = None,
+        max_per_second: int = None, seed: int = 0,
+    ):
+        self.market = market or SyntheticMarket(seed=seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.daily_limit = daily_limit
+        self.max_per_second = max_per_second
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent = deque()
+        self.requests = Counter()
+        self.status_counts = Counter()
+        self.bytes_sent = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/stable"
+
+    def start(self) -> "FakeFMPServer":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def serve_forever(self):
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": dict(self.requests),
+                "status_counts": {
+                    str(k): v for k, v in self.status_counts.items()
+                },
+                "bytes_sent": self.bytes_sent,
+            }
+
+    def _admit(self) -> int | None:
+        """Status to fail the request with, or None to serve it."""
+        with self._lock:
+            now = time.monotonic()
+            accepted = sum(self.requests.values())
+            if self.daily_limit is not None and accepted >= self.daily_limit:
+                return 429
+            if self.max_per_second is not None:
+                while self._recent and self._recent[0] <= now - 1:
+                    self._recent.popleft()
+                if len(self._recent) >= self.max_per_second:
+                    return 429
+                self._recent.append(now)
+            if self.error_rate and self._rng.random() < self.error_rate:
+                return 500
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        return None
+
+    def _respond(self, endpoint: str, query: dict) -> tuple[int, object]:
+        arg = lambda name: query.get(name, [None])[0]  # noqa: E731
+        market = self.market
+        if endpoint == "quote":
+            quote = market.quote(arg("symbol"))
+            return 200, [quote] if quote else []
+        if endpoint == "batch-quote":
+            symbols = (arg("symbols") or "").split(",")
+            return 200, [
+                q for q in map(market.quote, symbols) if q is not None
+            ]
+        if endpoint == "historical-price-eod/full":
+            return 200, market.history(
+                arg("symbol"),
+                timeseries=arg("timeseries"),
+                from_date=arg("from"),
+                to_date=arg("to"),
+            )
+        if endpoint == "sector-performance-snapshot":
+            return 200, market.sector_performance(
+                arg("date") or market.as_of.isoformat()
+            )
+        return 404, {"Error Message": f"Unknown endpoint {endpoint}"}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path == "/_stats":
+                    self._send(200, fake.stats(), count=False)
+                    return
+                endpoint = url.path.removeprefix("/stable/")
+                query = parse_qs(url.query)
+                if "apikey" not in query:
+                    status, body = 401, {"Error Message": "Invalid API KEY."}
+                else:
+                    status = fake._admit()
+                    if status == 429:
+                        body = "Limit Reach . Please upgrade your plan"
+                    elif status == 500:
+                        body = "Internal Server Error"
+                    else:
+                        status, body = fake._respond(endpoint, query)
+                        if status == 200:
+                            with fake._lock:
+                                fake.requests[endpoint] += 1
+                self._send(status, body)
+
+            def _send(self, status, body, count=True):
+                if isinstance(body, str):
+                    data, kind = body.encode(), "text/plain"
+                else:
+                    data = json.dumps(body, separators=(",", ":")).encode()
+                    kind = "application/json"
+                if count:
+                    with fake._lock:
+                        fake.status_counts[status] += 1
+                        fake.bytes_sent += len(data)
+                self.send_response(status)
+                self.send_header("Content-Type", kind)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--symbols", type=int, default=None,
+                        help="universe size (default: the S&P 500 list)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--daily-limit", type=int, default=None)
+    parser.add_argument("--max-per-second", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    server = FakeFMPServer(
+        market=SyntheticMarket(synthetic_universe(args.symbols), args.seed),
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        daily_limit=args.daily_limit,
+        max_per_second=args.max_per_second,
+        seed=args.seed,
+    )
+    print(f"Fake FMP API serving at {server.base_url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Exclusive locks on open files, held across processes.
+
+Uses flock where fcntl exists and msvcrt.locking on Windows.
+"""
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Byte locked on Windows; the start of a lock file is free for data such
+# as the price store's generation counter.
+_MSVCRT_LOCK_OFFSET = 64
+
+
+def open_lock_file(path: str) -> int:
+    """Open (creating if needed) a lock file for reading and writing."""
+    return os.open(
+        path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644
+    )
+
+
+def lock(fd: int):
+    """Block until this process holds the exclusive lock on fd."""
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    os.lseek(fd, _MSVCRT_LOCK_OFFSET, os.SEEK_SET)
+    while True:
+        try:
+            # LK_LOCK itself gives up after about 10 seconds
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            time.sleep(0.05)
+
+
+def unlock(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        return
+    os.lseek(fd, _MSVCRT_LOCK_OFFSET, os.SEEK_SET)
+    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
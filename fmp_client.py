@@ -1,6 +1,44 @@
+import math
+import threading
 import time
+from collections import Counter, defaultdict
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime, timedelta
+from budget_ledger import BudgetLedger
+from cassette import Cassette
+from rate_limiter import TokenBucket
+from response_cache import ResponseCache
+
+FMP_BASE_URL = "https://financialmodelingprep.com/stable"
+
+# FMP accepts a comma-separated symbol list on the batch quote endpoint.
+# Keep each request's URL comfortably short.
+QUOTE_BATCH_SIZE = 100
+
+# Default limiter: sustained ~6.7 calls/s (one per 150ms, which has kept
+# us clear of burst 429s) with a small burst allowance.
+DEFAULT_RATE = 1 / 0.15
+DEFAULT_BURST = 3
+
+# Server errors (5xx) and dropped connections are retried this many times,
+# waiting RETRY_BACKOFF seconds and doubling the wait after each attempt.
+DEFAULT_RETRIES = 2
+RETRY_BACKOFF = 0.5
+
+
+def latency_summary(seconds: list[float]) -> dict:
+    """p50, p95 and max of a list of durations, in milliseconds."""
+    if not seconds:
+        return {"p50": None, "p95": None, "max": None}
+    ordered = sorted(seconds)
+
+    def pct(p):
+        # Nearest-rank percentile
+        index = max(0, math.ceil(len(ordered) * p / 100) - 1)
+        return round(ordered[index] * 1000, 1)
+
+    return {"p50": pct(50), "p95": pct(95), "max": pct(100)}
 
 
 class BudgetExhausted(Exception):
@@ -8,49 +46,266 @@ class BudgetExhausted(Exception):
     pass
 
 
+class ScanCancelled(Exception):
+    """Raised instead of making a call once the scan has been cancelled."""
+    pass
+
+
 class FMPClient:
     """Wrapper for Financial Modeling Prep stable API.
 
     Tracks API call count against a budget to stay within free tier limits
-    (250 calls/day). Adds rate limiting between calls to avoid 429 errors.
+    (250 calls/day). Calls go through a token-bucket rate limiter to avoid
+    429 errors; pass a shared ``rate_limiter`` to throttle several clients
+    together. With a ``cache``, cached responses are served from disk and
+    do not count against the budget. Once ``cancel_event`` is set every
+    further call raises ScanCancelled.
+
+    ``call_budget`` caps this client's calls; a shared ``ledger`` also
+    caps the day's calls across every client and process using the same
+    API key. A call is only made once both have room for it.
+
+    A ``cassette`` in record mode saves every response that came over
+    the network; in replay mode responses come from the cassette instead
+    of FMP, with budget, rate limit and cache applied as usual.
+
+    All requests go through one pooled ``requests.Session`` so connections
+    to FMP are kept alive and reused instead of paying a TCP+TLS handshake
+    on every call. Safe to share between scanner worker threads: the budget
+    and the rate limit are enforced across all of them.
+
+    5xx responses and connection errors are retried up to ``retries``
+    times with exponential backoff; each attempt is a call against the
+    budget. stats() breaks the client's traffic down for scan metadata,
+    and ``on_call(endpoint, status)``, if given, hears of each attempt as
+    it happens.
     """
 
-    def __init__(self, api_key: str, call_budget: int = 200):
+    def __init__(
+        self, api_key: str, call_budget: int = 200, pool_size: int = 10,
+        rate_limiter: TokenBucket = None, cache: ResponseCache = None,
+        cancel_event: threading.Event = None, ledger: BudgetLedger = None,
+        cassette: Cassette = None, base_url: str = FMP_BASE_URL,
+        retries: int = DEFAULT_RETRIES, sleep=time.sleep, on_call=None,
+    ):
         self.api_key = api_key
-        self.base_url = "https://financialmodelingprep.com/stable"
+        self.base_url = base_url.rstrip("/")
         self.call_budget = call_budget
         self.calls_made = 0
+        self._lock = threading.Lock()
+        self.rate_limiter = rate_limiter or TokenBucket(
+            rate=DEFAULT_RATE, burst=DEFAULT_BURST
+        )
+        self.rate_limit_wait = 0.0
+        self.cache = cache
+        self.cancel_event = cancel_event
+        self.cassette = cassette
+        # Replayed calls don't touch FMP, so they don't use the daily quota
+        self.ledger = None if cassette and cassette.replaying else ledger
+        self.retries = retries
+        self._sleep = sleep
+        self._on_call = on_call
 
-    def _get(self, endpoint: str, params: dict = None) -> dict | list:
-        """Make GET request to FMP stable API."""
-        if self.calls_made >= self.call_budget:
-            raise BudgetExhausted(
-                f"API call budget of {self.call_budget} reached "
-                f"({self.calls_made} calls made)"
+        self.retries_made = 0
+        self.bytes_received = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.calls_by_endpoint = Counter()
+        self.status_counts = Counter()
+        self._latencies = defaultdict(list)  # endpoint -> seconds
+
+        self.session = requests.Session()
+        self.session.hooks["response"].append(self._count_bytes)
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size
+        )
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+
+    def _connection_pools(self) -> list:
+        pools = self._adapter.poolmanager.pools
+        result = []
+        for key in pools.keys():
+            try:
+                result.append(pools[key])
+            except KeyError:
+                continue
+        return result
+
+    @property
+    def connections_opened(self) -> int:
+        """Number of new connections opened to the API host."""
+        return sum(p.num_connections for p in self._connection_pools())
+
+    @property
+    def connections_reused(self) -> int:
+        """Number of requests served over an already-open connection."""
+        return sum(
+            max(0, p.num_requests - p.num_connections)
+            for p in self._connection_pools()
+        )
+
+    @property
+    def daily_remaining(self) -> int | None:
+        """Calls left today across all clients, if a ledger is in use."""
+        if self.ledger is None:
+            return None
+        return self.ledger.remaining(self.api_key)
+
+    def close(self):
+        """Close pooled connections."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _count_bytes(self, resp, *args, **kwargs):
+        # Wire size when the server sends it (compressed), else body size
+        size = resp.headers.get("Content-Length")
+        size = int(size) if size else len(resp.content)
+        with self._lock:
+            self.bytes_received += size
+
+    def stats(self) -> dict:
+        """Calls, latency, bytes, throttling, cache and retry counters."""
+        with self._lock:
+            latencies = {k: list(v) for k, v in self._latencies.items()}
+            return {
+                "calls": self.calls_made,
+                "calls_by_endpoint": dict(self.calls_by_endpoint),
+                "status_counts": {
+                    str(k): v for k, v in self.status_counts.items()
+                },
+                "latency_ms": latency_summary(
+                    [t for v in latencies.values() for t in v]
+                ),
+                "latency_ms_by_endpoint": {
+                    k: latency_summary(v) for k, v in latencies.items()
+                },
+                "bytes_received": self.bytes_received,
+                "rate_limit_wait_seconds": round(self.rate_limit_wait, 3),
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+                "retries": self.retries_made,
+            }
+
+    def _check_cancelled(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise ScanCancelled("Scan cancelled")
+
+    def _fetch(self, endpoint: str, params: dict) -> tuple[int, object]:
+        """One round trip to FMP (or the cassette): (status, body).
+
+        The body is the decoded JSON for a 200 and the raw text otherwise.
+        """
+        if self.cassette is not None and self.cassette.replaying:
+            return self.cassette.play(endpoint, params)
+        started = time.perf_counter()
+        resp = self.session.get(
+            f"{self.base_url}/{endpoint}",
+            params={**params, "apikey": self.api_key},
+            timeout=30,
+        )
+        body = resp.json() if resp.status_code == 200 else resp.text
+        if self.cassette is not None:
+            self.cassette.record(
+                endpoint, params, resp.status_code, body,
+                time.perf_counter() - started,
             )
+        return resp.status_code, body
 
+    def _get(self, endpoint: str, params: dict = None) -> dict | list:
+        """Make GET request to FMP stable API."""
         if params is None:
             params = {}
-        params["apikey"] = self.api_key
+        if self.cache is not None:
+            hit, data = self.cache.get(endpoint, params)
+            with self._lock:
+                if hit:
+                    self.cache_hits += 1
+                else:
+                    self.cache_misses += 1
+            if hit:
+                return data
 
-        # Rate limit: 150ms between calls to avoid burst 429s
-        if self.calls_made > 0:
-            time.sleep(0.15)
+        attempt = 0
+        while True:
+            self._reserve_call()
+            started = time.perf_counter()
+            try:
+                status, data = self._fetch(endpoint, params)
+                error = None
+            except (requests.ConnectionError, requests.Timeout) as e:
+                status, data, error = None, None, e
+            with self._lock:
+                self.calls_by_endpoint[endpoint] += 1
+                self.status_counts[status or "error"] += 1
+                self._latencies[endpoint].append(
+                    time.perf_counter() - started
+                )
+            if self._on_call is not None:
+                self._on_call(endpoint, status or "error")
+            if (error or status >= 500) and attempt < self.retries:
+                self._sleep(RETRY_BACKOFF * 2 ** attempt)
+                attempt += 1
+                with self._lock:
+                    self.retries_made += 1
+                continue
+            break
 
-        self.calls_made += 1
-        resp = requests.get(
-            f"{self.base_url}/{endpoint}", params=params, timeout=30
-        )
-        if resp.status_code == 429:
+        if error is not None:
+            raise error
+        if status == 429:
+            if self.ledger is not None:
+                self.ledger.mark_exhausted(self.api_key)
             raise BudgetExhausted(
                 f"FMP rate limit hit after {self.calls_made} calls. "
                 "Daily limit (250) likely reached."
             )
-        if resp.status_code != 200:
-            raise Exception(
-                f"FMP API error {resp.status_code}: {resp.text[:200]}"
+        if status != 200:
+            raise Exception(f"FMP API error {status}: {str(data)[:200]}")
+        # Replayed responses may be long out of date; keep them out of the
+        # cache live scans read from
+        replaying = self.cassette is not None and self.cassette.replaying
+        if self.cache is not None and not replaying:
+            self.cache.set(endpoint, params, data)
+        return data
+
+    def _reserve_call(self):
+        """Take one call from the budget, the daily ledger and the rate
+        limiter, in that order."""
+        self._check_cancelled()
+        with self._lock:
+            if self.calls_made >= self.call_budget:
+                raise BudgetExhausted(
+                    f"API call budget of {self.call_budget} reached "
+                    f"({self.calls_made} calls made)"
+                )
+            self.calls_made += 1
+        if self.ledger is not None and not self.ledger.reserve(self.api_key):
+            with self._lock:
+                self.calls_made -= 1
+            raise BudgetExhausted(
+                f"Daily FMP quota of {self.ledger.daily_limit} calls used "
+                "up (shared with other scans)"
             )
-        return resp.json()
+
+        waited = self.rate_limiter.acquire()
+        if waited:
+            with self._lock:
+                self.rate_limit_wait += waited
+        try:
+            self._check_cancelled()
+        except ScanCancelled:
+            # The call was never made: give back both reservations
+            with self._lock:
+                self.calls_made -= 1
+            if self.ledger is not None:
+                self.ledger.release(self.api_key)
+            raise
 
     def get_sector_performance(self, date: str = None) -> list[dict]:
         """Get sector performance snapshot for a given date.
@@ -101,17 +356,44 @@ class FMPClient:
             raise Exception(f"No quote data for {symbol}")
         return data[0]
 
+    def get_quotes(
+        self, symbols: list[str], batch_size: int = QUOTE_BATCH_SIZE
+    ) -> dict[str, dict]:
+        """Get quotes for many stocks, one API call per chunk of symbols.
+
+        Returns a dict keyed by symbol. Symbols FMP has no quote for are
+        simply absent from the result.
+        """
+        quotes = {}
+        for i in range(0, len(symbols), batch_size):
+            chunk = symbols[i:i + batch_size]
+            data = self._get(
+                "batch-quote", params={"symbols": ",".join(chunk)}
+            )
+            for quote in data or []:
+                symbol = quote.get("symbol")
+                if symbol:
+                    quotes[symbol] = quote
+        return quotes
+
     def get_historical_prices(
-        self, symbol: str, timeseries: int = 1260
+        self, symbol: str, timeseries: int = 1260,
+        from_date: str = None, to_date: str = None,
     ) -> dict:
         """Get historical daily prices for ATH calculation.
 
-        Default is 1260 trading days (~5 years) for meaningful ATH.
+        Default is 1260 trading days (~5 years) for meaningful ATH. Passing
+        from_date (and optionally to_date, both YYYY-MM-DD) fetches just that
+        date range instead, for incremental syncs.
         """
-        data = self._get(
-            "historical-price-eod/full",
-            params={"symbol": symbol, "timeseries": timeseries},
-        )
+        params = {"symbol": symbol}
+        if from_date:
+            params["from"] = from_date
+            if to_date:
+                params["to"] = to_date
+        else:
+            params["timeseries"] = timeseries
+        data = self._get("historical-price-eod/full", params=params)
         if isinstance(data, list):
             return {"symbol": symbol, "historical": data}
         return data
@@ -0,0 +1,306 @@
+"""Background scan jobs with polling and cancellation."""
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+
+class JobQueueFull(Exception):
+    """Raised when too many scans are already queued or running."""
+    pass
+
+
+def config_key(config: dict) -> str:
+    """Stable key for a scan config, used to spot duplicate scans."""
+    return json.dumps(config, sort_keys=True, default=str)
+
+
+class ScanJob:
+    """State of one background scan, updated from the worker thread.
+
+    Every update is also appended to an event log (progress, leaderboard,
+    done, error) that streaming readers follow with events_since().
+    """
+
+    def __init__(self, config: dict):
+        self.id = uuid.uuid4().hex
+        self.config = config
+        self.key = config_key(config)
+        self.status = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = None
+        self.calls_made = 0
+        self.call_budget = None
+        self.partial = []
+        self.result = None
+        self.error = None
+        self.cancel_event = threading.Event()
+        # Submitters waiting on the job; it is cancelled when all cancel
+        self.subscribers = 1
+        # run_fn can clear this to keep a result out of the result cache
+        self.cacheable = True
+        self.future = None
+        self.events = []
+        self._events_changed = threading.Condition()
+
+    def emit(self, event: str, data: dict):
+        with self._events_changed:
+            self.events.append(
+                {"id": len(self.events) + 1, "event": event, "data": data}
+            )
+            self._events_changed.notify_all()
+
+    def events_since(self, last_id: int, timeout: float = None) -> list:
+        """Events after last_id, waiting up to timeout for one to arrive."""
+        with self._events_changed:
+            if len(self.events) <= last_id:
+                self._events_changed.wait(timeout)
+            return self.events[last_id:]
+
+    def report_progress(
+        self, message: str, calls_made: int = None, call_budget: int = None
+    ):
+        self.progress = message
+        if calls_made is not None:
+            self.calls_made = calls_made
+        if call_budget is not None:
+            self.call_budget = call_budget
+        self.emit("progress", {
+            "message": message,
+            "calls_made": self.calls_made,
+            "call_budget": self.call_budget,
+        })
+
+    def update_leaderboard(self, stocks: list[dict]):
+        # Swap in a fresh list so readers never see a half-built one
+        self.partial = [dict(s) for s in stocks]
+        self.emit("leaderboard", {"stocks": self.partial})
+
+    def finish(self, status: str):
+        self.status = status
+        self.finished_at = time.time()
+        if status == COMPLETED:
+            self.emit("done", {"status": status, "result": self.result})
+        else:
+            self.emit("error", {"status": status, "error": self.error})
+
+    @property
+    def done(self) -> bool:
+        return self.status not in ACTIVE_STATES
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "config": self.config,
+            "progress": self.progress,
+            "calls_made": self.calls_made,
+            "call_budget": self.call_budget,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "partial": self.partial,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class ScanJobManager:
+    """Runs scans on a small background executor.
+
+    run_fn(job) does the actual scan and returns its result dict; it should
+    watch job.cancel_event and report progress through the job. Identical
+    configs that are already queued or running share one job (which only
+    stops once every submitter has cancelled), and at most max_pending
+    jobs can be active at once. on_finish(job), if given, is
+    called once each job reaches its final state.
+
+    With a result_ttl, completed jobs are also reused for that many
+    seconds: submitting the same config again returns the finished job
+    instead of scanning again, as long as freshness() (the window of
+    market data the scan saw, e.g. the last session date) still returns
+    the same value. Cache lookups and the active-job check happen under
+    one lock, so identical requests always coalesce onto a single scan.
+    Expired results are dropped on every submit and finish, and at most
+    max_results are kept (oldest go first).
+    """
+
+    def __init__(
+        self, run_fn, max_workers: int = 1, max_pending: int = 4,
+        keep_finished: int = 50, on_finish=None, result_ttl: float = 0,
+        freshness=None, max_results: int = 50,
+    ):
+        self._run_fn = run_fn
+        self._on_finish = on_finish
+        self.result_ttl = result_ttl
+        self.max_results = max_results
+        self._freshness = freshness or (lambda: None)
+        self._results = {}  # config key -> (freshness, completed job)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="scan-job"
+        )
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+
+    def submit(self, config: dict) -> tuple[ScanJob, bool]:
+        """Queue a scan. Returns (job, created).
+
+        If an identical scan is already active, or finished recently
+        enough to be reused, returns that job with created=False instead
+        of starting another one.
+        """
+        key = config_key(config)
+        window = self._freshness()
+        with self._lock:
+            self._prune_results(window)
+            cached = self._cached(key, window)
+            if cached is not None:
+                # Keep it reachable by id even if it was pruned
+                self._jobs.setdefault(cached.id, cached)
+                return cached, False
+            active = [j for j in self._jobs.values() if not j.done]
+            for job in active:
+                if job.key == key:
+                    job.subscribers += 1
+                    return job, False
+            if len(active) >= self.max_pending:
+                raise JobQueueFull(
+                    f"{len(active)} scans already queued or running. "
+                    "Try again when one finishes."
+                )
+            job = ScanJob(config)
+            self._jobs[job.id] = job
+            self._prune()
+        job.future = self._executor.submit(self._run, job)
+        return job, True
+
+    def _run(self, job: ScanJob):
+        if job.cancel_event.is_set():
+            self._finish(job, CANCELLED)
+            return
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = self._run_fn(job)
+            status = CANCELLED if job.cancel_event.is_set() else COMPLETED
+        except Exception as e:
+            if job.cancel_event.is_set():
+                status = CANCELLED
+            else:
+                job.error = str(e)
+                status = FAILED
+        self._finish(job, status)
+
+    def _finish(self, job: ScanJob, status: str):
+        window = self._freshness() if self.result_ttl else None
+        with self._lock:
+            # Cached before the job counts as done, so no submit can miss
+            # both the running job and its result
+            if status == COMPLETED and job.cacheable and self.result_ttl:
+                self._results[job.key] = (window, job)
+                self._prune_results(window)
+            job.finish(status)
+        if self._on_finish is not None:
+            self._on_finish(job)
+
+    def _expired(self, entry: tuple, window, now: float) -> bool:
+        job_window, job = entry
+        # Not finished yet only while _finish is caching it
+        finished_at = job.finished_at or now
+        return (
+            job_window != window or now - finished_at >= self.result_ttl
+        )
+
+    def _cached(self, key: str, window) -> ScanJob | None:
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry, window, time.time()):
+            del self._results[key]
+            return None
+        return entry[1]
+
+    def _prune_results(self, window):
+        """Drop expired results, then the oldest beyond max_results."""
+        now = time.time()
+        for key in [
+            k for k, entry in self._results.items()
+            if self._expired(entry, window, now)
+        ]:
+            del self._results[key]
+        excess = len(self._results) - self.max_results
+        if excess > 0:
+            oldest = sorted(
+                self._results,
+                key=lambda k: self._results[k][1].finished_at or now,
+            )
+            for key in oldest[:excess]:
+                del self._results[key]
+
+    def data_age(self, job: ScanJob) -> float | None:
+        """Seconds since a finished job's scan completed."""
+        if job.finished_at is None:
+            return None
+        return max(0.0, time.time() - job.finished_at)
+
+    def _prune(self):
+        finished = sorted(
+            (j for j in self._jobs.values() if j.done),
+            key=lambda j: j.finished_at or 0,
+        )
+        for job in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id: str) -> ScanJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active_jobs(self) -> list[ScanJob]:
+        with self._lock:
+            return [j for j in self._jobs.values() if not j.done]
+
+    def cancel(self, job_id: str) -> ScanJob | None:
+        """Withdraw one submitter from a job. Once none are left it is
+        asked to stop: queued jobs never start; running ones stop before
+        their next API call. Until then job.cancel_event stays clear."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job.done:
+                return job
+            job.subscribers = max(0, job.subscribers - 1)
+            if job.subscribers:
+                return job
+            job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            self._finish(job, CANCELLED)
+        return job
+
+    def wait(self, job_id: str, timeout: float = None) -> ScanJob | None:
+        """Block until a job finishes (mainly for tests and scripts)."""
+        job = self.get(job_id)
+        if job is not None and job.future is not None:
+            try:
+                job.future.result(timeout=timeout)
+            except Exception:
+                pass
+        return job
+
+    def shutdown(self):
+        for job in self.active_jobs():
+            job.cancel_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
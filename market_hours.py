@@ -0,0 +1,40 @@
+"""US equity market session helpers (weekdays only, holidays ignored)."""
+from datetime import datetime, date, time, timedelta, timezone
+
+try:
+    from zoneinfo import ZoneInfo
+    MARKET_TZ = ZoneInfo("America/New_York")
+except Exception:  # tzdata missing: fall back to EST
+    MARKET_TZ = timezone(timedelta(hours=-5))
+
+MARKET_CLOSE = time(16, 0)
+
+
+def _market_now(now: datetime = None) -> datetime:
+    if now is None:
+        return datetime.now(MARKET_TZ)
+    if now.tzinfo is None:
+        now = now.astimezone()
+    return now.astimezone(MARKET_TZ)
+
+
+def _close_on(day: date) -> datetime:
+    return datetime.combine(day, MARKET_CLOSE, tzinfo=MARKET_TZ)
+
+
+def next_close(now: datetime = None) -> datetime:
+    """Next weekday market close strictly after now."""
+    current = _market_now(now)
+    day = current.date()
+    while day.weekday() >= 5 or _close_on(day) <= current:
+        day += timedelta(days=1)
+    return _close_on(day)
+
+
+def last_session_date(now: datetime = None) -> date:
+    """Date of the most recent session whose close has already passed."""
+    current = _market_now(now)
+    day = current.date()
+    while day.weekday() >= 5 or _close_on(day) > current:
+        day -= timedelta(days=1)
+    return day
@@ -0,0 +1,155 @@
+"""Minimal metrics registry rendered in the Prometheus text format."""
+import bisect
+import math
+import threading
+
+# Scan durations in seconds: cached re-scans take well under a second,
+# cold ones with throttled history calls run for minutes.
+DURATION_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value) -> str:
+    return (
+        str(value).replace("\\", "\\\\").replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+def _format_labels(names: tuple, values: tuple) -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labels: tuple = (),
+                 callback=None):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.callback = callback
+        self._lock = threading.Lock()
+        # Unlabelled metrics start at zero so they show up before first use
+        self._values = {} if self.labels else {(): 0}
+
+    def _key(self, labels: dict) -> tuple:
+        # Strings only, so 200 and "error" can be sorted side by side
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def samples(self) -> dict:
+        """label values (as strings) -> value, read at scrape time."""
+        if self.callback is not None:
+            value = self.callback()
+            if not isinstance(value, dict):
+                return {(): value}
+            return {
+                tuple(map(str, k if isinstance(k, tuple) else (k,))): v
+                for k, v in value.items()
+            }
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}",
+                 f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self.samples().items()):
+            if value is None:
+                continue
+            lines.append(
+                f"{self.name}{_format_labels(self.labels, key)} "
+                f"{_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic count, optionally split by labels."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Current value, usually computed by a callback when scraped."""
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str,
+                 buckets: tuple = DURATION_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        lines = [f"# HELP {self.name} {self.help}",
+                 f"# TYPE {self.name} {self.kind}"]
+        cumulative = 0
+        for bound, count in zip((*self.buckets, math.inf), counts):
+            cumulative += count
+            lines.append(
+                f'{self.name}_bucket{{le="{_format_value(float(bound))}"}} '
+                f"{cumulative}"
+            )
+        lines.append(f"{self.name}_sum {_format_value(float(total))}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
+
+
+class Registry:
+    """Holds metrics and renders them for a /metrics scrape.
+
+    Updates take one short per-metric lock; values owned by other objects
+    (budgets, caches, job counts) are read through callbacks only when
+    scraped, so the request path does no extra work for them.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=(), callback=None) -> Counter:
+        return self._add(Counter(name, help, labels, callback))
+
+    def gauge(self, name, help, labels=(), callback=None) -> Gauge:
+        return self._add(Gauge(name, help, labels, callback))
+
+    def histogram(self, name, help, buckets=DURATION_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,382 @@
+"""Local daily OHLCV store, synced incrementally from FMP."""
+import json
+import math
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import date
+import numpy as np
+import file_lock
+from market_hours import last_session_date
+
+FIELDS = ("open", "high", "low", "close", "volume")
+
+# On-disk type of each column. Missing values are stored as NaN.
+DTYPES = {
+    "date": np.dtype("datetime64[D]"),
+    **{field: np.dtype("float64") for field in FIELDS},
+}
+
+# Bars fetched the first time a symbol is synced (~5 years).
+FULL_HISTORY_DAYS = 1260
+
+# Free rows reserved after a symbol's bars (~1 year of daily appends)
+# before it has to move to a bigger region.
+APPEND_SLACK = 256
+
+# Column files never shrink and grow at least to this many rows.
+MIN_ROWS = 64 * 1024
+
+INDEX_FILE = "_index.json"
+LOCK_FILE = "_lock"
+
+# Relative difference between a stored close and FMP's current one that
+# means the history was revised (e.g. back-adjusted for a split).
+REVISION_TOL = 1e-4
+
+
+class PriceStore:
+    """Daily bars for the whole universe in memory-mapped columns.
+
+    Every field is one contiguous array on disk (``_<field>.bin``) shared
+    by all symbols; ``_index.json`` maps each symbol to the offset, length
+    and capacity of its region. get_columns() returns read-only numpy views
+    straight into the mapped files, so reading history copies nothing and
+    only the pages actually touched are loaded.
+
+    Appends go into a symbol's spare capacity; a symbol that runs out is
+    moved to the end of the files with twice the room, so moves get rare
+    as history grows. The data is flushed before the index is replaced, so
+    a crash mid-append leaves the previous state intact.
+
+    Several processes (e.g. gunicorn workers) may share one directory:
+    every read and write holds an exclusive lock on ``_lock`` (flock, or
+    msvcrt.locking on Windows), which also counts index saves, and first
+    reloads the index if another process saved it, so two writers never
+    allocate the same rows.
+
+    The first sync of a symbol downloads the full history; later syncs ask
+    FMP for bars from the last stored date on and append the new ones. Only
+    completed sessions are stored, so an in-progress bar is never frozen
+    into the history. Per-symbol JSON files left by older versions are
+    imported the first time the symbol is read.
+
+    FMP back-adjusts history after a split, so the overlapping bar's close
+    is compared with the stored one; if they differ the symbol's history
+    is dropped and downloaded again, and on_reset (if given) is called with
+    the symbol so derived state such as the ATH index can be dropped too.
+    Other processes notice the rebuild through version().
+    """
+
+    def __init__(self, directory: str, on_reset=None):
+        self.directory = directory
+        self.on_reset = on_reset
+        self._lock = threading.Lock()
+        self._index = None  # {"rows": used, "symbols": {symbol: entry}}
+        # Bumped in the lock file on every index save, by any process
+        self._generation = None
+        self._lock_fd = None
+        self._columns = None  # field -> writable memmap
+        self._allocated = 0
+        self.bars_fetched = 0
+
+    def _column_path(self, field: str) -> str:
+        return os.path.join(self.directory, f"_{field}.bin")
+
+    def _legacy_path(self, symbol: str) -> str:
+        return os.path.join(self.directory, f"{symbol}.json")
+
+    def _load_index(self) -> dict:
+        if self._index is None:
+            try:
+                with open(os.path.join(self.directory, INDEX_FILE)) as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {"rows": 0, "symbols": {}}
+        return self._index
+
+    def _read_generation(self) -> int:
+        os.lseek(self._lock_fd, 0, os.SEEK_SET)
+        raw = os.read(self._lock_fd, 8)
+        return int.from_bytes(raw, "little") if len(raw) == 8 else 0
+
+    def _save_index(self):
+        path = os.path.join(self.directory, INDEX_FILE)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._index, f, separators=(",", ":"))
+        os.replace(tmp, path)
+        # Tell other processes their copy of the index is out of date
+        self._generation = self._read_generation() + 1
+        os.lseek(self._lock_fd, 0, os.SEEK_SET)
+        os.write(self._lock_fd, self._generation.to_bytes(8, "little"))
+
+    @contextmanager
+    def _locked(self):
+        """Hold the thread lock and the directory's file lock, with the index
+        reloaded if another process saved it since we last read it."""
+        with self._lock:
+            if self._lock_fd is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._lock_fd = file_lock.open_lock_file(
+                    os.path.join(self.directory, LOCK_FILE)
+                )
+            file_lock.lock(self._lock_fd)
+            try:
+                generation = self._read_generation()
+                if generation != self._generation:
+                    self._index = None
+                    self._generation = generation
+                yield
+            finally:
+                file_lock.unlock(self._lock_fd)
+
+    def _map(self, rows: int = 0) -> dict:
+        """Column memmaps, with the files grown to at least rows."""
+        if self._columns is not None and rows <= self._allocated:
+            return self._columns
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._column_path("date")
+        on_disk = (
+            os.path.getsize(path) // DTYPES["date"].itemsize
+            if os.path.exists(path) else 0
+        )
+        allocated = on_disk
+        if rows > on_disk:
+            allocated = max(rows, 2 * on_disk, MIN_ROWS)
+        if allocated == 0:
+            return {}
+        columns = {}
+        for field, dtype in DTYPES.items():
+            path = self._column_path(field)
+            with open(path, "ab") as f:
+                f.truncate(allocated * dtype.itemsize)
+            columns[field] = np.memmap(
+                path, dtype=dtype, mode="r+", shape=(allocated,)
+            )
+        # Views handed out earlier keep the old maps alive; the file only
+        # grew, so what they point at is unchanged.
+        self._columns, self._allocated = columns, allocated
+        return columns
+
+    def _entry(self, symbol: str) -> dict | None:
+        entry = self._load_index()["symbols"].get(symbol)
+        if entry is None and os.path.exists(self._legacy_path(symbol)):
+            entry = self._import_legacy(symbol)
+        return entry
+
+    def _import_legacy(self, symbol: str) -> dict | None:
+        """Move a symbol from the old one-JSON-file-per-symbol layout."""
+        path = self._legacy_path(symbol)
+        try:
+            with open(path) as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return None
+        bars = [
+            {"date": row[0], **dict(zip(FIELDS, row[1:]))}
+            for row in raw.get("bars", [])
+        ]
+        self._write(symbol, bars, raw.get("synced_through"))
+        os.remove(path)
+        return self._index["symbols"][symbol]
+
+    def _view(self, entry: dict) -> dict:
+        start = entry["offset"]
+        end = start + entry["length"]
+        columns = self._map(end)
+        views = {}
+        for field in DTYPES:
+            if columns:
+                view = columns[field][start:end]
+            else:
+                view = np.empty(0, dtype=DTYPES[field])
+            view.flags.writeable = False
+            views[field] = view
+        return views
+
+    def _write(self, symbol: str, bars: list[dict], synced_through: str):
+        """Append sorted bars to a symbol's region and save the index."""
+        index = self._load_index()
+        entry = index["symbols"].get(symbol) or {
+            "offset": index["rows"], "length": 0, "capacity": 0,
+            "synced_through": None, "version": uuid.uuid4().hex,
+        }
+        length = entry["length"] + len(bars)
+        if length > entry["capacity"]:
+            # Relocate to the end with room to grow
+            capacity = max(2 * entry["capacity"], length + APPEND_SLACK)
+            offset = index["rows"]
+            columns = self._map(offset + capacity)
+            old = slice(entry["offset"], entry["offset"] + entry["length"])
+            for column in columns.values():
+                column[offset:offset + entry["length"]] = column[old]
+            entry = {**entry, "offset": offset, "capacity": capacity}
+            index["rows"] = offset + capacity
+        columns = self._map(entry["offset"] + length)
+
+        if bars:
+            start = entry["offset"] + entry["length"]
+            columns["date"][start:start + len(bars)] = np.array(
+                [bar["date"] for bar in bars], dtype=DTYPES["date"]
+            )
+            for field in FIELDS:
+                columns[field][start:start + len(bars)] = np.array(
+                    [bar.get(field) for bar in bars], dtype=DTYPES[field]
+                )
+            for column in columns.values():
+                column.flush()
+
+        entry["length"] = length
+        if synced_through:
+            entry["synced_through"] = synced_through
+        index["symbols"][symbol] = entry
+        self._save_index()
+
+    def drop(self, symbol: str):
+        """Forget a symbol's bars. Its region is left unused."""
+        with self._locked():
+            if self._entry(symbol) is not None:
+                del self._index["symbols"][symbol]
+                self._save_index()
+
+    def version(self, symbol: str) -> str | None:
+        """Identifies the symbol's stored history; it changes whenever the
+        history is dropped and rebuilt, in any process."""
+        with self._locked():
+            entry = self._entry(symbol)
+        return entry.get("version") if entry else None
+
+    def last_date(self, symbol: str) -> str | None:
+        """Date of the newest stored bar, or None if nothing is stored."""
+        with self._locked():
+            entry = self._entry(symbol)
+            if not entry or not entry["length"]:
+                return None
+            end = entry["offset"] + entry["length"] - 1
+            return str(self._map(end + 1)["date"][end])
+
+    def get_columns(self, symbol: str) -> dict[str, np.ndarray]:
+        """Read-only views of a symbol's columns, oldest first.
+
+        Keys are "date" (datetime64[D]) and FIELDS. Nothing is copied; an
+        unknown symbol gives empty arrays.
+        """
+        with self._locked():
+            entry = self._entry(symbol)
+            if entry is None:
+                return {f: np.empty(0, dtype=t) for f, t in DTYPES.items()}
+            return self._view(entry)
+
+    def get_bars(self, symbol: str) -> list[dict]:
+        """All stored bars for a symbol as dicts, oldest first."""
+        columns = self.get_columns(symbol)
+        dates = columns["date"].astype(str).tolist()
+        values = {field: columns[field].tolist() for field in FIELDS}
+        return [
+            {
+                "date": day,
+                **{
+                    field: None if math.isnan(values[field][i])
+                    else values[field][i]
+                    for field in FIELDS
+                },
+            }
+            for i, day in enumerate(dates)
+        ]
+
+    def append(
+        self, symbol: str, bars: list[dict], synced_through: str = None
+    ) -> list[dict]:
+        """Add bars newer than the last stored date. Returns the new bars."""
+        with self._locked():
+            entry = self._entry(symbol)
+            last = ""
+            if entry and entry["length"]:
+                end = entry["offset"] + entry["length"] - 1
+                last = str(self._map(end + 1)["date"][end])
+            new_bars = sorted(
+                (
+                    {"date": bar["date"], **{f: bar.get(f) for f in FIELDS}}
+                    for bar in bars
+                    if bar.get("date") and bar["date"] > last
+                ),
+                key=lambda bar: bar["date"],
+            )
+            self._write(symbol, new_bars, synced_through)
+            return new_bars
+
+    def is_fresh(self, symbol: str, as_of: date = None) -> bool:
+        """True if the symbol has been synced through the last session."""
+        as_of = as_of or last_session_date()
+        with self._locked():
+            entry = self._entry(symbol)
+        synced = entry["synced_through"] if entry else None
+        return synced is not None and synced >= as_of.isoformat()
+
+    def _last_close(self, symbol: str) -> tuple[str, float] | None:
+        """Date and close of the newest stored bar."""
+        with self._locked():
+            entry = self._entry(symbol)
+            if not entry or not entry["length"]:
+                return None
+            end = entry["offset"] + entry["length"] - 1
+            columns = self._map(end + 1)
+            return str(columns["date"][end]), float(columns["close"][end])
+
+    def _refresh(self, client, symbol: str):
+        """Fetch and append whatever the symbol is missing, if anything."""
+        as_of = last_session_date()
+        if self.is_fresh(symbol, as_of):
+            return
+
+        last = self._last_close(symbol)
+        historical = None
+        if last is not None:
+            # Start at the last stored bar to check it was not revised
+            day, close = last
+            historical = client.get_historical_prices(
+                symbol, from_date=day, to_date=as_of.isoformat(),
+            )
+            overlap = next(
+                (
+                    bar for bar in historical.get("historical", [])
+                    if bar.get("date") == day
+                ),
+                None,
+            )
+            fetched = overlap.get("close") if overlap else None
+            if (
+                fetched is not None and not math.isnan(close)
+                and not math.isclose(fetched, close, rel_tol=REVISION_TOL)
+            ):
+                self.drop(symbol)
+                if self.on_reset is not None:
+                    self.on_reset(symbol)
+                historical = None
+        if historical is None:
+            historical = client.get_historical_prices(
+                symbol, timeseries=FULL_HISTORY_DAYS
+            )
+
+        bars = [
+            bar for bar in historical.get("historical", [])
+            if bar.get("date", "") <= as_of.isoformat()
+        ]
+        self.append(symbol, bars, synced_through=as_of.isoformat())
+        with self._lock:
+            self.bars_fetched += len(bars)
+
+    def sync(self, client, symbol: str) -> list[dict]:
+        """Bring a symbol up to date from FMP and return all its bars.
+
+        Makes no API call when the symbol is already fresh.
+        """
+        self._refresh(client, symbol)
+        return self.get_bars(symbol)
+
+    def sync_columns(self, client, symbol: str) -> dict[str, np.ndarray]:
+        """Like sync(), but returns zero-copy column views."""
+        self._refresh(client, symbol)
+        return self.get_columns(symbol)
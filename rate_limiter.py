@@ -0,0 +1,82 @@
+"""Token-bucket rate limiter shared by FMP clients."""
+import asyncio
+import threading
+import time
+
+
+class TokenBucket:
+    """Token bucket allowing short bursts at a bounded sustained rate.
+
+    The bucket holds up to ``burst`` tokens and refills at ``rate`` tokens
+    per second. Each call takes one token and only waits when the bucket
+    is empty. Callers that arrive while it is empty each reserve the next
+    token in turn, so waiters are served in order without busy-looping.
+
+    One instance can be shared by several threads, asyncio tasks and
+    FMPClient instances. Time spent waiting is accumulated in
+    ``wait_seconds`` so limiter overhead can be told apart from network
+    latency.
+    """
+
+    def __init__(
+        self, rate: float, burst: int = 1, clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if burst < 1:
+            raise ValueError("burst must be at least 1")
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = clock()
+        self.wait_seconds = 0.0
+        self.waits = 0
+        self.acquired = 0
+
+    def _reserve(self) -> float:
+        """Take one token and return how long the caller must wait for it.
+
+        Tokens may go negative: a negative balance is a queue of callers
+        who have each been promised the next refill.
+        """
+        with self._lock:
+            now = self._clock()
+            elapsed = now - self._updated
+            self._updated = now
+            self._tokens = min(
+                float(self.burst), self._tokens + elapsed * self.rate
+            )
+            self._tokens -= 1
+            self.acquired += 1
+            if self._tokens >= 0:
+                return 0.0
+            delay = -self._tokens / self.rate
+            self.wait_seconds += delay
+            self.waits += 1
+            return delay
+
+    def acquire(self) -> float:
+        """Block until a token is available. Returns seconds waited."""
+        delay = self._reserve()
+        if delay > 0:
+            self._sleep(delay)
+        return delay
+
+    async def acquire_async(self) -> float:
+        """Await a token without blocking the event loop."""
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "acquired": self.acquired,
+                "waits": self.waits,
+                "wait_seconds": round(self.wait_seconds, 4),
+            }
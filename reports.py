@@ -0,0 +1,160 @@
+"""Saved scan reports: pretty JSON or compact gzipped columns.
+
+Rewrite existing pretty reports in the compact format with:
+
+    python reports.py compact output
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+from datetime import datetime
+
+PRETTY = "json"
+COMPACT = "compact"
+FORMATS = (PRETTY, COMPACT)
+
+# Fast setting: level 3 compresses nearly as well as 6 in half the time.
+COMPRESS_LEVEL = 3
+
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+def report_name(path: str) -> str:
+    """A report's name whatever its format: scan_<timestamp>.json."""
+    return os.path.basename(path).removesuffix(".gz")
+
+
+def report_paths(directory: str) -> list[str]:
+    """Every report in directory, pretty or compact, oldest first."""
+    paths = glob.glob(os.path.join(directory, "scan_*.json"))
+    paths += glob.glob(os.path.join(directory, "scan_*.json.gz"))
+    return sorted(paths, key=report_name)
+
+
+def _to_columns(results: dict) -> dict:
+    stocks = results.get("stocks", [])
+    fields = list(dict.fromkeys(k for stock in stocks for k in stock))
+    return {
+        "scan_metadata": results.get("scan_metadata", {}),
+        "stock_columns": {
+            field: [stock.get(field) for stock in stocks]
+            for field in fields
+        },
+    }
+
+
+def _from_columns(data: dict) -> dict:
+    columns = data["stock_columns"]
+    fields = list(columns)
+    rows = zip(*columns.values()) if fields else []
+    return {
+        "stocks": [dict(zip(fields, row)) for row in rows],
+        "scan_metadata": data.get("scan_metadata", {}),
+    }
+
+
+def _encode_compact(results: dict) -> bytes:
+    """Minified JSON with one list per stock field, gzipped."""
+    data = json.dumps(
+        _to_columns(results), separators=(",", ":"), default=str
+    )
+    return gzip.compress(data.encode(), COMPRESS_LEVEL, mtime=0)
+
+
+def _claim_path(directory: str, timestamp: str, fmt: str) -> str:
+    """Create an empty report file whose name no other report has.
+
+    Names are unique across both formats, since they identify a scan in
+    the archive; a clash gets a _2, _3, ... suffix.
+    """
+    attempt = 1
+    while True:
+        suffix = f"_{attempt}" if attempt > 1 else ""
+        path = os.path.join(directory, f"scan_{timestamp}{suffix}.json")
+        target = f"{path}.gz" if fmt == COMPACT else path
+        if not os.path.exists(path) and not os.path.exists(f"{path}.gz"):
+            try:
+                os.close(os.open(target, os.O_CREAT | os.O_EXCL))
+                return target
+            except FileExistsError:
+                pass
+        attempt += 1
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def write_report(
+    results: dict, directory: str, fmt: str = PRETTY, now: datetime = None,
+) -> str:
+    """Save results as scan_<timestamp>.json (or .json.gz when compact).
+
+    The timestamp has microseconds, and a report never replaces another
+    one. Returns the path written.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown report format: {fmt}")
+    os.makedirs(directory, exist_ok=True)
+    timestamp = (now or datetime.now()).strftime("%Y%m%d_%H%M%S_%f")
+    path = _claim_path(directory, timestamp, fmt)
+    if fmt == COMPACT:
+        _write_atomic(path, _encode_compact(results))
+    else:
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+    return path
+
+
+def read_report(path: str) -> dict:
+    """Load a report in either format as Scanner.run_scan returned it."""
+    with open(path, "rb") as f:
+        raw = f.read()
+    if raw[:2] == _GZIP_MAGIC:
+        raw = gzip.decompress(raw)
+    data = json.loads(raw)
+    if "stock_columns" in data:
+        return _from_columns(data)
+    return data
+
+
+def compact_reports(directory: str) -> dict:
+    """Rewrite every pretty report in directory in the compact format.
+
+    Each compact file is complete before its original is removed, so an
+    interrupted run loses nothing. Returns counts and bytes before/after.
+    """
+    stats = {"compacted": 0, "bytes_before": 0, "bytes_after": 0}
+    for path in glob.glob(os.path.join(directory, "scan_*.json")):
+        try:
+            results = read_report(path)
+        except (OSError, ValueError):
+            continue
+        target = f"{path}.gz"
+        _write_atomic(target, _encode_compact(results))
+        stats["bytes_before"] += os.path.getsize(path)
+        stats["bytes_after"] += os.path.getsize(target)
+        stats["compacted"] += 1
+        os.remove(path)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["compact"])
+    parser.add_argument("directory", nargs="?", default="output")
+    args = parser.parse_args(argv)
+    stats = compact_reports(args.directory)
+    print(
+        f"Compacted {stats['compacted']} report(s): "
+        f"{stats['bytes_before']:,} -> {stats['bytes_after']:,} bytes"
+    )
+
+
+if __name__ == "__main__":
+    main()
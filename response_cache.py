@@ -0,0 +1,172 @@
+"""Disk-backed cache for FMP API responses."""
+import hashlib
+import json
+import os
+import threading
+import time
+from market_hours import next_close
+
+# TTL marker: keep the response until the next market close.
+UNTIL_NEXT_CLOSE = "until_next_close"
+
+# Seconds to keep each endpoint's responses. Endpoints not listed here are
+# never cached.
+DEFAULT_TTLS = {
+    "sector-performance-snapshot": 24 * 60 * 60,
+    "quote": 5 * 60,
+    "batch-quote": 5 * 60,
+    "historical-price-eod/full": UNTIL_NEXT_CLOSE,
+}
+
+
+class ResponseCache:
+    """Caches JSON responses on disk, keyed by endpoint and params.
+
+    The API key is never part of the key, so a cache directory can be
+    shared between keys. Entries expire per endpoint (see DEFAULT_TTLS)
+    and the directory is kept under ``max_bytes`` by evicting the least
+    recently used entries. Safe to share between threads.
+    """
+
+    def __init__(
+        self, directory: str, ttls: dict = None,
+        max_bytes: int = 200 * 1024 * 1024, clock=time.time,
+    ):
+        self.directory = directory
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sizes = None  # path -> bytes, loaded on first use
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(endpoint: str, params: dict = None) -> str:
+        params = {
+            k: v for k, v in (params or {}).items() if k != "apikey"
+        }
+        return endpoint + "?" + json.dumps(
+            params, sort_keys=True, separators=(",", ":"), default=str
+        )
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode()).hexdigest()[:32]
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def _expires_at(self, endpoint: str) -> float | None:
+        ttl = self.ttls.get(endpoint)
+        if ttl is None:
+            return None
+        if ttl == UNTIL_NEXT_CLOSE:
+            return next_close().timestamp()
+        return self._clock() + ttl
+
+    def _load_sizes(self):
+        if self._sizes is not None:
+            return
+        self._sizes = {}
+        if not os.path.isdir(self.directory):
+            return
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                self._sizes[entry.path] = entry.stat().st_size
+
+    @property
+    def size_bytes(self) -> int:
+        with self._lock:
+            self._load_sizes()
+            return sum(self._sizes.values())
+
+    def get(self, endpoint: str, params: dict = None):
+        """Return (hit, data). Expired entries count as misses."""
+        if endpoint not in self.ttls:
+            return False, None
+        key = self.make_key(endpoint, params)
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+
+        if (
+            entry is None
+            or entry.get("key") != key
+            or entry.get("expires_at", 0) <= self._clock()
+        ):
+            with self._lock:
+                self.misses += 1
+            return False, None
+
+        try:
+            os.utime(path)  # mark as recently used for eviction
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return True, entry["data"]
+
+    def set(self, endpoint: str, params: dict, data):
+        """Store a response if its endpoint is cacheable."""
+        expires_at = self._expires_at(endpoint)
+        if expires_at is None:
+            return
+        key = self.make_key(endpoint, params)
+        path = self._path(key)
+        body = json.dumps(
+            {"key": key, "expires_at": expires_at, "data": data},
+            separators=(",", ":"),
+        )
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(body)
+        os.replace(tmp, path)
+
+        with self._lock:
+            self._load_sizes()
+            self._sizes[path] = len(body)
+            self._evict()
+
+    def _evict(self):
+        total = sum(self._sizes.values())
+        if total <= self.max_bytes:
+            return
+        by_age = []
+        for path in self._sizes:
+            try:
+                by_age.append((os.path.getmtime(path), path))
+            except OSError:
+                by_age.append((0, path))
+        by_age.sort()
+        for _, path in by_age:
+            if total <= self.max_bytes:
+                break
+            total -= self._sizes.pop(path)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._load_sizes()
+            for path in list(self._sizes):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._sizes = {}
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
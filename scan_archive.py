@@ -0,0 +1,291 @@
+"""SQLite archive of finished scans, queryable per symbol, sector and score.
+
+Import the JSON reports already in output/ once with:
+
+    python scan_archive.py import output
+"""
+import argparse
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from reports import read_report, report_name, report_paths
+
+# Per-stock values kept in their own columns so they can be filtered and
+# returned without decoding the full stock JSON.
+STOCK_COLUMNS = (
+    "rank", "name", "sector", "score", "price", "ath", "pct_below_ath",
+    "target_price", "upside_pct",
+)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS scans ("
+    " id INTEGER PRIMARY KEY,"
+    " scanned_at TEXT NOT NULL,"
+    " source TEXT UNIQUE,"
+    " stock_count INTEGER NOT NULL,"
+    " metadata TEXT NOT NULL,"
+    " config TEXT)",
+    "CREATE INDEX IF NOT EXISTS scans_by_time ON scans (scanned_at)",
+    "CREATE TABLE IF NOT EXISTS stocks ("
+    " scan_id INTEGER NOT NULL REFERENCES scans (id) ON DELETE CASCADE,"
+    " symbol TEXT NOT NULL,"
+    " rank INTEGER,"
+    " name TEXT,"
+    " sector TEXT,"
+    " score REAL,"
+    " price REAL,"
+    " ath REAL,"
+    " pct_below_ath REAL,"
+    " target_price REAL,"
+    " upside_pct REAL,"
+    " data TEXT NOT NULL,"
+    " PRIMARY KEY (scan_id, symbol))",
+    "CREATE INDEX IF NOT EXISTS stocks_by_symbol ON stocks (symbol, scan_id)",
+    "CREATE INDEX IF NOT EXISTS stocks_by_sector ON stocks (sector, scan_id)",
+    "CREATE INDEX IF NOT EXISTS stocks_by_score ON stocks (score)",
+)
+
+# Run after SCHEMA; archives created before scans had a config column
+# get it here (their scans keep a NULL config).
+MIGRATIONS = (
+    ("scans", "config", "ALTER TABLE scans ADD COLUMN config TEXT"),
+)
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS scans_by_config ON scans (config, scanned_at)",
+)
+
+
+def config_key(config: dict | None) -> str | None:
+    """Canonical JSON for a scan config, so equal configs compare equal."""
+    if config is None:
+        return None
+    return json.dumps(config, sort_keys=True, separators=(",", ":"))
+
+
+class ScanArchive:
+    """Every saved scan: one row per scan plus one per ranked stock.
+
+    Stocks are keyed by (scan_id, symbol) and indexed by symbol, sector
+    and score, so history() answers questions like "NVDA's score over the
+    last six months" from the index instead of reading every report.
+    Safe to share between threads and processes; each call uses its own
+    connection.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            # WAL lets history queries run while a scan is being saved
+            conn.execute("PRAGMA journal_mode=WAL")
+            for statement in SCHEMA:
+                conn.execute(statement)
+            for table, column, statement in MIGRATIONS:
+                columns = {
+                    row["name"] for row in
+                    conn.execute(f"PRAGMA table_info({table})")
+                }
+                if column not in columns:
+                    conn.execute(statement)
+            for statement in INDEXES:
+                conn.execute(statement)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add_scan(self, result: dict, source: str = None) -> int:
+        """Store a scan result and return its id.
+
+        source (usually the report's file name) must be unique;
+        import_reports() skips reports whose source is already stored.
+        """
+        metadata = result.get("scan_metadata", {})
+        stocks = result.get("stocks", [])
+        with self._connect() as conn:
+            scan_id = conn.execute(
+                "INSERT INTO scans (scanned_at, source, stock_count, "
+                "metadata, config) VALUES (?, ?, ?, ?, ?)",
+                (
+                    metadata.get("timestamp", ""), source, len(stocks),
+                    json.dumps(metadata, separators=(",", ":"), default=str),
+                    config_key(metadata.get("config")),
+                ),
+            ).lastrowid
+            conn.executemany(
+                f"INSERT OR REPLACE INTO stocks (scan_id, symbol, "
+                f"{', '.join(STOCK_COLUMNS)}, data) "
+                f"VALUES ({', '.join('?' * (len(STOCK_COLUMNS) + 3))})",
+                [
+                    (
+                        scan_id, stock["symbol"],
+                        *(stock.get(c) for c in STOCK_COLUMNS),
+                        json.dumps(stock, separators=(",", ":")),
+                    )
+                    for stock in stocks if stock.get("symbol")
+                ],
+            )
+            return scan_id
+
+    def list_scans(
+        self, since: str = None, until: str = None, limit: int = 100,
+    ) -> list[dict]:
+        """Scans in a time range, newest first, without their stocks."""
+        clauses, params = self._time_range("scanned_at", since, until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT id, scanned_at, source, stock_count FROM scans "
+                f"{where} ORDER BY scanned_at DESC, id DESC LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_scan(self, scan_id: int) -> dict | None:
+        """A stored scan in the same shape Scanner.run_scan returned it."""
+        with self._connect() as conn:
+            scan = conn.execute(
+                "SELECT metadata FROM scans WHERE id = ?", (scan_id,)
+            ).fetchone()
+            if scan is None:
+                return None
+            stocks = conn.execute(
+                "SELECT data FROM stocks WHERE scan_id = ? "
+                "ORDER BY rank, symbol",
+                (scan_id,),
+            ).fetchall()
+        return {
+            "stocks": [json.loads(row["data"]) for row in stocks],
+            "scan_metadata": json.loads(scan["metadata"]),
+        }
+
+    def scan_info(self, scan_id: int) -> dict | None:
+        """A scan's list_scans() row."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, scanned_at, source, stock_count FROM scans "
+                "WHERE id = ?",
+                (scan_id,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def latest_scan_id(self) -> int | None:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id FROM scans ORDER BY scanned_at DESC, id DESC "
+                "LIMIT 1"
+            ).fetchone()
+        return row["id"] if row else None
+
+    def previous_scan_id(self, scan_id: int) -> int | None:
+        """The scan with the same config saved just before scan_id."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT p.id FROM scans p JOIN scans s ON s.id = ? "
+                "WHERE p.config IS s.config AND (p.scanned_at < s.scanned_at "
+                "OR (p.scanned_at = s.scanned_at AND p.id < s.id)) "
+                "ORDER BY p.scanned_at DESC, p.id DESC LIMIT 1",
+                (scan_id,),
+            ).fetchone()
+        return row["id"] if row else None
+
+    def ranked_stocks(self, scan_id: int) -> list[dict]:
+        """symbol, name, sector, rank and score of a scan's stocks, sorted
+        by symbol straight from the primary key (input for scan_diff)."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT symbol, name, sector, rank, score FROM stocks "
+                "WHERE scan_id = ? ORDER BY symbol",
+                (scan_id,),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def history(
+        self, symbol: str = None, sector: str = None,
+        min_score: float = None, max_score: float = None,
+        since: str = None, until: str = None, limit: int = 1000,
+    ) -> list[dict]:
+        """Stock rows matching every given filter, oldest scan first.
+
+        Each row has scan_id, scanned_at, symbol and STOCK_COLUMNS.
+        """
+        clauses, params = self._time_range("s.scanned_at", since, until)
+        for clause, value in (
+            ("st.symbol = ?", symbol.upper() if symbol else None),
+            ("st.sector = ?", sector),
+            ("st.score >= ?", min_score),
+            ("st.score <= ?", max_score),
+        ):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        columns = ", ".join(f"st.{c}" for c in STOCK_COLUMNS)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT st.scan_id, s.scanned_at, st.symbol, {columns} "
+                f"FROM stocks st JOIN scans s ON s.id = st.scan_id {where} "
+                f"ORDER BY s.scanned_at, st.scan_id, st.rank LIMIT ?",
+                (*params, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    @staticmethod
+    def _time_range(column: str, since: str, until: str):
+        """WHERE clauses and parameters for an inclusive time range."""
+        clauses, params = [], []
+        if since:
+            clauses.append(f"{column} >= ?")
+            params.append(since)
+        if until:
+            clauses.append(f"{column} <= ?")
+            params.append(until)
+        return clauses, params
+
+    def import_reports(self, directory: str) -> int:
+        """Add every report in directory (either format) not yet archived.
+
+        Returns how many were added.
+        """
+        added = 0
+        for path in report_paths(directory):
+            source = report_name(path)
+            with self._connect() as conn:
+                known = conn.execute(
+                    "SELECT 1 FROM scans WHERE source = ?", (source,)
+                ).fetchone()
+            if known:
+                continue
+            try:
+                result = read_report(path)
+            except (OSError, ValueError):
+                continue
+            self.add_scan(result, source=source)
+            added += 1
+        return added
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["import"])
+    parser.add_argument("directory", nargs="?", default="output")
+    parser.add_argument(
+        "--archive", default=os.path.join("output", "scan_archive.sqlite")
+    )
+    args = parser.parse_args(argv)
+    added = ScanArchive(args.archive).import_reports(args.directory)
+    print(f"Imported {added} report(s) into {args.archive}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""What changed between two scans: entrants, dropouts and rank moves."""
+from operator import itemgetter
+
+_by_symbol = itemgetter("symbol")
+
+
+def _entry(stock: dict) -> dict:
+    return {
+        "symbol": stock["symbol"],
+        "name": stock.get("name"),
+        "sector": stock.get("sector"),
+        "rank": stock.get("rank"),
+        "score": stock.get("score"),
+    }
+
+
+def _change(old: dict, new: dict) -> dict:
+    old_rank, new_rank = old.get("rank"), new.get("rank")
+    old_score, new_score = old.get("score"), new.get("score")
+    return {
+        "symbol": new["symbol"],
+        "name": new.get("name"),
+        "sector": new.get("sector"),
+        "old_rank": old_rank,
+        "new_rank": new_rank,
+        # Positive means the stock moved up the table
+        "rank_change": (
+            old_rank - new_rank
+            if old_rank is not None and new_rank is not None else None
+        ),
+        "old_score": old_score,
+        "new_score": new_score,
+        "score_delta": (
+            round(new_score - old_score, 2)
+            if old_score is not None and new_score is not None else None
+        ),
+    }
+
+
+def _rank_order(row: dict, key: str = "rank"):
+    return (row[key] is None, row[key] or 0, row["symbol"])
+
+
+def diff_sorted(old: list[dict], new: list[dict]) -> dict:
+    """Diff two scans' stock rows, each already sorted by symbol.
+
+    One merge pass over both lists, so the cost is linear in the number
+    of stocks. Returns:
+
+    - entered: stocks only in the new scan, by new rank
+    - dropped: stocks only in the old scan, by old rank
+    - changed: stocks in both with their rank and score before and after,
+      by new rank
+    - summary: counts of each, with changed split into up, down and
+      unchanged rank
+    """
+    entered, dropped, changed = [], [], []
+    i = j = 0
+    while i < len(old) or j < len(new):
+        if j == len(new) or (
+            i < len(old) and old[i]["symbol"] < new[j]["symbol"]
+        ):
+            dropped.append(_entry(old[i]))
+            i += 1
+        elif i == len(old) or new[j]["symbol"] < old[i]["symbol"]:
+            entered.append(_entry(new[j]))
+            j += 1
+        else:
+            changed.append(_change(old[i], new[j]))
+            i += 1
+            j += 1
+
+    entered.sort(key=_rank_order)
+    dropped.sort(key=_rank_order)
+    changed.sort(key=lambda row: _rank_order(row, "new_rank"))
+    moves = [row["rank_change"] or 0 for row in changed]
+    return {
+        "entered": entered,
+        "dropped": dropped,
+        "changed": changed,
+        "summary": {
+            "entered": len(entered),
+            "dropped": len(dropped),
+            "moved_up": sum(move > 0 for move in moves),
+            "moved_down": sum(move < 0 for move in moves),
+            "unchanged": sum(move == 0 for move in moves),
+        },
+    }
+
+
+def diff_scans(old_result: dict, new_result: dict) -> dict:
+    """diff_sorted() for two results as Scanner.run_scan returns them."""
+    def rows(result):
+        return sorted(
+            (s for s in result.get("stocks", []) if s.get("symbol")),
+            key=_by_symbol,
+        )
+
+    return diff_sorted(rows(old_result), rows(new_result))
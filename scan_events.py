@@ -0,0 +1,60 @@
+"""Typed events yielded by Scanner.iter_scan()."""
+from dataclasses import dataclass, field
+
+
+@dataclass(frozen=True)
+class Progress:
+    """Human-readable status line with the API calls used so far."""
+    message: str
+    calls_made: int = 0
+    call_budget: int = 0
+
+
+@dataclass(frozen=True)
+class ScanPlanned:
+    """The scan_planner.ScanPlan the scan will follow."""
+    plan: object
+
+
+@dataclass(frozen=True)
+class SectorChosen:
+    """A winning sector whose stocks will be scanned."""
+    sector: str
+    performance: float
+
+
+@dataclass(frozen=True)
+class CandidatePassed:
+    """A candidate passed the quote-based quick filter.
+
+    bound is its optimistic score (None when pruning is off).
+    """
+    candidate: dict
+    bound: float | None = None
+
+
+@dataclass(frozen=True)
+class CandidateScored:
+    """A candidate was enriched; stock is None if it failed the filters."""
+    symbol: str
+    stock: dict | None
+    entered_top_n: bool = False
+
+
+@dataclass(frozen=True)
+class LeaderboardChanged:
+    """Current top N, best first, after a stock entered it."""
+    stocks: list = field(default_factory=list)
+
+
+@dataclass(frozen=True)
+class BudgetWarning:
+    """The API budget ran out; the scan finishes with partial results."""
+    message: str
+    stage: str
+
+
+@dataclass(frozen=True)
+class ScanDone:
+    """Final result, in the same shape run_scan returns."""
+    result: dict
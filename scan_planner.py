@@ -0,0 +1,134 @@
+"""Up-front allocation of a scan's API budget across its stages."""
+import json
+import math
+import os
+import threading
+from dataclasses import dataclass, field, asdict
+from fmp_client import QUOTE_BATCH_SIZE
+
+# Share of candidates expected to survive the quick filter before any
+# scans have been recorded. The filter is deliberately liberal.
+DEFAULT_QUICK_PASS_RATE = 0.8
+
+# Weight of the newest scan in the running pass-rate average.
+PASS_RATE_SMOOTHING = 0.3
+
+
+class ScanStats:
+    """Quick-filter pass rate observed in earlier scans, kept on disk.
+
+    The rate is an exponential moving average, so it follows changes in
+    the market without swinging on one odd scan.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self._data = json.load(f)
+        except (OSError, ValueError):
+            self._data = {}
+
+    @property
+    def quick_pass_rate(self) -> float:
+        with self._lock:
+            return self._data.get("quick_pass_rate", DEFAULT_QUICK_PASS_RATE)
+
+    @property
+    def scans(self) -> int:
+        with self._lock:
+            return self._data.get("scans", 0)
+
+    def record(self, quoted: int, quick_passed: int):
+        """Fold one scan's quick-filter outcome in and save."""
+        if quoted <= 0:
+            return
+        rate = quick_passed / quoted
+        with self._lock:
+            if self._data.get("scans"):
+                old = self._data["quick_pass_rate"]
+                rate = old + PASS_RATE_SMOOTHING * (rate - old)
+            self._data["quick_pass_rate"] = round(rate, 4)
+            self._data["scans"] = self._data.get("scans", 0) + 1
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self._data, f)
+            os.replace(tmp, self.path)
+
+
+@dataclass
+class ScanPlan:
+    """What a scan will look at and how many calls each stage may use."""
+    sectors: list = field(default_factory=list)
+    candidates: list = field(default_factory=list)
+    budget: int = 0
+    quote_calls: int = 0
+    enrich_quota: int = 0
+    free_enrichments: int = 0
+    expected_enrich_calls: int = 0
+    quick_pass_rate: float = DEFAULT_QUICK_PASS_RATE
+
+    @property
+    def expected_calls(self) -> int:
+        return self.quote_calls + self.expected_enrich_calls
+
+    def to_dict(self) -> dict:
+        """Summary for scan metadata (without the candidate list)."""
+        summary = asdict(self)
+        del summary["candidates"]
+        summary["sectors"] = [s["sector"] for s in self.sectors]
+        summary["candidates"] = len(self.candidates)
+        summary["expected_calls"] = self.expected_calls
+        return summary
+
+
+def plan_scan(
+    sector_candidates: list[tuple[dict, list[dict]]],
+    budget: int,
+    is_free=lambda symbol: False,
+    quick_pass_rate: float = DEFAULT_QUICK_PASS_RATE,
+    batch_size: int = QUOTE_BATCH_SIZE,
+) -> ScanPlan:
+    """Choose sectors and per-stage call quotas for the given budget.
+
+    sector_candidates lists each winning sector with its candidates,
+    strongest sector first. is_free(symbol) says whether a symbol can be
+    enriched without an API call (fresh ATH index or price store).
+
+    Sectors are taken strongest first while the expected cost (quote
+    batches plus history calls for the expected quick-filter survivors
+    that aren't free) fits the budget; sector strength feeds the score,
+    so the strongest sectors are where calls most improve the top N. At
+    least one sector is always planned; if even its quotes don't fit,
+    its candidate list is cut to what can be quoted. Whatever the quotes
+    leave over becomes the enrichment quota.
+    """
+    budget = max(0, budget)
+    plan = ScanPlan(budget=budget, quick_pass_rate=quick_pass_rate)
+    paid = 0
+    for sector, members in sector_candidates:
+        members_paid = sum(1 for c in members if not is_free(c["symbol"]))
+        count = len(plan.candidates) + len(members)
+        quote_calls = math.ceil(count / batch_size)
+        expected = math.ceil((paid + members_paid) * quick_pass_rate)
+        if plan.sectors and quote_calls + expected > budget:
+            break
+        plan.sectors.append(sector)
+        plan.candidates.extend(members)
+        paid += members_paid
+
+    if math.ceil(len(plan.candidates) / batch_size) > budget:
+        plan.candidates = plan.candidates[:budget * batch_size]
+        paid = sum(1 for c in plan.candidates if not is_free(c["symbol"]))
+
+    plan.quote_calls = math.ceil(len(plan.candidates) / batch_size)
+    plan.enrich_quota = budget - plan.quote_calls
+    plan.free_enrichments = len(plan.candidates) - paid
+    plan.expected_enrich_calls = min(
+        plan.enrich_quota, math.ceil(paid * quick_pass_rate)
+    )
+    return plan
@@ -1,25 +1,133 @@
 """Core screening pipeline for swing trade candidates."""
+import heapq
 import time
+from collections import deque
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+    wait,
+    FIRST_COMPLETED,
+)
 from datetime import datetime
-from fmp_client import FMPClient, BudgetExhausted
+from ath_index import AthIndex
+from fmp_client import (
+    FMPClient,
+    BudgetExhausted,
+    ScanCancelled,
+    QUOTE_BATCH_SIZE,
+)
+from market_hours import last_session_date
+from price_store import PriceStore
+from scan_events import (
+    Progress,
+    SectorChosen,
+    CandidatePassed,
+    CandidateScored,
+    LeaderboardChanged,
+    BudgetWarning,
+    ScanPlanned,
+    ScanDone,
+)
+from scan_planner import (
+    DEFAULT_QUICK_PASS_RATE,
+    ScanPlan,
+    ScanStats,
+    plan_scan,
+)
 from stock_universe import get_stocks_by_sector
 from scoring import (
     calculate_ath,
+    calculate_ath_columns,
     calculate_pct_below_ath,
     calculate_upside,
     passes_filters,
     score_stock,
-    rank_stocks,
+    score_upper_bound,
+    TopNRanker,
 )
 
-# Only scan top 3 winning sectors to stay within 250 calls/day free tier.
-# Top 3 sectors = ~120-170 stocks = ~170 quote calls + ~30 historical = ~200 max
-MAX_SECTORS = 3
+
+class _InlineExecutor:
+    """Runs submitted work immediately, so the serial path shares the
+    pipeline code with the thread pool."""
+
+    def submit(self, fn, *args) -> Future:
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+class _StageTimes:
+    """Wall-clock seconds per pipeline stage.
+
+    Quote and enrich tasks overlap, so for those the wall time is the span
+    from the first task starting to the last one finishing, and busy time
+    (summed task durations) is kept as well.
+    """
+
+    def __init__(self):
+        self.wall = {}
+        self.busy = {}
+        self._spans = {}
+
+    def record(self, stage: str, started: float, ended: float = None):
+        ended = ended if ended is not None else time.perf_counter()
+        first = self._spans.get(stage, (started, ended))[0]
+        self._spans[stage] = (min(first, started), ended)
+        self.wall[stage] = self._spans[stage][1] - self._spans[stage][0]
+
+    def record_task(self, stage: str, started: float):
+        ended = time.perf_counter()
+        self.record(stage, started, ended)
+        self.busy[stage] = self.busy.get(stage, 0.0) + ended - started
+
+    def to_metadata(self) -> dict:
+        return {
+            "stage_seconds": {k: round(v, 4) for k, v in self.wall.items()},
+            "stage_busy_seconds": {
+                k: round(v, 4) for k, v in self.busy.items()
+            },
+        }
 
 
 class Scanner:
-    def __init__(self, client: FMPClient, config: dict = None):
+    def __init__(
+        self, client: FMPClient, config: dict = None, max_workers: int = 1,
+        price_store: PriceStore = None, ath_index: AthIndex = None,
+        prune: bool = True, stats: ScanStats = None,
+        universe: list[dict] = None,
+    ):
+        """max_workers > 1 runs the quote and enrichment stages on a thread
+        pool with that many requests in flight; 1 runs them serially.
+
+        With a price_store, history is synced incrementally into the local
+        store instead of re-downloading five years per symbol every scan.
+        With an ath_index, symbols whose ATH is already known through the
+        last close skip history entirely.
+
+        With prune, enrichment runs in descending order of each candidate's
+        optimistic score and stops once no remaining candidate can reach
+        the top N; the final ranking is unchanged.
+
+        With stats, the planner uses quick-filter pass rates from earlier
+        scans, and each finished scan adds to them.
+
+        universe replaces the built-in S&P 500 list (same shape: symbol,
+        name and GICS sector), e.g. for larger synthetic universes.
+        """
         self.client = client
+        self.max_workers = max_workers
+        self.price_store = price_store
+        self.ath_index = ath_index
+        self.prune = prune
+        self.stats = stats
+        self.universe = universe
         self.config = config or {
             "market_cap_min": 1_000_000_000,
             "volume_min": 500_000,
@@ -28,8 +136,11 @@ class Scanner:
             "top_n": 15,
         }
 
-    def get_winning_sectors(self) -> list[dict]:
-        """Step 1: Get top 3 sectors outperforming the market."""
+    def get_winning_sectors(self, limit: int = None) -> list[dict]:
+        """Step 1: Get sectors outperforming the market, strongest first.
+
+        How many are scanned is up to the planner; limit just truncates.
+        """
         sectors = self.client.get_sector_performance()
         winning = [
             s for s in sectors
@@ -39,7 +150,7 @@ class Scanner:
             key=lambda s: float(s["changesPercentage"].replace("%", "")),
             reverse=True,
         )
-        return winning[:MAX_SECTORS]
+        return winning[:limit]
 
     def get_candidates(self, sectors: list[dict]) -> list[dict]:
         """Step 2: Get stocks from embedded universe in winning sectors."""
@@ -49,7 +160,10 @@ class Scanner:
             sector_perf = float(
                 sector_data["changesPercentage"].replace("%", "")
             )
-            stocks = get_stocks_by_sector(fmp_sector_name)
+            if self.universe is None:
+                stocks = get_stocks_by_sector(fmp_sector_name)
+            else:
+                stocks = get_stocks_by_sector(fmp_sector_name, self.universe)
             for stock in stocks:
                 candidates.append({
                     "symbol": stock["symbol"],
@@ -59,16 +173,45 @@ class Scanner:
                 })
         return candidates
 
-    def quick_filter(self, candidate: dict) -> dict | None:
+    def _enrichment_is_free(self, symbol: str, as_of=None) -> bool:
+        """True if enriching symbol needs no API call."""
+        as_of = as_of or last_session_date()
+        if self.ath_index is not None and self.ath_index.is_fresh(
+            symbol, as_of
+        ):
+            return True
+        return self.price_store is not None and self.price_store.is_fresh(
+            symbol, as_of
+        )
+
+    def plan(self, winning_sectors: list[dict]) -> ScanPlan:
+        """Fit the scan to the calls left in the client's budget."""
+        as_of = last_session_date()
+        return plan_scan(
+            [(s, self.get_candidates([s])) for s in winning_sectors],
+            budget=self.client.call_budget - self.client.calls_made,
+            is_free=lambda symbol: self._enrichment_is_free(symbol, as_of),
+            quick_pass_rate=(
+                self.stats.quick_pass_rate if self.stats is not None
+                else DEFAULT_QUICK_PASS_RATE
+            ),
+        )
+
+    def quick_filter(
+        self, candidate: dict, quote: dict | None = None
+    ) -> dict | None:
         """Step 3a: Quick filter using quote data.
 
         Uses 52-week high as initial screen. Passes liberally since the
         true ATH (from 5 years of history) may be much higher than the
         52-week high — a stock near its 52-week high could still be 30%
         below its multi-year ATH.
+
+        Fetches the quote itself unless one is passed in (batch path).
         """
         symbol = candidate["symbol"]
-        quote = self.client.get_quote(symbol)
+        if quote is None:
+            quote = self.client.get_quote(symbol)
 
         price = quote.get("price", 0)
         year_high = quote.get("yearHigh", 0)
@@ -94,13 +237,59 @@ class Scanner:
             "avgVolume": quote.get("averageVolume", 0),
         }
 
+    def quick_filter_batch(self, candidates: list[dict]) -> list[dict]:
+        """Step 3a (batched): one batch quote call per chunk of candidates.
+
+        Candidates without a quote are dropped, as are those that fail
+        the quick filter. Input order is preserved.
+        """
+        quotes = self.client.get_quotes([c["symbol"] for c in candidates])
+        passed = []
+        for candidate in candidates:
+            quote = quotes.get(candidate["symbol"])
+            if not quote:
+                continue
+            result = self.quick_filter(candidate, quote=quote)
+            if result:
+                passed.append(result)
+        return passed
+
     def enrich_candidate(self, candidate: dict) -> dict | None:
         """Step 3b: Get 5-year historical data for true ATH, then score."""
         symbol = candidate["symbol"]
+        as_of = last_session_date()
 
-        historical = self.client.get_historical_prices(symbol)
-        hist_data = historical.get("historical", [])
-        ath = calculate_ath(hist_data)
+        if self.ath_index is not None and self.ath_index.is_fresh(
+            symbol, as_of
+        ):
+            ath = self.ath_index.get(symbol)["ath"]
+        else:
+            if self.price_store is not None:
+                # Zero-copy views; the store only holds completed sessions
+                # Read first: if the history is rebuilt while syncing, the
+                # entry is tagged with the old version and rebuilt next time
+                version = self.price_store.version(symbol)
+                columns = self.price_store.sync_columns(self.client, symbol)
+                ath = calculate_ath_columns(columns["high"])
+                if self.ath_index is not None:
+                    self.ath_index.update_columns(
+                        symbol, columns["date"], columns["high"],
+                        synced_through=as_of.isoformat(), version=version,
+                    )
+            else:
+                historical = self.client.get_historical_prices(symbol)
+                hist_data = historical.get("historical", [])
+                ath = calculate_ath(hist_data)
+                if self.ath_index is not None:
+                    # Only completed sessions go into the index
+                    self.ath_index.update(
+                        symbol,
+                        [
+                            bar for bar in hist_data
+                            if bar.get("date", "") <= as_of.isoformat()
+                        ],
+                        synced_through=as_of.isoformat(),
+                    )
 
         if ath is None:
             ath = candidate.get("yearHigh", 0)
@@ -131,92 +320,255 @@ class Scanner:
         enriched["score"] = score_stock(enriched)
         return enriched
 
-    def run_scan(self, progress_callback=None) -> dict:
-        """Run the full screening pipeline.
+    def _score_candidate(self, candidate: dict) -> dict | None:
+        """Enrich a candidate; None unless it passes the ATH filters."""
+        result = self.enrich_candidate(candidate)
+        if result and passes_filters(
+            result,
+            ath_min=self.config["ath_min"],
+            ath_max=self.config["ath_max"],
+        ):
+            return result
+        return None
 
-        Pipeline:
-        1. Get sector performance -> find top 3 winning sectors
-        2. Get candidates from S&P 500 universe in those sectors
-        3a. Quick filter: get quote, check 52-week range
-        3b. Deep enrich: get 5-year historical prices for true ATH, score
-        4. Rank and return top N
+    def _calls(self) -> str:
+        return (
+            f"({self.client.calls_made}/{self.client.call_budget} "
+            f"API calls)"
+        )
+
+    def _progress(self, message: str) -> Progress:
+        return Progress(
+            message,
+            calls_made=self.client.calls_made,
+            call_budget=self.client.call_budget,
+        )
+
+    def iter_scan(self):
+        """Run the pipeline, yielding events from scan_events as it goes.
+
+        Quote batches and enrichment share one pool of max_workers slots,
+        so stocks are enriched while later batches are still being quoted.
+        Quick-filter survivors wait in a frontier ordered by optimistic
+        score. With prune, a survivor whose bound can't reach the current
+        top N cutoff is dropped, and so is everything queued behind it.
+        Only the frontier and the top N are held in memory; scored stocks
+        outside the top N are not kept.
 
-        Handles BudgetExhausted gracefully by returning partial results.
+        Before quoting, the planner picks the sectors and candidates that
+        fit the remaining budget and sets an enrichment quota: candidates
+        that would need a history call are skipped once the quota is
+        spent, while free ones (fresh ATH index or price store) still run.
+        A paid enrichment only starts early if the quota would still cover
+        every candidate not yet quoted, so the quota goes to the same
+        candidates as on the serial path.
+
+        The last event is ScanDone with the same result run_scan returns.
+        BudgetExhausted ends the scan early with partial results;
+        ScanCancelled is re-raised once in-flight calls have drained.
         """
         start_time = time.time()
+        times = _StageTimes()
         budget_warning = None
+        top_n = self.config["top_n"]
+        ath_max = self.config["ath_max"]
 
         # Step 1: Sector performance
-        if progress_callback:
-            progress_callback("Analyzing sector performance...")
+        yield self._progress("Analyzing sector performance...")
+        started = time.perf_counter()
         winning_sectors = self.get_winning_sectors()
+        times.record("sectors", started)
 
-        # Step 2: Get candidates from universe
-        if progress_callback:
-            progress_callback(
-                f"Found {len(winning_sectors)} top sectors, "
-                f"loading candidates..."
+        # Step 2: Plan sectors and candidates around the budget left
+        started = time.perf_counter()
+        plan = self.plan(winning_sectors)
+        times.record("plan", started)
+        yield ScanPlanned(plan)
+        winning_sectors = plan.sectors
+        for s in winning_sectors:
+            yield SectorChosen(
+                s["sector"],
+                float(s["changesPercentage"].replace("%", "")),
             )
-        candidates = self.get_candidates(winning_sectors)
-
-        # Step 3a: Quick filter with quotes
-        quick_passed = []
+        candidates = plan.candidates
         total = len(candidates)
-        for i, candidate in enumerate(candidates):
-            if progress_callback and i % 10 == 0:
-                progress_callback(
-                    f"Screening {i+1}/{total}: {candidate['symbol']}... "
-                    f"({self.client.calls_made}/{self.client.call_budget} "
-                    f"API calls)"
-                )
-            try:
-                result = self.quick_filter(candidate)
-                if result:
-                    quick_passed.append(result)
-            except BudgetExhausted as e:
-                budget_warning = str(e)
-                if progress_callback:
-                    progress_callback(
-                        f"API budget reached at {i+1}/{total}. "
-                        f"Continuing with {len(quick_passed)} candidates..."
-                    )
-                break
-            except Exception:
-                continue
+        yield self._progress(
+            f"Planned {len(winning_sectors)} top sectors, {total} "
+            f"candidates (~{plan.expected_calls} of {plan.budget} "
+            f"calls)..."
+        )
+        as_of = last_session_date()
 
-        # Step 3b: Deep enrich with historical data
-        enriched = []
-        for i, candidate in enumerate(quick_passed):
-            if progress_callback:
-                progress_callback(
-                    f"Deep analysis {i+1}/{len(quick_passed)}: "
-                    f"{candidate['symbol']}... "
-                    f"({self.client.calls_made}/{self.client.call_budget} "
-                    f"API calls)"
-                )
-            try:
-                result = self.enrich_candidate(candidate)
-                if result and passes_filters(
-                    result,
-                    ath_min=self.config["ath_min"],
-                    ath_max=self.config["ath_max"],
-                ):
-                    enriched.append(result)
-            except BudgetExhausted as e:
-                budget_warning = str(e)
-                if progress_callback:
-                    progress_callback(
-                        f"API budget reached during enrichment. "
-                        f"Continuing with {len(enriched)} scored stocks..."
-                    )
-                break
-            except Exception:
-                continue
+        # Steps 3a/3b: quote batches feed the enrichment frontier
+        chunks = deque(
+            (i, candidates[i:i + QUOTE_BATCH_SIZE])
+            for i in range(0, total, QUOTE_BATCH_SIZE)
+        )
+        # Candidates in batches not yet quoted (queued or in flight)
+        unquoted = total
+        position = {c["symbol"]: i for i, c in enumerate(candidates)}
+        frontier = []
+        ranker = TopNRanker(limit=top_n)
+        quoted = 0
+        quick_passed = 0
+        enrich_started = 0
+        paid_started = 0
+        over_quota = 0
+        passed = 0
+        pruned = 0
+        seq = 0
+        stopped = False
+        quotes_exhausted = False
+        cancelled = None
+
+        if self.max_workers > 1:
+            pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        else:
+            pool = _InlineExecutor()
+        slots = max(1, self.max_workers)
+        pending = {}  # future -> (submission order, stage, payload)
+
+        try:
+            while True:
+                while not stopped and len(pending) < slots:
+                    if chunks:
+                        start, chunk = chunks.popleft()
+                        yield self._progress(
+                            f"Screening {start+1}-{start+len(chunk)}/"
+                            f"{total}... {self._calls()}"
+                        )
+                        started = time.perf_counter()
+                        future = pool.submit(self.quick_filter_batch, chunk)
+                        pending[future] = (seq, "quote", start, started)
+                    elif frontier:
+                        bound, candidate = frontier[0][-2], frontier[0][-1]
+                        if self.prune and not ranker.would_accept(
+                            bound, candidate["symbol"]
+                        ):
+                            # Everything left in the frontier is worse
+                            pruned += len(frontier)
+                            frontier.clear()
+                            continue
+                        if not self._enrichment_is_free(
+                            candidate["symbol"], as_of
+                        ):
+                            if paid_started >= plan.enrich_quota:
+                                heapq.heappop(frontier)
+                                over_quota += 1
+                                continue
+                            if paid_started >= plan.enrich_quota - unquoted:
+                                # Batches still being quoted could hold
+                                # better candidates this quota unit is for
+                                break
+                            paid_started += 1
+                        heapq.heappop(frontier)
+                        enrich_started += 1
+                        yield self._progress(
+                            f"Deep analysis {enrich_started}/"
+                            f"{quick_passed - pruned - over_quota}: "
+                            f"{candidate['symbol']}... {self._calls()}"
+                        )
+                        started = time.perf_counter()
+                        future = pool.submit(
+                            self._score_candidate, candidate
+                        )
+                        pending[future] = (
+                            seq, "enrich", candidate, started
+                        )
+                    else:
+                        break
+                    seq += 1
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in sorted(done, key=lambda f: pending[f][0]):
+                    _, stage, payload, started = pending.pop(future)
+                    times.record_task(stage, started)
+                    if stage == "quote":
+                        unquoted -= min(QUOTE_BATCH_SIZE, total - payload)
+                    try:
+                        result = future.result()
+                    except BudgetExhausted as e:
+                        # Stop quoting but keep enriching what we have:
+                        # cached history and fresh ATHs cost no calls.
+                        # Out of budget during enrichment ends the scan.
+                        if budget_warning is None:
+                            # Warn once; the first message says where the
+                            # scan ran short
+                            budget_warning = str(e)
+                            yield BudgetWarning(budget_warning, stage)
+                        if stage == "quote" and not quotes_exhausted:
+                            quotes_exhausted = True
+                            unquoted -= sum(len(c) for _, c in chunks)
+                            chunks.clear()
+                            yield self._progress(
+                                f"API budget reached at "
+                                f"{payload+1}/{total}. Continuing "
+                                f"with {quick_passed} candidates..."
+                            )
+                        elif stage == "enrich" and not stopped:
+                            stopped = True
+                            yield self._progress(
+                                f"API budget reached during "
+                                f"enrichment. Continuing with "
+                                f"{passed} scored stocks..."
+                            )
+                        continue
+                    except ScanCancelled as e:
+                        cancelled = e
+                        stopped = True
+                        continue
+                    except Exception:
+                        result = None
+
+                    if stage == "quote":
+                        if result is not None:
+                            quoted += min(QUOTE_BATCH_SIZE, total - payload)
+                        for candidate in result or []:
+                            quick_passed += 1
+                            bound = None
+                            if self.prune:
+                                bound = score_upper_bound(
+                                    candidate, ath_max=ath_max
+                                )
+                                key = (-bound, candidate["symbol"])
+                            else:
+                                # Input order, whichever batch lands first
+                                key = (position[candidate["symbol"]],)
+                            heapq.heappush(
+                                frontier,
+                                (*key, quick_passed, bound, candidate),
+                            )
+                            yield CandidatePassed(candidate, bound)
+                    else:
+                        entered = False
+                        if result:
+                            passed += 1
+                            entered = ranker.add(result)
+                        yield CandidateScored(
+                            payload["symbol"], result, entered
+                        )
+                        if entered:
+                            yield LeaderboardChanged(
+                                [dict(s) for s in ranker.ranked()]
+                            )
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+        if cancelled is not None:
+            raise cancelled
 
         # Step 4: Rank
-        if progress_callback:
-            progress_callback("Ranking candidates...")
-        ranked = rank_stocks(enriched, limit=self.config["top_n"])
+        yield self._progress("Ranking candidates...")
+        started = time.perf_counter()
+        ranked = ranker.ranked()
+        if self.ath_index is not None:
+            self.ath_index.save()
+        if self.stats is not None:
+            self.stats.record(quoted, quick_passed)
+        times.record("rank", started)
 
         elapsed = round(time.time() - start_time, 1)
 
@@ -224,6 +576,7 @@ class Scanner:
             "stocks": ranked,
             "scan_metadata": {
                 "timestamp": datetime.now().isoformat(),
+                "config": dict(self.config),
                 "winning_sectors": [
                     {
                         "name": s["sector"],
@@ -233,15 +586,49 @@ class Scanner:
                     }
                     for s in winning_sectors
                 ],
-                "total_candidates": len(candidates),
-                "quick_filtered": len(quick_passed),
-                "passed_filters": len(enriched),
+                "total_candidates": total,
+                "quick_filtered": quick_passed,
+                "passed_filters": passed,
+                "enrichment_pruned": pruned,
+                "enrichment_over_quota": over_quota,
+                "plan": plan.to_dict(),
                 "api_calls_used": self.client.calls_made,
                 "elapsed_seconds": elapsed,
+                **times.to_metadata(),
+                "api": self.client.stats(),
             },
         }
 
         if budget_warning:
             result["scan_metadata"]["budget_warning"] = budget_warning
 
-        return result
+        yield ScanDone(result)
+
+    def run_scan(
+        self, progress_callback=None, leaderboard_callback=None
+    ) -> dict:
+        """Run the full screening pipeline.
+
+        Pipeline:
+        1. Get sector performance -> find winning sectors
+        2. Plan: pick as many of the strongest sectors as the budget
+           allows and take their candidates from the S&P 500 universe
+        3a. Quick filter: batch quotes, check 52-week range
+        3b. Deep enrich: get 5-year historical prices for true ATH, score,
+            skipping candidates that can no longer reach the top N
+        4. Rank and return top N
+
+        Thin wrapper over iter_scan(). Handles BudgetExhausted gracefully
+        by returning partial results. leaderboard_callback, if given,
+        receives the current ranked top N every time a newly scored stock
+        enters it.
+        """
+        for event in self.iter_scan():
+            if isinstance(event, Progress):
+                if progress_callback:
+                    progress_callback(event.message)
+            elif isinstance(event, LeaderboardChanged):
+                if leaderboard_callback:
+                    leaderboard_callback(event.stocks)
+            elif isinstance(event, ScanDone):
+                return event.result
@@ -1,4 +1,20 @@
 """Pure scoring and filtering functions for swing trade candidates."""
+import heapq
+import numpy as np
+
+# Conviction score component weights (see score_stock).
+SCORE_WEIGHTS = {
+    "upside": 0.35,
+    "sector": 0.20,
+    "volume": 0.15,
+    "value": 0.30,
+}
+
+# Input columns for score_batch, keyed like the per-stock dicts.
+BATCH_COLUMNS = (
+    "price", "yearHigh", "yearLow", "volume", "avgVolume", "ath",
+    "sector_performance",
+)
 
 
 def calculate_ath(historical: list[dict]) -> float | None:
@@ -8,6 +24,13 @@ def calculate_ath(historical: list[dict]) -> float | None:
     return max(entry["high"] for entry in historical)
 
 
+def calculate_ath_columns(highs: np.ndarray) -> float | None:
+    """calculate_ath for a column of daily highs; NaNs are ignored."""
+    if not len(highs) or np.isnan(highs).all():
+        return None
+    return float(np.nanmax(highs))
+
+
 def calculate_pct_below_ath(current_price: float, ath: float) -> float:
     """Calculate percentage below all-time high."""
     if ath == 0:
@@ -65,18 +88,213 @@ def score_stock(stock: dict) -> float:
         value_score = 50
 
     score = (
-        upside_score * 0.35
-        + sector_score * 0.20
-        + volume_score * 0.15
-        + value_score * 0.30
+        upside_score * SCORE_WEIGHTS["upside"]
+        + sector_score * SCORE_WEIGHTS["sector"]
+        + volume_score * SCORE_WEIGHTS["volume"]
+        + value_score * SCORE_WEIGHTS["value"]
     )
 
     return round(max(0, min(100, score)), 1)
 
 
+def max_upside_pct(ath_max: float) -> float:
+    """Largest upside a stock can have and still pass the ATH filter.
+
+    With the target at the ATH, being at most ath_max% below it caps upside
+    at ath_max / (100 - ath_max). Allows for the 0.1 rounding the scanner
+    applies to pct_below_ath and upside_pct.
+    """
+    p = (ath_max + 0.05) / 100
+    if p >= 1:
+        return float("inf")
+    return p / (1 - p) * 100 + 0.05
+
+
+def score_upper_bound(stock: dict, ath_max: float = 50.0) -> float:
+    """Optimistic conviction score from quote data alone.
+
+    Sector, volume and value components only need the quote. Upside needs
+    the ATH, so it is taken at its maximum for a stock that could still
+    pass the filters. score_stock is monotone in upside, so no stock can
+    score above this once enriched.
+    """
+    return score_stock({**stock, "upside_pct": max_upside_pct(ath_max)})
+
+
+def stocks_to_columns(stocks: list[dict]) -> dict[str, np.ndarray]:
+    """Convert per-stock dicts into the columnar arrays score_batch takes."""
+    return {
+        name: np.array(
+            [s.get(name) or 0 for s in stocks], dtype=np.float64
+        )
+        for name in BATCH_COLUMNS
+    }
+
+
+def _safe_divide(num, den, default):
+    out = np.full(np.broadcast(num, den).shape, default, dtype=np.float64)
+    np.divide(num, den, out=out, where=den != 0)
+    return out
+
+
+def score_batch(
+    columns: dict[str, np.ndarray],
+    ath_min: float = 15.0,
+    ath_max: float = 50.0,
+    weights=None,
+) -> dict[str, np.ndarray]:
+    """Score many stocks in one vectorized pass.
+
+    columns holds equal-length arrays for each name in BATCH_COLUMNS, with
+    the target taken to be the ATH as in the scanner. Returns arrays for
+    pct_below_ath, upside_pct, each component score, the passes_filters
+    mask and the final score, matching score_stock/passes_filters per row.
+
+    weights defaults to SCORE_WEIGHTS. Pass a list of weight dicts to score
+    several variants at once; "score" then has shape (variants, stocks).
+    """
+    price = np.asarray(columns["price"], dtype=np.float64)
+    year_high = np.asarray(columns["yearHigh"], dtype=np.float64)
+    year_low = np.asarray(columns["yearLow"], dtype=np.float64)
+    volume = np.asarray(columns["volume"], dtype=np.float64)
+    avg_volume = np.asarray(columns["avgVolume"], dtype=np.float64)
+    ath = np.asarray(columns["ath"], dtype=np.float64)
+    sector_perf = np.asarray(
+        columns["sector_performance"], dtype=np.float64
+    )
+
+    # Same rounding the scanner applies before filtering and scoring
+    pct_below = np.round(_safe_divide((ath - price) * 100, ath, 0.0), 1)
+    upside = np.round(_safe_divide((ath - price) * 100, price, 0.0), 1)
+
+    upside_score = np.minimum(upside, 100)
+    sector_score = np.clip((sector_perf + 5) * 10, 0, 100)
+    vol_ratio = np.where(
+        avg_volume > 0, _safe_divide(volume, avg_volume, 1.0), 1.0
+    )
+    volume_score = np.clip(vol_ratio * 50, 0, 100)
+    value_score = _safe_divide(
+        (year_high - price) * 100, year_high - year_low, 50.0
+    )
+    value_score = np.where(year_high - year_low > 0, value_score, 50.0)
+
+    components = np.stack(
+        [upside_score, sector_score, volume_score, value_score]
+    )
+    if weights is None or isinstance(weights, dict):
+        w = weights or SCORE_WEIGHTS
+        weight_matrix = np.array(
+            [w["upside"], w["sector"], w["volume"], w["value"]]
+        )
+    else:
+        weight_matrix = np.array(
+            [[w["upside"], w["sector"], w["volume"], w["value"]]
+             for w in weights]
+        )
+    score = np.round(np.clip(weight_matrix @ components, 0, 100), 1)
+
+    return {
+        "pct_below_ath": pct_below,
+        "upside_pct": upside,
+        "upside_score": upside_score,
+        "sector_score": sector_score,
+        "volume_score": volume_score,
+        "value_score": value_score,
+        "passes": (pct_below >= ath_min) & (pct_below <= ath_max) & (ath > 0),
+        "score": score,
+    }
+
+
+class _RankEntry:
+    """Heap entry ordered so the worst-ranked stock sorts first."""
+
+    __slots__ = ("score", "key", "stock")
+
+    def __init__(self, score: float, key: str, stock: dict):
+        self.score = score
+        self.key = key
+        self.stock = stock
+
+    def __lt__(self, other: "_RankEntry") -> bool:
+        if self.score != other.score:
+            return self.score < other.score
+        return self.key > other.key
+
+
+class TopNRanker:
+    """Bounded top-N leaderboard fed one scored stock at a time.
+
+    Keeps the best ``limit`` stocks in a min-heap, so each insertion costs
+    O(log limit). Ties on score are broken by ``tie_key`` ascending (the
+    symbol by default), which makes the ranking independent of insertion
+    order.
+    """
+
+    def __init__(self, limit: int = 15, tie_key: str = "symbol"):
+        self.limit = limit
+        self.tie_key = tie_key
+        self._heap = []
+        self.seen = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def _entry(self, stock: dict) -> _RankEntry:
+        return _RankEntry(
+            stock["score"], str(stock.get(self.tie_key) or ""), stock
+        )
+
+    @property
+    def threshold(self) -> float | None:
+        """Score of the current N-th best stock, or None until N are held.
+
+        A new stock must beat this (or tie it and win the tie-break) to
+        enter the leaderboard.
+        """
+        if self.limit <= 0:
+            return float("inf")
+        if len(self._heap) < self.limit:
+            return None
+        return self._heap[0].score
+
+    def would_accept(self, score: float, key: str = "") -> bool:
+        """True if a stock with this score and tie key would be kept."""
+        if self.limit <= 0:
+            return False
+        if len(self._heap) < self.limit:
+            return True
+        return self._heap[0] < _RankEntry(score, str(key or ""), None)
+
+    def add(self, stock: dict) -> bool:
+        """Offer a scored stock. Returns True if it made the leaderboard."""
+        self.seen += 1
+        if self.limit <= 0:
+            return False
+        entry = self._entry(stock)
+        if len(self._heap) < self.limit:
+            heapq.heappush(self._heap, entry)
+            return True
+        if self._heap[0] < entry:
+            heapq.heapreplace(self._heap, entry)
+            return True
+        return False
+
+    def ranked(self) -> list[dict]:
+        """Current leaderboard, best first, with the rank field set."""
+        ordered = sorted(self._heap, reverse=True)
+        stocks = []
+        for i, entry in enumerate(ordered):
+            entry.stock["rank"] = i + 1
+            stocks.append(entry.stock)
+        return stocks
+
+
 def rank_stocks(stocks: list[dict], limit: int = 15) -> list[dict]:
-    """Sort stocks by score descending and add rank."""
-    sorted_stocks = sorted(stocks, key=lambda s: s["score"], reverse=True)
-    for i, stock in enumerate(sorted_stocks[:limit]):
-        stock["rank"] = i + 1
-    return sorted_stocks[:limit]
+    """Sort stocks by score descending and add rank.
+
+    Ties on score are ordered by symbol.
+    """
+    ranker = TopNRanker(limit=limit)
+    for stock in stocks:
+        ranker.add(stock)
+    return ranker.ranked()
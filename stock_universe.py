@@ -2544,10 +2544,16 @@ SP500 = [
 ]
 
 
-def get_stocks_by_sector(sector_fmp_name: str) -> list[dict]:
-    """Get all S&P 500 stocks in a given sector (using FMP sector name)."""
+def get_stocks_by_sector(
+    sector_fmp_name: str, universe: list[dict] = None
+) -> list[dict]:
+    """Get all S&P 500 stocks in a given sector (using FMP sector name).
+
+    Pass universe to search another stock list of the same shape.
+    """
     gics_name = FMP_TO_GICS.get(sector_fmp_name, sector_fmp_name)
-    return [s for s in SP500 if s["sector"] == gics_name]
+    stocks = SP500 if universe is None else universe
+    return [s for s in stocks if s["sector"] == gics_name]
 
 
 def get_all_sectors() -> list[str]:
@@ -1,15 +1,35 @@
 import pytest
 import json
 import os
+import threading
 from unittest.mock import patch, Mock
 from app import create_app
 
 
 @pytest.fixture
-def app_client():
-    app = create_app(testing=True)
-    with app.test_client() as c:
-        yield c, app
+def app_client(tmp_path):
+    from budget_ledger import BudgetLedger
+    from scan_archive import ScanArchive
+    ledger = BudgetLedger(str(tmp_path / "budget.sqlite"))
+    archive = ScanArchive(str(tmp_path / "scan_archive.sqlite"))
+    with patch("app.BUDGET_LEDGER", ledger), \
+         patch("app.SCAN_ARCHIVE", archive):
+        app = create_app(testing=True)
+        with app.test_client() as c:
+            yield c, app
+
+
+@pytest.fixture
+def scan_mocks(app_client):
+    """An API key set, FMPClient and Scanner mocked and reports unsaved.
+    Yields the (FMPClient, Scanner) mock classes."""
+    with patch.dict(os.environ, {"FMP_API_KEY": "test_key"}), \
+         patch("app.FMPClient") as mock_fmp_cls, \
+         patch("app.Scanner") as mock_scanner_cls, \
+         patch("app._save_report"):
+        mock_fmp_cls.return_value.calls_made = 0
+        mock_fmp_cls.return_value.call_budget = 200
+        yield mock_fmp_cls, mock_scanner_cls
 
 
 class TestIndexRoute:
@@ -21,24 +41,27 @@ class TestIndexRoute:
 
 
 class TestScanRoute:
-    def test_returns_scan_results(self, app_client):
-        client, _ = app_client
-        with patch.dict(os.environ, {"FMP_API_KEY": "test_key"}), \
-             patch("app.FMPClient") as mock_fmp_cls, \
-             patch("app.Scanner") as mock_scanner_cls, \
-             patch("app._save_report"):
-            mock_scanner = Mock()
-            mock_scanner.run_scan.return_value = {
-                "stocks": [{"symbol": "AAPL", "score": 75.0, "rank": 1}],
-                "scan_metadata": {"total_candidates": 50},
-            }
-            mock_scanner_cls.return_value = mock_scanner
+    def test_returns_scan_results(self, app_client, scan_mocks):
+        client, app = app_client
+        _, mock_scanner_cls = scan_mocks
+        mock_scanner = Mock()
+        mock_scanner.run_scan.return_value = {
+            "stocks": [{"symbol": "AAPL", "score": 75.0, "rank": 1}],
+            "scan_metadata": {"total_candidates": 50},
+        }
+        mock_scanner_cls.return_value = mock_scanner
 
-            resp = client.post("/api/scan")
-            assert resp.status_code == 200
-            data = json.loads(resp.data)
-            assert "stocks" in data
-            assert len(data["stocks"]) == 1
+        resp = client.post("/api/scan")
+        assert resp.status_code == 202
+        job_id = json.loads(resp.data)["job_id"]
+        app.scan_jobs.wait(job_id, timeout=5)
+
+        resp = client.get(f"/api/scan/{job_id}")
+        assert resp.status_code == 200
+        data = json.loads(resp.data)
+        assert data["status"] == "completed"
+        assert "stocks" in data["result"]
+        assert len(data["result"]["stocks"]) == 1
 
     def test_returns_error_without_api_key(self, app_client, monkeypatch):
         client, _ = app_client
@@ -55,30 +78,459 @@ class TestCSVRoute:
         resp = client.get("/api/csv")
         assert resp.status_code == 400
 
-    def test_returns_csv_after_scan(self, app_client):
+    def test_returns_csv_after_scan(self, app_client, scan_mocks):
+        client, app = app_client
+        _, mock_scanner_cls = scan_mocks
+        mock_scanner = Mock()
+        mock_scanner.run_scan.return_value = {
+            "stocks": [{
+                "rank": 1, "symbol": "AAPL", "name": "Apple",
+                "sector": "Technology", "sector_performance": 2.35,
+                "price": 150.0, "yearHigh": 200.0, "ath": 220.0,
+                "pct_below_ath": 31.8, "target_price": 220.0,
+                "upside_pct": 46.7, "score": 75.0,
+            }],
+            "scan_metadata": {"total_candidates": 50},
+        }
+        mock_scanner_cls.return_value = mock_scanner
+
+        # Run scan first
+        resp = client.post("/api/scan")
+        app.scan_jobs.wait(json.loads(resp.data)["job_id"], timeout=5)
+
+        # Then download CSV
+        resp = client.get("/api/csv")
+        assert resp.status_code == 200
+        assert resp.content_type == "text/csv; charset=utf-8"
+        assert b"AAPL" in resp.data
+
+    def test_job_csv_and_cache_hit_export_that_scan(
+        self, app_client, scan_mocks
+    ):
+        client, app = app_client
+        _, mock_scanner_cls = scan_mocks
+        mock_scanner_cls.return_value.run_scan.side_effect = [
+            {"stocks": [{"symbol": "AAPL"}], "scan_metadata": {}},
+            {"stocks": [{"symbol": "MSFT"}], "scan_metadata": {}},
+        ]
+        first = json.loads(
+            client.post("/api/scan", json={"top_n": 10}).data
+        )["job_id"]
+        app.scan_jobs.wait(first, timeout=5)
+        second = json.loads(
+            client.post("/api/scan", json={"top_n": 5}).data
+        )["job_id"]
+        app.scan_jobs.wait(second, timeout=5)
+
+        resp = client.get(f"/api/scan/{first}/csv")
+        assert resp.status_code == 200
+        assert b"AAPL" in resp.data and b"MSFT" not in resp.data
+
+        # A cache hit on the first settings makes it the latest scan
+        resp = client.post("/api/scan", json={"top_n": 10})
+        assert json.loads(resp.data)["cached"] is True
+        assert b"AAPL" in client.get("/api/csv").data
+
+    def test_job_csv_unknown_job(self, app_client):
         client, _ = app_client
+        assert client.get("/api/scan/nope/csv").status_code == 404
+
+
+class TestScanJobs:
+    def _blocking_scanner(self, started, release):
+        def run_scan(progress_callback=None, leaderboard_callback=None):
+            progress_callback("Analyzing sector performance...")
+            started.set()
+            release.wait(5)
+            return {"stocks": [], "scan_metadata": {}}
+
+        scanner = Mock()
+        scanner.run_scan.side_effect = run_scan
+        return scanner
+
+    def test_unknown_job_returns_404(self, app_client):
+        client, _ = app_client
+        assert client.get("/api/scan/nope").status_code == 404
+        assert client.delete("/api/scan/nope").status_code == 404
+
+    def test_reports_progress_while_running(self, app_client, scan_mocks):
+        client, app = app_client
+        started, release = threading.Event(), threading.Event()
+        _, mock_scanner_cls = scan_mocks
+        mock_scanner_cls.return_value = self._blocking_scanner(
+            started, release
+        )
+        job_id = json.loads(client.post("/api/scan").data)["job_id"]
+        assert started.wait(5)
+        data = json.loads(client.get(f"/api/scan/{job_id}").data)
+        assert data["status"] == "running"
+        assert data["progress"] == "Analyzing sector performance..."
+        assert data["result"] is None
+        release.set()
+        app.scan_jobs.wait(job_id, timeout=5)
+
+    def test_duplicate_scan_shares_job(self, app_client, scan_mocks):
+        client, app = app_client
+        started, release = threading.Event(), threading.Event()
+        _, mock_scanner_cls = scan_mocks
+        mock_scanner_cls.return_value = self._blocking_scanner(
+            started, release
+        )
+        first = json.loads(client.post("/api/scan").data)
+        second = json.loads(client.post("/api/scan").data)
+        assert second["job_id"] == first["job_id"]
+        assert second["duplicate"] is True
+        release.set()
+        app.scan_jobs.wait(first["job_id"], timeout=5)
+        assert mock_scanner_cls.return_value.run_scan.call_count == 1
+
+    def test_cancel_running_job(self, app_client, scan_mocks):
+        client, app = app_client
+        started, release = threading.Event(), threading.Event()
+        _, mock_scanner_cls = scan_mocks
+        mock_scanner_cls.return_value = self._blocking_scanner(
+            started, release
+        )
+        job_id = json.loads(client.post("/api/scan").data)["job_id"]
+        assert started.wait(5)
+        resp = client.delete(f"/api/scan/{job_id}")
+        assert resp.status_code == 200
+        assert app.scan_jobs.get(job_id).cancel_event.is_set()
+        release.set()
+        app.scan_jobs.wait(job_id, timeout=5)
+        data = json.loads(client.get(f"/api/scan/{job_id}").data)
+        assert data["status"] == "cancelled"
+
+    def test_cancel_detaches_from_joined_job(self, app_client, scan_mocks):
+        client, app = app_client
+        started, release = threading.Event(), threading.Event()
+        _, mock_scanner_cls = scan_mocks
+        mock_scanner_cls.return_value = self._blocking_scanner(
+            started, release
+        )
+        job_id = json.loads(client.post("/api/scan").data)["job_id"]
+        assert started.wait(5)
+        assert json.loads(client.post("/api/scan").data)["duplicate"]
+        data = json.loads(client.delete(f"/api/scan/{job_id}").data)
+        assert data["detached"] is True
+        assert data["status"] == "running"
+        data = json.loads(client.delete(f"/api/scan/{job_id}").data)
+        assert data["detached"] is False
+        release.set()
+        app.scan_jobs.wait(job_id, timeout=5)
+
+
+class TestScanEvents:
+    def test_unknown_job_returns_404(self, app_client):
+        client, _ = app_client
+        assert client.get("/api/scan/nope/events").status_code == 404
+
+    def test_streams_progress_leaderboard_and_done(
+        self, app_client, scan_mocks
+    ):
+        client, app = app_client
+
+        def run_scan(progress_callback=None, leaderboard_callback=None):
+            progress_callback("Analyzing sector performance...")
+            leaderboard_callback([{"symbol": "AAPL", "score": 75.0,
+                                   "rank": 1}])
+            return {"stocks": [{"symbol": "AAPL", "score": 75.0, "rank": 1}],
+                    "scan_metadata": {}}
+
+        mock_fmp_cls, mock_scanner_cls = scan_mocks
+        mock_fmp_cls.return_value.calls_made = 3
+        mock_scanner_cls.return_value.run_scan.side_effect = run_scan
+        job_id = json.loads(client.post("/api/scan").data)["job_id"]
+        app.scan_jobs.wait(job_id, timeout=5)
+
+        resp = client.get(f"/api/scan/{job_id}/events")
+        assert resp.status_code == 200
+        assert resp.mimetype == "text/event-stream"
+        body = resp.get_data(as_text=True)
+        blocks = [b for b in body.split("\n\n") if b.strip()]
+        names = [
+            line.split(": ", 1)[1]
+            for block in blocks for line in block.split("\n")
+            if line.startswith("event: ")
+        ]
+        assert names == ["progress", "leaderboard", "done"]
+        progress = json.loads(blocks[0].split("data: ", 1)[1])
+        assert progress["calls_made"] == 3
+        assert progress["call_budget"] == 200
+
+    def test_resumes_after_last_event_id(self, app_client, scan_mocks):
+        client, app = app_client
+        _, mock_scanner_cls = scan_mocks
+        mock_scanner_cls.return_value.run_scan.side_effect = (
+            lambda progress_callback=None, leaderboard_callback=None: (
+                progress_callback("step"),
+                {"stocks": [], "scan_metadata": {}},
+            )[1]
+        )
+        job_id = json.loads(client.post("/api/scan").data)["job_id"]
+        app.scan_jobs.wait(job_id, timeout=5)
+
+        resp = client.get(
+            f"/api/scan/{job_id}/events", headers={"Last-Event-ID": "1"}
+        )
+        body = resp.get_data(as_text=True)
+        assert "event: progress" not in body
+        assert "event: done" in body
+
+
+class TestBudgetRoute:
+    def test_reports_daily_quota(self, app_client, tmp_path):
+        from budget_ledger import BudgetLedger
+        client, _ = app_client
+        ledger = BudgetLedger(str(tmp_path / "b.sqlite"), daily_limit=10)
+        ledger.reserve("test_key", 3)
         with patch.dict(os.environ, {"FMP_API_KEY": "test_key"}), \
-             patch("app.FMPClient"), \
-             patch("app.Scanner") as mock_scanner_cls, \
-             patch("app._save_report"):
-            mock_scanner = Mock()
-            mock_scanner.run_scan.return_value = {
-                "stocks": [{
-                    "rank": 1, "symbol": "AAPL", "name": "Apple",
-                    "sector": "Technology", "sector_performance": 2.35,
-                    "price": 150.0, "yearHigh": 200.0, "ath": 220.0,
-                    "pct_below_ath": 31.8, "target_price": 220.0,
-                    "upside_pct": 46.7, "score": 75.0,
-                }],
-                "scan_metadata": {"total_candidates": 50},
+             patch("app.BUDGET_LEDGER", ledger):
+            data = json.loads(client.get("/api/budget").data)
+        assert data["used"] == 3
+        assert data["remaining"] == 7
+        assert data["daily_limit"] == 10
+
+    def test_scan_budget_limited_to_remaining_quota(
+        self, app_client, scan_mocks, tmp_path
+    ):
+        from budget_ledger import BudgetLedger
+        client, app = app_client
+        mock_fmp_cls, mock_scanner_cls = scan_mocks
+        ledger = BudgetLedger(str(tmp_path / "b.sqlite"), daily_limit=250)
+        ledger.reserve("test_key", 200)
+        with patch("app.BUDGET_LEDGER", ledger):
+            mock_scanner_cls.return_value.run_scan.return_value = {
+                "stocks": [], "scan_metadata": {},
+            }
+            job_id = json.loads(client.post("/api/scan").data)["job_id"]
+            job = app.scan_jobs.wait(job_id, timeout=5)
+        kwargs = mock_fmp_cls.call_args.kwargs
+        assert kwargs["call_budget"] == 50
+        assert kwargs["ledger"] is ledger
+        assert job.result["scan_metadata"]["daily_budget_remaining"] == 50
+
+
+class TestMetricsRoute:
+    def test_serves_prometheus_text(self, app_client):
+        client, _ = app_client
+        resp = client.get("/metrics")
+        assert resp.status_code == 200
+        assert resp.content_type.startswith("text/plain; version=0.0.4")
+        body = resp.data.decode()
+        assert "# TYPE scanner_scans_started_total counter" in body
+        assert 'scanner_scan_jobs_in_flight{status="running"} 0' in body
+        assert "scanner_fmp_daily_budget_remaining" in body
+
+    def test_counts_scans_calls_and_downloads(self, app_client, scan_mocks):
+        client, app = app_client
+        mock_fmp_cls, mock_scanner_cls = scan_mocks
+
+        def run_scan(**kwargs):
+            on_call = mock_fmp_cls.call_args.kwargs["on_call"]
+            on_call("batch-quote", 200)
+            on_call("batch-quote", 500)
+            return {"stocks": [], "scan_metadata": {}}
+
+        mock_scanner_cls.return_value.run_scan.side_effect = run_scan
+        job_id = json.loads(client.post("/api/scan").data)["job_id"]
+        app.scan_jobs.wait(job_id, timeout=5)
+        client.get("/api/csv")
+
+        body = client.get("/metrics").data.decode()
+        assert "scanner_scans_started_total 1" in body
+        assert 'scanner_scans_finished_total{status="completed"} 1' in body
+        assert "scanner_scan_duration_seconds_count 1" in body
+        assert ('scanner_fmp_calls_total{endpoint="batch-quote",'
+                'status="500"} 1') in body
+        assert "scanner_csv_downloads_total 1" in body
+
+
+class TestArchiveRoutes:
+    @pytest.fixture
+    def archive(self, tmp_path):
+        from scan_archive import ScanArchive
+        archive = ScanArchive(str(tmp_path / "archive.sqlite"))
+        with patch("app.SCAN_ARCHIVE", archive):
+            yield archive
+
+    def test_save_report_archives_scan(self, archive, tmp_path):
+        from app import _save_report
+        result = {
+            "stocks": [{"rank": 1, "symbol": "NVDA", "score": 80.0}],
+            "scan_metadata": {"timestamp": "2026-01-05T09:00:00"},
+        }
+        with patch("app.OUTPUT_DIR", str(tmp_path / "out")):
+            _save_report(result)
+        assert len(list((tmp_path / "out").glob("scan_*.json"))) == 1
+        assert archive.history(symbol="NVDA")[0]["score"] == 80.0
+
+    def test_save_report_compact(self, archive, tmp_path):
+        from app import _save_report
+        from reports import read_report
+        result = {"stocks": [{"rank": 1, "symbol": "NVDA", "score": 80.0}],
+                  "scan_metadata": {"timestamp": "2026-01-05T09:00:00"}}
+        with patch("app.OUTPUT_DIR", str(tmp_path / "out")), \
+             patch("app.REPORT_FORMAT", "compact"):
+            _save_report(result)
+        [path] = (tmp_path / "out").glob("scan_*.json.gz")
+        scan_id = result["scan_metadata"].pop("scan_id")
+        assert read_report(str(path)) == result
+        assert archive.get_scan(scan_id) == read_report(str(path))
+        assert archive.list_scans()[0]["source"] == path.name[:-3]
+
+    def test_scans_history_and_detail(self, app_client, archive):
+        client, _ = app_client
+        scan_id = archive.add_scan({
+            "stocks": [{"rank": 1, "symbol": "NVDA", "sector": "Technology",
+                        "score": 80.0}],
+            "scan_metadata": {"timestamp": "2026-01-05T09:00:00"},
+        })
+        scans = json.loads(client.get("/api/scans").data)
+        assert scans[0]["id"] == scan_id
+        rows = json.loads(
+            client.get("/api/history?symbol=NVDA&min_score=50").data
+        )
+        assert rows[0]["score"] == 80.0
+        detail = json.loads(client.get(f"/api/scans/{scan_id}").data)
+        assert detail["stocks"][0]["symbol"] == "NVDA"
+        assert client.get("/api/scans/999").status_code == 404
+
+    def test_diff_defaults_to_latest_two_scans(self, app_client, archive):
+        client, _ = app_client
+        assert client.get("/api/diff").status_code == 404
+        scans = (("05", ["NVDA", "XOM"]), ("12", ["AAPL", "NVDA"]))
+        for day, symbols in scans:
+            archive.add_scan({
+                "stocks": [{"rank": i + 1, "symbol": s, "score": 70.0}
+                           for i, s in enumerate(symbols)],
+                "scan_metadata": {"timestamp": f"2026-01-{day}T09:00:00"},
+            })
+        diff = json.loads(client.get("/api/diff").data)
+        assert diff["from"]["scanned_at"].startswith("2026-01-05")
+        assert [s["symbol"] for s in diff["entered"]] == ["AAPL"]
+        assert [s["symbol"] for s in diff["dropped"]] == ["XOM"]
+        assert diff["changed"][0]["rank_change"] == -1
+
+    def test_diff_of_saved_scan_uses_same_config(
+        self, app_client, archive, tmp_path
+    ):
+        from app import _save_report
+        client, _ = app_client
+
+        def save(day, top_n, symbols):
+            result = {
+                "stocks": [{"rank": i + 1, "symbol": s, "score": 70.0}
+                           for i, s in enumerate(symbols)],
+                "scan_metadata": {"timestamp": f"2026-01-{day}T09:00:00",
+                                  "config": {"top_n": top_n}},
             }
-            mock_scanner_cls.return_value = mock_scanner
+            with patch("app.OUTPUT_DIR", str(tmp_path / "out")):
+                _save_report(result)
+            return result["scan_metadata"]["scan_id"]
+
+        first = save("05", 15, ["NVDA", "XOM"])
+        shown = save("06", 15, ["AAPL", "NVDA"])
+        # Newer, but with other settings
+        save("07", 10, ["MSFT"])
+        diff = json.loads(client.get(f"/api/diff?to={shown}").data)
+        assert (diff["from"]["id"], diff["to"]["id"]) == (first, shown)
+        assert [s["symbol"] for s in diff["entered"]] == ["AAPL"]
+
+
+class TestScanResultCache:
+    def _scan(self, client, app, body):
+        resp = client.post("/api/scan", json=body)
+        data = json.loads(resp.data)
+        app.scan_jobs.wait(data["job_id"], timeout=5)
+        return resp.status_code, data
+
+    def test_identical_config_is_served_from_cache(
+        self, app_client, scan_mocks
+    ):
+        client, app = app_client
+        _, mock_scanner_cls = scan_mocks
+        mock_scanner_cls.return_value.run_scan.return_value = {
+            "stocks": [], "scan_metadata": {},
+        }
+        status, first = self._scan(client, app, {"top_n": 10})
+        assert status == 202
+        assert first["cached"] is False
+        # Same settings, spelled differently
+        status, second = self._scan(client, app, {"top_n": "10.0"})
+        assert status == 200
+        assert second["cached"] is True
+        assert second["job_id"] == first["job_id"]
+        assert second["data_age_seconds"] >= 0
+        assert mock_scanner_cls.return_value.run_scan.call_count == 1
+
+        status, other = self._scan(client, app, {"top_n": 5})
+        assert other["cached"] is False
+        body = client.get("/metrics").data.decode()
+        assert 'scanner_scan_requests_total{outcome="cached"} 1' in body
+
+    def test_partial_results_are_not_cached(self, app_client, scan_mocks):
+        client, app = app_client
+        _, mock_scanner_cls = scan_mocks
+        mock_scanner_cls.return_value.run_scan.return_value = {
+            "stocks": [],
+            "scan_metadata": {"budget_warning": "budget reached"},
+        }
+        self._scan(client, app, {})
+        _, second = self._scan(client, app, {})
+        assert second["cached"] is False
+
+    def test_invalid_config_rejected(self, app_client):
+        client, _ = app_client
+        with patch.dict(os.environ, {"FMP_API_KEY": "test_key"}):
+            resp = client.post("/api/scan", json={"top_n": "lots"})
+        assert resp.status_code == 400
+        assert "top_n" in json.loads(resp.data)["error"]
+
+
+class TestNormalizeConfig:
+    def test_coerces_to_default_types(self):
+        from app import normalize_config, DEFAULT_CONFIG
+        config = normalize_config({
+            "top_n": "15", "ath_min": 10, "market_cap_min": 1e9,
+            "unknown": 1,
+        })
+        assert config == {**DEFAULT_CONFIG, "top_n": 15, "ath_min": 10.0}
+        assert isinstance(config["market_cap_min"], int)
+        assert isinstance(config["ath_min"], float)
+
+
+class TestRequireOwnCacheDir:
+    def test_refuses_default_cache_dir(self):
+        from app import require_own_cache_dir
+        with pytest.raises(RuntimeError, match="SCANNER_CACHE_DIR"):
+            require_own_cache_dir("Replaying an FMP cassette", "cache")
+        with pytest.raises(RuntimeError):
+            require_own_cache_dir("Replaying", os.path.abspath("cache"))
+
+    def test_allows_separate_cache_dir(self, tmp_path):
+        from app import require_own_cache_dir
+        require_own_cache_dir("Replaying an FMP cassette", str(tmp_path))
+
+
+class TestBudgetLedger:
+    def test_opened_on_first_use(self, tmp_path):
+        import app
+        with patch("app.BUDGET_LEDGER", None), \
+             patch("app.CACHE_DIR", str(tmp_path)):
+            assert not (tmp_path / "budget.sqlite").exists()
+            ledger = app.budget_ledger()
+            assert (tmp_path / "budget.sqlite").exists()
+            assert app.budget_ledger() is ledger
 
-            # Run scan first
-            client.post("/api/scan")
 
-            # Then download CSV
-            resp = client.get("/api/csv")
-            assert resp.status_code == 200
-            assert resp.content_type == "text/csv; charset=utf-8"
-            assert b"AAPL" in resp.data
+class TestScanArchive:
+    def test_opened_on_first_use(self, tmp_path, monkeypatch):
+        import app
+        path = tmp_path / "archive.sqlite"
+        monkeypatch.setenv("SCAN_ARCHIVE", str(path))
+        with patch("app.SCAN_ARCHIVE", None):
+            assert not path.exists()
+            archive = app.scan_archive()
+            assert path.exists()
+            assert app.scan_archive() is archive
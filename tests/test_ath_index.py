@@ -0,0 +1,123 @@
+import pytest
+from datetime import date
+import numpy as np
+from ath_index import AthIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    return AthIndex(str(tmp_path / "ath_index.json"))
+
+
+class TestUpdate:
+    def test_builds_entry_from_bars(self, index):
+        entry = index.update("AAPL", [
+            {"date": "2026-02-18", "high": 100.0},
+            {"date": "2026-02-19", "high": 150.0},
+            {"date": "2026-02-20", "high": 120.0},
+        ], synced_through="2026-02-20")
+        assert entry == {"ath": 150.0, "ath_date": "2026-02-19",
+                         "last_date": "2026-02-20",
+                         "synced_through": "2026-02-20"}
+
+    def test_incremental_new_high(self, index):
+        index.update("AAPL", [{"date": "2026-02-19", "high": 150.0}])
+        entry = index.update("AAPL", [{"date": "2026-02-20", "high": 160.0}])
+        assert entry["ath"] == 160.0
+        assert entry["ath_date"] == "2026-02-20"
+
+    def test_ignores_bars_already_seen(self, index):
+        index.update("AAPL", [{"date": "2026-02-20", "high": 150.0}])
+        entry = index.update("AAPL", [
+            {"date": "2026-02-19", "high": 999.0},
+            {"date": "2026-02-20", "high": 999.0},
+        ])
+        assert entry["ath"] == 150.0
+
+    def test_no_bars_no_entry(self, index):
+        assert index.update("AAPL", []) is None
+        assert index.get("AAPL") is None
+
+
+    def test_drop_forgets_symbol(self, index):
+        index.update("AAPL", [{"date": "2026-02-20", "high": 1000.0}])
+        index.drop("AAPL")
+        assert index.get("AAPL") is None
+        entry = index.update("AAPL", [{"date": "2026-02-20", "high": 100.0}])
+        assert entry["ath"] == 100.0
+
+
+class TestUpdateColumns:
+    def test_matches_update(self, index):
+        dates = np.array(["2026-02-18", "2026-02-19", "2026-02-20"],
+                         dtype="datetime64[D]")
+        entry = index.update_columns(
+            "AAPL", dates, np.array([100.0, 150.0, 120.0]),
+            synced_through="2026-02-20",
+        )
+        assert entry == {"ath": 150.0, "ath_date": "2026-02-19",
+                         "last_date": "2026-02-20",
+                         "synced_through": "2026-02-20"}
+
+    def test_skips_seen_dates_and_nan(self, index):
+        index.update("AAPL", [{"date": "2026-02-19", "high": 150.0}])
+        dates = np.array(["2026-02-19", "2026-02-20", "2026-02-23"],
+                         dtype="datetime64[D]")
+        entry = index.update_columns(
+            "AAPL", dates, np.array([999.0, 160.0, np.nan])
+        )
+        assert entry["ath"] == 160.0
+        assert entry["last_date"] == "2026-02-20"
+
+
+    def test_other_history_version_rebuilds_entry(self, index):
+        days = np.array(["2026-02-19", "2026-02-20"], dtype="datetime64[D]")
+        index.update_columns("AAPL", days[:1], np.array([1000.0]),
+                             version="before-split")
+        entry = index.update_columns("AAPL", days, np.array([95.0, 100.0]),
+                                     version="after-split")
+        assert entry["ath"] == 100.0
+        assert entry["version"] == "after-split"
+        entry = index.update_columns("AAPL", days, np.array([95.0, 100.0]),
+                                     version="after-split")
+        assert entry["last_date"] == "2026-02-20"
+
+
+class TestFreshness:
+    def test_fresh_when_synced_through_session(self, index):
+        index.update("AAPL", [{"date": "2026-02-20", "high": 1.0}],
+                     synced_through="2026-02-20")
+        assert index.is_fresh("AAPL", date(2026, 2, 20))
+        assert not index.is_fresh("AAPL", date(2026, 2, 23))
+
+    def test_unknown_symbol_not_fresh(self, index):
+        assert not index.is_fresh("ZZZZ", date(2026, 2, 20))
+
+
+class TestPersistence:
+    def test_save_and_reload(self, index, tmp_path):
+        index.update("AAPL", [{"date": "2026-02-20", "high": 1.0}])
+        index.save()
+        reloaded = AthIndex(str(tmp_path / "ath_index.json"))
+        assert reloaded.get("AAPL")["ath"] == 1.0
+        assert len(reloaded) == 1
+
+    def test_save_merges_changes_from_other_processes(self, tmp_path):
+        path = str(tmp_path / "ath_index.json")
+        first, second = AthIndex(path), AthIndex(path)
+        first.update("AAPL", [{"date": "2026-02-20", "high": 1.0}])
+        first.update("MSFT", [{"date": "2026-02-20", "high": 3.0}])
+        first.save()
+        second.update("NVDA", [{"date": "2026-02-20", "high": 2.0}])
+        second.drop("MSFT")
+        second.save()
+        first.save()
+        merged = AthIndex(path)
+        assert merged.get("AAPL")["ath"] == 1.0
+        assert merged.get("NVDA")["ath"] == 2.0
+        assert merged.get("MSFT") is None
+        assert second.get("AAPL")["ath"] == 1.0
+
+    def test_nothing_written_until_save(self, index, tmp_path):
+        index.update("AAPL", [{"date": "2026-02-20", "high": 1.0}])
+        assert not (tmp_path / "ath_index.json").exists()
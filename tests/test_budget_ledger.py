@@ -0,0 +1,118 @@
+import multiprocessing
+import threading
+from datetime import datetime, timezone
+import pytest
+from budget_ledger import BudgetLedger
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock(datetime(2025, 3, 4, 15, 0, tzinfo=timezone.utc))
+
+
+@pytest.fixture
+def ledger(tmp_path, clock):
+    return BudgetLedger(
+        str(tmp_path / "budget.sqlite"), daily_limit=5, clock=clock
+    )
+
+
+def _reserve_many(path, count, results):
+    ledger = BudgetLedger(path, daily_limit=50)
+    results.put(sum(ledger.reserve("key") for _ in range(count)))
+
+
+class TestBudgetLedger:
+    def test_reserve_until_limit(self, ledger):
+        assert all(ledger.reserve("key") for _ in range(5))
+        assert not ledger.reserve("key")
+        assert ledger.used("key") == 5
+        assert ledger.remaining("key") == 0
+
+    def test_multi_call_reservation_is_all_or_nothing(self, ledger):
+        assert ledger.reserve("key", 3)
+        assert not ledger.reserve("key", 3)
+        assert ledger.remaining("key") == 2
+
+    def test_keys_are_separate(self, ledger):
+        ledger.reserve("a", 5)
+        assert ledger.remaining("b") == 5
+
+    def test_api_key_is_not_stored(self, ledger, tmp_path):
+        ledger.reserve("secret-key")
+        assert b"secret-key" not in (tmp_path / "budget.sqlite").read_bytes()
+
+    def test_resets_on_new_utc_day(self, ledger, clock):
+        ledger.reserve("key", 5)
+        clock.now = datetime(2025, 3, 5, 0, 1, tzinfo=timezone.utc)
+        assert ledger.remaining("key") == 5
+
+    def test_release_returns_unused_calls(self, ledger):
+        ledger.reserve("key", 2)
+        ledger.release("key")
+        assert ledger.used("key") == 1
+        ledger.release("key", 5)
+        assert ledger.used("key") == 0
+
+    def test_mark_exhausted_blocks_rest_of_day(self, ledger):
+        ledger.reserve("key")
+        ledger.mark_exhausted("key")
+        assert ledger.remaining("key") == 0
+        assert not ledger.reserve("key")
+
+    def test_shared_between_instances(self, ledger, tmp_path, clock):
+        other = BudgetLedger(
+            str(tmp_path / "budget.sqlite"), daily_limit=5, clock=clock
+        )
+        ledger.reserve("key", 4)
+        assert other.reserve("key")
+        assert not ledger.reserve("key")
+
+    def test_status(self, ledger):
+        ledger.reserve("key", 2)
+        assert ledger.status("key") == {
+            "day": "2025-03-04", "daily_limit": 5, "used": 2, "remaining": 3,
+        }
+
+    def test_threads_never_overspend(self, tmp_path, clock):
+        ledger = BudgetLedger(
+            str(tmp_path / "budget.sqlite"), daily_limit=20, clock=clock
+        )
+        granted = []
+
+        def worker():
+            for _ in range(10):
+                if ledger.reserve("key"):
+                    granted.append(1)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(granted) == 20
+        assert ledger.used("key") == 20
+
+    def test_processes_never_overspend(self, tmp_path):
+        path = str(tmp_path / "budget.sqlite")
+        BudgetLedger(path, daily_limit=50)
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+        procs = [
+            ctx.Process(target=_reserve_many, args=(path, 20, results))
+            for _ in range(4)
+        ]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join(30)
+        assert sum(results.get(timeout=5) for _ in procs) == 50
+        assert BudgetLedger(path, daily_limit=50).used("key") == 50
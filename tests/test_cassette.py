@@ -0,0 +1,150 @@
+import gzip
+import json
+import pytest
+from unittest.mock import patch, Mock
+from cassette import Cassette, CassetteMiss, RECORD, REPLAY
+from fmp_client import FMPClient
+from rate_limiter import TokenBucket
+from scanner import Scanner
+
+
+def _response(url, params=None, timeout=None):
+    endpoint = url.rsplit("/stable/", 1)[1]
+    params = params or {}
+    if endpoint == "sector-performance-snapshot":
+        data = [{"sector": "Technology", "exchange": "NASDAQ",
+                 "averageChange": 1.5}]
+    elif endpoint == "batch-quote":
+        data = [
+            {"symbol": s, "price": 100.0 + i, "yearHigh": 150.0,
+             "yearLow": 80.0, "volume": 2_000_000,
+             "averageVolume": 1_500_000, "name": s}
+            for i, s in enumerate(params["symbols"].split(","))
+        ]
+    elif endpoint == "quote":
+        data = [{"symbol": params["symbol"], "price": 100.0}]
+    elif endpoint == "historical-price-eod/full":
+        data = [{"date": "2024-01-02", "high": 180.0, "close": 170.0}]
+    else:
+        return Mock(status_code=404, text="Not found")
+    return Mock(status_code=200, json=Mock(return_value=data))
+
+
+def _client(cassette):
+    return FMPClient(
+        api_key="secret", cassette=cassette,
+        rate_limiter=TokenBucket(rate=1e6, burst=1000),
+    )
+
+
+class TestCassette:
+    def test_rejects_unknown_mode(self, tmp_path):
+        with pytest.raises(ValueError):
+            Cassette(str(tmp_path / "c.jsonl.gz"), mode="rewind")
+
+    @patch("fmp_client.requests.Session.get", side_effect=_response)
+    def test_record_then_replay(self, mock_get, tmp_path):
+        path = str(tmp_path / "c.jsonl.gz")
+        recorder = Cassette(path, mode=RECORD)
+        quote = _client(recorder).get_quotes(["AAPL", "MSFT"])
+        assert recorder.recorded == 1
+
+        mock_get.reset_mock()
+        player = Cassette(path, mode=REPLAY)
+        client = _client(player)
+        assert client.get_quotes(["AAPL", "MSFT"]) == quote
+        mock_get.assert_not_called()
+        assert player.played == 1
+        assert client.calls_made == 1
+
+    @patch("fmp_client.requests.Session.get", side_effect=_response)
+    def test_api_key_not_recorded(self, _, tmp_path):
+        path = tmp_path / "c.jsonl.gz"
+        _client(Cassette(str(path), mode=RECORD)).get_quote("AAPL")
+        with gzip.open(path, "rt") as f:
+            entry = json.loads(f.readline())
+        assert "secret" not in json.dumps(entry)
+        assert entry["params"] == {"symbol": "AAPL"}
+        assert entry["elapsed"] >= 0
+
+    @patch("fmp_client.requests.Session.get", side_effect=_response)
+    def test_errors_are_replayed(self, _, tmp_path):
+        path = str(tmp_path / "c.jsonl.gz")
+        with pytest.raises(Exception, match="404"):
+            _client(Cassette(path, mode=RECORD))._get("nope")
+        with pytest.raises(Exception, match="404"):
+            _client(Cassette(path, mode=REPLAY))._get("nope")
+
+    def test_repeats_play_in_order_then_stick(self, tmp_path):
+        path = str(tmp_path / "c.jsonl.gz")
+        recorder = Cassette(path, mode=RECORD)
+        for price in (1, 2):
+            recorder.record("quote", {"symbol": "A"}, 200,
+                            [{"price": price}], 0.1)
+        player = Cassette(path)
+        bodies = [player.play("quote", {"symbol": "A"})[1][0]["price"]
+                  for _ in range(3)]
+        assert bodies == [1, 2, 2]
+
+    def test_unrecorded_request_raises(self, tmp_path):
+        path = str(tmp_path / "c.jsonl.gz")
+        Cassette(path, mode=RECORD).record("quote", {"symbol": "A"}, 200,
+                                           [], 0.1)
+        with pytest.raises(CassetteMiss):
+            Cassette(path).play("quote", {"symbol": "B"})
+
+    def test_latency_scaling(self, tmp_path):
+        path = str(tmp_path / "c.jsonl.gz")
+        Cassette(path, mode=RECORD).record("quote", {"symbol": "A"}, 200,
+                                           [], 0.2)
+        sleeps = []
+        Cassette(path, latency_scale=0.5, sleep=sleeps.append).play(
+            "quote", {"symbol": "A"}
+        )
+        Cassette(path, sleep=sleeps.append).play("quote", {"symbol": "A"})
+        assert sleeps == [pytest.approx(0.1)]
+
+
+class TestScanReplay:
+    @patch("scanner.get_stocks_by_sector")
+    def test_replayed_scan_matches_recorded_scan(self, mock_stocks, tmp_path):
+        mock_stocks.return_value = [
+            {"symbol": f"S{i:02d}", "name": f"Stock {i}"} for i in range(30)
+        ]
+        path = str(tmp_path / "scan.jsonl.gz")
+        with patch("fmp_client.requests.Session.get", side_effect=_response):
+            recorded = Scanner(
+                _client(Cassette(path, mode=RECORD))
+            ).run_scan()
+
+        with patch("fmp_client.requests.Session.get") as mock_get:
+            replayed = Scanner(_client(Cassette(path))).run_scan()
+            mock_get.assert_not_called()
+        assert replayed["stocks"] == recorded["stocks"]
+        assert (
+            replayed["scan_metadata"]["api_calls_used"]
+            == recorded["scan_metadata"]["api_calls_used"]
+        )
+
+    def test_replay_does_not_use_daily_quota(self, tmp_path):
+        from budget_ledger import BudgetLedger
+
+        path = str(tmp_path / "c.jsonl.gz")
+        Cassette(path, mode=RECORD).record("quote", {"symbol": "A"}, 200,
+                                           [{"symbol": "A"}], 0.1)
+        ledger = BudgetLedger(str(tmp_path / "budget.sqlite"))
+        client = FMPClient(api_key="k", cassette=Cassette(path),
+                           ledger=ledger)
+        client.get_quote("A")
+        assert ledger.used("k") == 0
+
+    def test_replayed_responses_are_not_cached(self, tmp_path):
+        from response_cache import ResponseCache
+
+        path = str(tmp_path / "c.jsonl.gz")
+        Cassette(path, mode=RECORD).record("quote", {"symbol": "A"}, 200,
+                                           [{"symbol": "A"}], 0.1)
+        cache = ResponseCache(str(tmp_path / "responses"))
+        client = FMPClient(api_key="k", cassette=Cassette(path), cache=cache)
+        client.get_quote("A")
+        assert cache.get("quote", {"symbol": "A"}) == (False, None)
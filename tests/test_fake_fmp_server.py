@@ -0,0 +1,165 @@
+import subprocess
+import sys
+from datetime import date
+from pathlib import Path
+import pytest
+import requests
+from fake_fmp_server import FakeFMPServer, SyntheticMarket, synthetic_universe
+from fmp_client import FMPClient, BudgetExhausted
+from rate_limiter import TokenBucket
+from scanner import Scanner
+from stock_universe import SP500
+
+AS_OF = date(2025, 3, 4)
+
+
+@pytest.fixture
+def server():
+    market = SyntheticMarket(synthetic_universe(600), as_of=AS_OF)
+    with FakeFMPServer(market=market) as s:
+        yield s
+
+
+def _client(server, **kw):
+    return FMPClient(
+        api_key="test_key", base_url=server.base_url,
+        rate_limiter=TokenBucket(rate=1e6, burst=1000), **kw,
+    )
+
+
+class TestSyntheticUniverse:
+    def test_defaults_to_sp500(self):
+        assert synthetic_universe() == SP500
+
+    def test_pads_with_synthetic_symbols(self):
+        universe = synthetic_universe(len(SP500) + 22)
+        assert len(universe) == len(SP500) + 22
+        extra = universe[len(SP500):]
+        assert extra[0]["symbol"] == "SYN00000"
+        assert len({s["sector"] for s in extra}) == 11
+
+    def test_cut_short(self):
+        assert len(synthetic_universe(10)) == 10
+
+
+class TestSyntheticMarket:
+    def test_deterministic(self):
+        a = SyntheticMarket(as_of=AS_OF).quote("AAPL")
+        b = SyntheticMarket(as_of=AS_OF).quote("AAPL")
+        assert a == b
+        assert SyntheticMarket(seed=1, as_of=AS_OF).quote("AAPL") != a
+
+    def test_quote_consistent_with_history(self):
+        market = SyntheticMarket(as_of=AS_OF)
+        quote = market.quote("MSFT")
+        bars = market.history("MSFT", timeseries=252)
+        assert bars[0]["date"] == "2025-03-04"
+        assert quote["price"] == bars[0]["close"]
+        assert quote["yearHigh"] == max(b["high"] for b in bars)
+
+    def test_unknown_symbol(self):
+        market = SyntheticMarket(as_of=AS_OF)
+        assert market.quote("NOPE") is None
+        assert market.history("NOPE") == []
+
+
+class TestFakeFMPServer:
+    def test_serves_client_endpoints(self, server):
+        with _client(server) as c:
+            assert c.get_quote("AAPL")["symbol"] == "AAPL"
+            quotes = c.get_quotes(["AAPL", "MSFT", "NOPE"])
+            assert set(quotes) == {"AAPL", "MSFT"}
+            full = c.get_historical_prices("AAPL")["historical"]
+            assert len(full) == 1260
+            recent = c.get_historical_prices(
+                "AAPL", from_date="2025-02-24", to_date="2025-02-28"
+            )["historical"]
+            assert [b["date"] for b in recent] == [
+                "2025-02-28", "2025-02-27", "2025-02-26", "2025-02-25",
+                "2025-02-24",
+            ]
+            sectors = c.get_sector_performance("2025-03-04")
+            assert len(sectors) == 11
+        assert server.requests["batch-quote"] == 1
+        assert server.status_counts[200] == 5
+
+    def test_daily_limit_returns_429(self):
+        market = SyntheticMarket(as_of=AS_OF)
+        with FakeFMPServer(market=market, daily_limit=2) as server:
+            with _client(server) as c:
+                c.get_quote("AAPL")
+                c.get_quote("MSFT")
+                with pytest.raises(BudgetExhausted):
+                    c.get_quote("AAPL")
+            assert server.status_counts[429] == 1
+
+    def test_per_second_limit_returns_429(self):
+        market = SyntheticMarket(as_of=AS_OF)
+        with FakeFMPServer(market=market, max_per_second=3) as server:
+            with _client(server) as c:
+                for _ in range(3):
+                    c.get_quote("AAPL")
+                with pytest.raises(BudgetExhausted):
+                    c.get_quote("AAPL")
+
+    def test_error_rate(self):
+        market = SyntheticMarket(as_of=AS_OF)
+        with FakeFMPServer(market=market, error_rate=1.0) as server:
+            with _client(server, retries=0) as c:
+                with pytest.raises(Exception, match="500"):
+                    c.get_quote("AAPL")
+
+    def test_requires_api_key(self, server):
+        resp = requests.get(f"{server.base_url}/quote?symbol=AAPL")
+        assert resp.status_code == 401
+
+    def test_latency(self):
+        import time
+        market = SyntheticMarket(as_of=AS_OF)
+        with FakeFMPServer(market=market, latency=0.05) as server:
+            with _client(server) as c:
+                start = time.perf_counter()
+                c.get_quote("AAPL")
+                assert time.perf_counter() - start >= 0.05
+
+    def test_full_scan_with_synthetic_universe(self, server, monkeypatch):
+        monkeypatch.setattr("scanner.last_session_date", lambda: AS_OF)
+        with _client(server, call_budget=1000) as c:
+            results = Scanner(
+                c, universe=server.market.universe, max_workers=4
+            ).run_scan()
+        meta = results["scan_metadata"]
+        assert meta["total_candidates"] > 0
+        assert meta["api_calls_used"] == sum(server.requests.values())
+        assert meta["api"]["bytes_received"] == server.bytes_sent
+        assert meta["api"]["calls_by_endpoint"] == dict(server.requests)
+        assert results["stocks"]
+
+    def test_runs_as_subprocess(self):
+        proc = subprocess.Popen(
+            [sys.executable,
+             str(Path(__file__).parent.parent / "fake_fmp_server.py"),
+             "--port", "0",
+             "--symbols", "50"],
+            stdout=subprocess.PIPE, text=True,
+        )
+        try:
+            line = proc.stdout.readline()
+            base_url = line.rsplit(" ", 1)[1].strip()
+            resp = requests.get(
+                f"{base_url}/quote", params={"symbol": "MMM", "apikey": "k"}
+            )
+            assert resp.status_code == 200
+            assert resp.json()[0]["symbol"] == "MMM"
+        finally:
+            proc.terminate()
+            proc.wait(5)
+
+    def test_stats_endpoint(self, server):
+        with _client(server) as c:
+            c.get_quote("AAPL")
+        stats = requests.get(server.base_url.replace("/stable", "/_stats"))
+        data = stats.json()
+        assert data["requests"] == {"quote": 1}
+        assert data["status_counts"] == {"200": 1}
+        assert data["bytes_sent"] == server.bytes_sent > 0
@@ -1,6 +1,9 @@
+import json
 import pytest
 from unittest.mock import patch, Mock
-from fmp_client import FMPClient, BudgetExhausted
+from budget_ledger import BudgetLedger
+from fmp_client import FMPClient, BudgetExhausted, ScanCancelled
+from rate_limiter import TokenBucket
 
 
 @pytest.fixture
@@ -27,7 +30,7 @@ class TestFMPClientInit:
 
 
 class TestCallBudget:
-    @patch("fmp_client.requests.get")
+    @patch("fmp_client.requests.Session.get")
     def test_tracks_calls_made(self, mock_get, client):
         mock_get.return_value = Mock(
             status_code=200, json=Mock(return_value=[{"symbol": "AAPL"}])
@@ -42,7 +45,7 @@ class TestCallBudget:
         with pytest.raises(BudgetExhausted, match="budget of 0 reached"):
             c.get_quote("AAPL")
 
-    @patch("fmp_client.requests.get")
+    @patch("fmp_client.requests.Session.get")
     def test_429_raises_budget_exhausted(self, mock_get, client):
         mock_get.return_value = Mock(
             status_code=429, text="Limit Reach"
@@ -52,7 +55,7 @@ class TestCallBudget:
 
 
 class TestGetSectorPerformance:
-    @patch("fmp_client.requests.get")
+    @patch("fmp_client.requests.Session.get")
     def test_returns_aggregated_sector_data(self, mock_get, client):
         mock_get.return_value = Mock(
             status_code=200,
@@ -68,7 +71,7 @@ class TestGetSectorPerformance:
         tech = next(s for s in result if s["sector"] == "Technology")
         assert float(tech["changesPercentage"]) == pytest.approx(2.0)
 
-    @patch("fmp_client.requests.get")
+    @patch("fmp_client.requests.Session.get")
     def test_handles_api_error(self, mock_get, client):
         mock_get.return_value = Mock(status_code=401, text="Unauthorized")
         with pytest.raises(Exception, match="FMP API error 401"):
@@ -76,7 +79,7 @@ class TestGetSectorPerformance:
 
 
 class TestGetQuote:
-    @patch("fmp_client.requests.get")
+    @patch("fmp_client.requests.Session.get")
     def test_returns_quote_data(self, mock_get, client):
         mock_get.return_value = Mock(
             status_code=200,
@@ -93,8 +96,44 @@ class TestGetQuote:
         assert call_args[1]["params"]["symbol"] == "AAPL"
 
 
+class TestGetQuotes:
+    @patch("fmp_client.requests.Session.get")
+    def test_returns_quotes_keyed_by_symbol(self, mock_get, client):
+        mock_get.return_value = Mock(
+            status_code=200,
+            json=Mock(return_value=[
+                {"symbol": "AAPL", "price": 180.0},
+                {"symbol": "MSFT", "price": 400.0},
+            ])
+        )
+        result = client.get_quotes(["AAPL", "MSFT", "ZZZZ"])
+        assert set(result) == {"AAPL", "MSFT"}
+        assert result["MSFT"]["price"] == 400.0
+        assert client.calls_made == 1
+        call_args = mock_get.call_args
+        assert call_args[0][0].endswith("/batch-quote")
+        assert call_args[1]["params"]["symbols"] == "AAPL,MSFT,ZZZZ"
+
+    @patch("fmp_client.requests.Session.get")
+    def test_chunks_large_symbol_lists(self, mock_get, client):
+        mock_get.side_effect = lambda url, params, timeout: Mock(
+            status_code=200,
+            json=Mock(return_value=[
+                {"symbol": s} for s in params["symbols"].split(",")
+            ]),
+        )
+        symbols = [f"S{i}" for i in range(250)]
+        result = client.get_quotes(symbols, batch_size=100)
+        assert len(result) == 250
+        assert client.calls_made == 3
+
+    def test_empty_list_makes_no_calls(self, client):
+        assert client.get_quotes([]) == {}
+        assert client.calls_made == 0
+
+
 class TestGetHistoricalPrices:
-    @patch("fmp_client.requests.get")
+    @patch("fmp_client.requests.Session.get")
     def test_returns_historical_data_from_list(self, mock_get, client):
         mock_get.return_value = Mock(
             status_code=200,
@@ -107,7 +146,7 @@ class TestGetHistoricalPrices:
         assert result["symbol"] == "AAPL"
         assert len(result["historical"]) == 2
 
-    @patch("fmp_client.requests.get")
+    @patch("fmp_client.requests.Session.get")
     def test_default_timeseries_is_5_years(self, mock_get, client):
         mock_get.return_value = Mock(
             status_code=200, json=Mock(return_value=[])
@@ -116,7 +155,7 @@ class TestGetHistoricalPrices:
         call_args = mock_get.call_args
         assert call_args[1]["params"]["timeseries"] == 1260
 
-    @patch("fmp_client.requests.get")
+    @patch("fmp_client.requests.Session.get")
     def test_returns_dict_format_unchanged(self, mock_get, client):
         mock_get.return_value = Mock(
             status_code=200,
@@ -128,3 +167,310 @@ class TestGetHistoricalPrices:
         result = client.get_historical_prices("AAPL")
         assert result["symbol"] == "AAPL"
         assert len(result["historical"]) == 1
+
+
+class TestConnectionPooling:
+    def test_uses_single_session(self, client):
+        assert client.session is not None
+        adapter = client.session.get_adapter(client.base_url)
+        assert adapter is client._adapter
+
+    def test_custom_pool_size(self):
+        c = FMPClient(api_key="test_key", pool_size=4)
+        assert c._adapter._pool_maxsize == 4
+
+    def test_counters_start_at_zero(self, client):
+        assert client.connections_opened == 0
+        assert client.connections_reused == 0
+
+    def test_reuses_connection_across_calls(self):
+        import json
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                body = json.dumps([{"symbol": "AAPL", "price": 1.0}]).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            with FMPClient(api_key="test_key") as c:
+                c.base_url = f"http://127.0.0.1:{server.server_port}/stable"
+                c.get_quote("AAPL")
+                c.get_historical_prices("AAPL")
+                c.get_quote("MSFT")
+                assert c.connections_opened == 1
+                assert c.connections_reused == 2
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+class TestThreadSafety:
+    @patch("fmp_client.requests.Session.get")
+    def test_budget_enforced_across_threads(self, mock_get):
+        from concurrent.futures import ThreadPoolExecutor
+
+        mock_get.return_value = Mock(
+            status_code=200, json=Mock(return_value=[{"symbol": "AAPL"}])
+        )
+        c = FMPClient(
+            api_key="test_key", call_budget=10,
+            rate_limiter=TokenBucket(rate=1000, burst=100),
+        )
+
+        def call(_):
+            try:
+                c.get_quote("AAPL")
+                return True
+            except BudgetExhausted:
+                return False
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            outcomes = list(pool.map(call, range(30)))
+        assert sum(outcomes) == 10
+        assert c.calls_made == 10
+        assert mock_get.call_count == 10
+
+
+class TestRateLimiting:
+    @patch("fmp_client.requests.Session.get")
+    def test_calls_go_through_limiter(self, mock_get):
+        mock_get.return_value = Mock(
+            status_code=200, json=Mock(return_value=[{"symbol": "AAPL"}])
+        )
+        limiter = Mock()
+        limiter.acquire.return_value = 0.25
+        c = FMPClient(api_key="test_key", rate_limiter=limiter)
+        c.get_quote("AAPL")
+        c.get_quote("MSFT")
+        assert limiter.acquire.call_count == 2
+        assert c.rate_limit_wait == pytest.approx(0.5)
+
+    def test_budget_checked_before_limiter(self):
+        limiter = Mock()
+        c = FMPClient(api_key="test_key", call_budget=0, rate_limiter=limiter)
+        with pytest.raises(BudgetExhausted):
+            c.get_quote("AAPL")
+        limiter.acquire.assert_not_called()
+
+
+class TestResponseCache:
+    @patch("fmp_client.requests.Session.get")
+    def test_cache_hit_skips_network_and_budget(self, mock_get, tmp_path):
+        from response_cache import ResponseCache
+
+        mock_get.return_value = Mock(
+            status_code=200, json=Mock(return_value=[{"symbol": "AAPL"}])
+        )
+        cache = ResponseCache(str(tmp_path))
+        c = FMPClient(api_key="test_key", cache=cache)
+        c.get_quote("AAPL")
+        c.get_quote("AAPL")
+        assert mock_get.call_count == 1
+        assert c.calls_made == 1
+
+        # A fresh client (next scan) is served entirely from disk
+        c2 = FMPClient(api_key="other_key", call_budget=0, cache=cache)
+        assert c2.get_quote("AAPL") == {"symbol": "AAPL"}
+        assert c2.calls_made == 0
+
+    @patch("fmp_client.requests.Session.get")
+    def test_errors_are_not_cached(self, mock_get, tmp_path):
+        from response_cache import ResponseCache
+
+        mock_get.return_value = Mock(status_code=500, text="oops")
+        cache = ResponseCache(str(tmp_path))
+        c = FMPClient(api_key="test_key", cache=cache, retries=0)
+        with pytest.raises(Exception):
+            c.get_quote("AAPL")
+        assert cache.size_bytes == 0
+
+
+class TestHistoricalDateRange:
+    @patch("fmp_client.requests.Session.get")
+    def test_from_to_replaces_timeseries(self, mock_get, client):
+        mock_get.return_value = Mock(
+            status_code=200, json=Mock(return_value=[])
+        )
+        client.get_historical_prices(
+            "AAPL", from_date="2026-02-19", to_date="2026-02-20"
+        )
+        params = mock_get.call_args[1]["params"]
+        assert params["from"] == "2026-02-19"
+        assert params["to"] == "2026-02-20"
+        assert "timeseries" not in params
+
+
+class TestCancellation:
+    @patch("fmp_client.requests.Session.get")
+    def test_cancelled_client_makes_no_calls(self, mock_get):
+        import threading
+        from fmp_client import ScanCancelled
+
+        cancel = threading.Event()
+        c = FMPClient(api_key="test_key", cancel_event=cancel)
+        cancel.set()
+        with pytest.raises(ScanCancelled):
+            c.get_quote("AAPL")
+        mock_get.assert_not_called()
+        assert c.calls_made == 0
+
+
+class TestBudgetLedger:
+    @pytest.fixture
+    def ledger(self, tmp_path):
+        return BudgetLedger(str(tmp_path / "budget.sqlite"), daily_limit=2)
+
+    @patch("fmp_client.requests.Session.get")
+    def test_ledger_caps_calls_across_clients(self, mock_get, ledger):
+        mock_get.return_value = Mock(
+            status_code=200, json=Mock(return_value=[{"symbol": "AAPL"}])
+        )
+        first = FMPClient(api_key="test_key", ledger=ledger)
+        second = FMPClient(api_key="test_key", ledger=ledger)
+        first.get_quote("AAPL")
+        second.get_quote("AAPL")
+        with pytest.raises(BudgetExhausted, match="Daily FMP quota"):
+            first.get_quote("AAPL")
+        assert mock_get.call_count == 2
+        assert first.calls_made == 1
+        assert first.daily_remaining == 0
+
+    @patch("fmp_client.requests.Session.get")
+    def test_429_marks_day_exhausted(self, mock_get, ledger):
+        mock_get.return_value = Mock(status_code=429, text="Limit Reach")
+        c = FMPClient(api_key="test_key", ledger=ledger)
+        with pytest.raises(BudgetExhausted):
+            c.get_quote("AAPL")
+        assert ledger.remaining("test_key") == 0
+
+    @patch("fmp_client.requests.Session.get")
+    def test_cancelled_call_is_refunded(self, mock_get, ledger):
+        import threading
+        event = threading.Event()
+        limiter = Mock()
+        limiter.acquire.side_effect = lambda: event.set() or 0
+        c = FMPClient(
+            api_key="test_key", ledger=ledger, rate_limiter=limiter,
+            cancel_event=event,
+        )
+        with pytest.raises(ScanCancelled):
+            c.get_quote("AAPL")
+        assert ledger.used("test_key") == 0
+        assert c.calls_made == 0
+        mock_get.assert_not_called()
+
+    def test_no_ledger_means_no_daily_remaining(self, client):
+        assert client.daily_remaining is None
+
+
+class TestRetries:
+    @patch("fmp_client.requests.Session.get")
+    def test_retries_server_errors_with_backoff(self, mock_get):
+        ok = Mock(status_code=200, json=Mock(return_value=[{"symbol": "A"}]))
+        mock_get.side_effect = [Mock(status_code=502, text="bad"),
+                                Mock(status_code=503, text="busy"), ok]
+        sleeps = []
+        c = FMPClient(api_key="test_key", sleep=sleeps.append)
+        assert c.get_quote("A") == {"symbol": "A"}
+        assert sleeps == [0.5, 1.0]
+        assert c.retries_made == 2
+        assert c.calls_made == 3
+
+    @patch("fmp_client.requests.Session.get")
+    def test_retries_connection_errors(self, mock_get):
+        import requests
+        ok = Mock(status_code=200, json=Mock(return_value=[{"symbol": "A"}]))
+        mock_get.side_effect = [requests.ConnectionError("reset"), ok]
+        c = FMPClient(api_key="test_key", sleep=lambda s: None)
+        assert c.get_quote("A") == {"symbol": "A"}
+        assert c.stats()["status_counts"] == {"error": 1, "200": 1}
+
+    @patch("fmp_client.requests.Session.get")
+    def test_gives_up_after_retries(self, mock_get):
+        mock_get.return_value = Mock(status_code=500, text="oops")
+        c = FMPClient(api_key="test_key", retries=1, sleep=lambda s: None)
+        with pytest.raises(Exception, match="500"):
+            c.get_quote("A")
+        assert mock_get.call_count == 2
+
+    @patch("fmp_client.requests.Session.get")
+    def test_client_errors_are_not_retried(self, mock_get):
+        mock_get.return_value = Mock(status_code=404, text="nope")
+        c = FMPClient(api_key="test_key", sleep=lambda s: None)
+        with pytest.raises(Exception, match="404"):
+            c.get_quote("A")
+        assert mock_get.call_count == 1
+
+    def test_retries_respect_budget(self):
+        c = FMPClient(api_key="test_key", call_budget=1,
+                      sleep=lambda s: None)
+        with patch("fmp_client.requests.Session.get",
+                   return_value=Mock(status_code=500, text="oops")):
+            with pytest.raises(BudgetExhausted):
+                c.get_quote("A")
+
+
+class TestStats:
+    @patch("fmp_client.requests.Session.get")
+    def test_counts_calls_latency_and_cache(self, mock_get, tmp_path):
+        from response_cache import ResponseCache
+
+        mock_get.return_value = Mock(
+            status_code=200, json=Mock(return_value=[{"symbol": "A"}])
+        )
+        c = FMPClient(api_key="test_key",
+                      cache=ResponseCache(str(tmp_path)))
+        c.get_quote("A")
+        c.get_quote("A")
+        c.get_quotes(["A", "B"])
+        stats = c.stats()
+        assert stats["calls"] == 2
+        assert stats["calls_by_endpoint"] == {"quote": 1, "batch-quote": 1}
+        assert stats["cache_hits"] == 1
+        assert stats["cache_misses"] == 2
+        assert stats["latency_ms"]["p50"] is not None
+        assert set(stats["latency_ms_by_endpoint"]) == {"quote",
+                                                        "batch-quote"}
+        json.dumps(stats)
+
+    @patch("fmp_client.requests.Session.get")
+    def test_on_call_hears_every_attempt(self, mock_get):
+        mock_get.side_effect = [
+            Mock(status_code=500, text="oops"),
+            Mock(status_code=200, json=Mock(return_value=[{"symbol": "A"}])),
+        ]
+        calls = []
+        c = FMPClient(api_key="test_key", sleep=lambda s: None,
+                      on_call=lambda *call: calls.append(call))
+        c.get_quote("A")
+        assert calls == [("quote", 500), ("quote", 200)]
+
+    def test_latency_summary(self):
+        from fmp_client import latency_summary
+
+        summary = latency_summary([i / 1000 for i in range(1, 101)])
+        assert summary == {"p50": 50.0, "p95": 95.0, "max": 100.0}
+        assert latency_summary([]) == {"p50": None, "p95": None,
+                                       "max": None}
+
+    def test_counts_bytes_received(self):
+        from fake_fmp_server import FakeFMPServer, SyntheticMarket
+
+        with FakeFMPServer(market=SyntheticMarket()) as server:
+            with FMPClient(api_key="k", base_url=server.base_url) as c:
+                c.get_quote("AAPL")
+                assert c.bytes_received == server.bytes_sent > 0
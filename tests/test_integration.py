@@ -4,6 +4,12 @@ import json
 import os
 from unittest.mock import patch, Mock
 from app import create_app
+from ath_index import AthIndex
+from budget_ledger import BudgetLedger
+from price_store import PriceStore
+from response_cache import ResponseCache
+from scan_archive import ScanArchive
+from scan_planner import ScanStats
 
 
 MOCK_SECTORS = [
@@ -33,21 +39,38 @@ MOCK_QUOTES = {
             "name": "Exxon Mobil Corporation"},
 }
 
+MOCK_DATES = ("2024-01-04", "2024-01-03", "2024-01-02")
+
 MOCK_HISTORICAL = {
-    "NVDA": {"symbol": "NVDA", "historical": [
-        {"high": 950.0}, {"high": 1050.0}, {"high": 800.0}
-    ]},
-    "CRM": {"symbol": "CRM", "historical": [
-        {"high": 330.0}, {"high": 370.0}, {"high": 290.0}
-    ]},
-    "XOM": {"symbol": "XOM", "historical": [
-        {"high": 120.0}, {"high": 130.0}, {"high": 110.0}
-    ]},
+    symbol: {"symbol": symbol, "historical": [
+        {"date": day, "high": high, "close": high}
+        for day, high in zip(MOCK_DATES, highs)
+    ]}
+    for symbol, highs in (
+        ("NVDA", (950.0, 1050.0, 800.0)),
+        ("CRM", (330.0, 370.0, 290.0)),
+        ("XOM", (120.0, 130.0, 110.0)),
+    )
 }
 
 
 @pytest.fixture
-def client():
+def state(tmp_path):
+    """Fresh local state, so tests never touch the checkout's cache/."""
+    stores = {
+        "RESPONSE_CACHE": ResponseCache(str(tmp_path / "responses")),
+        "PRICE_STORE": PriceStore(str(tmp_path / "prices")),
+        "ATH_INDEX": AthIndex(str(tmp_path / "ath_index.json")),
+        "SCAN_STATS": ScanStats(str(tmp_path / "scan_stats.json")),
+        "BUDGET_LEDGER": BudgetLedger(str(tmp_path / "budget.sqlite")),
+        "SCAN_ARCHIVE": ScanArchive(str(tmp_path / "scan_archive.sqlite")),
+    }
+    with patch.multiple("app", **stores):
+        yield stores
+
+
+@pytest.fixture
+def client(state):
     app = create_app(testing=True)
     with app.test_client() as c:
         yield c
@@ -57,8 +80,12 @@ def _setup_mock_fmp(mock_fmp):
     """Configure mock FMP client with test data."""
     mock_fmp.calls_made = 0
     mock_fmp.call_budget = 200
+    mock_fmp.stats.return_value = {}
     mock_fmp.get_sector_performance.return_value = MOCK_SECTORS
     mock_fmp.get_quote.side_effect = lambda sym: MOCK_QUOTES[sym]
+    mock_fmp.get_quotes.side_effect = lambda syms: {
+        s: MOCK_QUOTES[s] for s in syms if s in MOCK_QUOTES
+    }
     mock_fmp.get_historical_prices.side_effect = lambda sym, **kw: MOCK_HISTORICAL[sym]
 
 
@@ -84,9 +111,15 @@ def test_full_scan_pipeline(client):
         resp = client.post("/api/scan",
                            data=json.dumps({"ath_min": 10, "ath_max": 60}),
                            content_type="application/json")
+        assert resp.status_code == 202
+        job_id = json.loads(resp.data)["job_id"]
+        client.application.scan_jobs.wait(job_id, timeout=5)
 
+        resp = client.get(f"/api/scan/{job_id}")
         assert resp.status_code == 200
-        data = json.loads(resp.data)
+        job = json.loads(resp.data)
+        assert job["status"] == "completed"
+        data = job["result"]
 
         assert "stocks" in data
         assert "scan_metadata" in data
@@ -118,9 +151,12 @@ def test_scan_then_csv_download(client):
         _setup_mock_fmp(mock_fmp)
 
         # Run scan
-        client.post("/api/scan",
-                     data=json.dumps({}),
-                     content_type="application/json")
+        resp = client.post("/api/scan",
+                           data=json.dumps({}),
+                           content_type="application/json")
+        client.application.scan_jobs.wait(
+            json.loads(resp.data)["job_id"], timeout=5
+        )
 
         # Download CSV
         resp = client.get("/api/csv")
@@ -132,3 +168,27 @@ def test_scan_then_csv_download(client):
         assert len(lines) >= 2
         assert "Rank" in lines[0]
         assert "Ticker" in lines[0]
+
+
+def test_scan_uses_price_history(client, state):
+    """ATHs come from the synced history, not the 52-week high."""
+    with patch.dict(os.environ, {"FMP_API_KEY": "test_key"}), \
+         patch("app.FMPClient") as mock_fmp_cls, \
+         patch("scanner.get_stocks_by_sector", side_effect=_mock_universe), \
+         patch("app._save_report"):
+        mock_fmp = Mock()
+        mock_fmp_cls.return_value = mock_fmp
+        _setup_mock_fmp(mock_fmp)
+
+        resp = client.post("/api/scan",
+                           data=json.dumps({}),
+                           content_type="application/json")
+        job = client.application.scan_jobs.wait(
+            json.loads(resp.data)["job_id"], timeout=5
+        )
+
+    stocks = {s["symbol"]: s for s in job.result["stocks"]}
+    assert stocks["NVDA"]["ath"] == 1050.0
+    assert stocks["XOM"]["ath"] == 130.0
+    assert len(state["PRICE_STORE"].get_bars("NVDA")) == 3
+    assert state["ATH_INDEX"].get("NVDA")["ath_date"] == "2024-01-03"
@@ -0,0 +1,232 @@
+import threading
+import pytest
+from jobs import ScanJobManager, JobQueueFull, config_key
+
+
+def _wait_for(event):
+    assert event.wait(5)
+
+
+class TestConfigKey:
+    def test_order_independent(self):
+        assert config_key({"a": 1, "b": 2}) == config_key({"b": 2, "a": 1})
+
+
+class TestScanJobManager:
+    def test_runs_job_and_stores_result(self):
+        manager = ScanJobManager(lambda job: {"stocks": [1]})
+        job, created = manager.submit({"top_n": 5})
+        assert created
+        manager.wait(job.id, timeout=5)
+        assert job.status == "completed"
+        assert job.result == {"stocks": [1]}
+        assert job.to_dict()["result"] == {"stocks": [1]}
+
+    def test_failed_job_records_error(self):
+        def boom(job):
+            raise RuntimeError("FMP API error 500")
+
+        manager = ScanJobManager(boom)
+        job, _ = manager.submit({})
+        manager.wait(job.id, timeout=5)
+        assert job.status == "failed"
+        assert "500" in job.error
+
+    def test_duplicate_active_config_reuses_job(self):
+        release = threading.Event()
+        manager = ScanJobManager(lambda job: release.wait(5))
+        first, _ = manager.submit({"top_n": 5})
+        second, created = manager.submit({"top_n": 5})
+        assert second is first
+        assert not created
+        release.set()
+        manager.wait(first.id, timeout=5)
+
+    def test_queue_is_bounded(self):
+        release = threading.Event()
+        manager = ScanJobManager(lambda job: release.wait(5), max_pending=2)
+        manager.submit({"top_n": 1})
+        manager.submit({"top_n": 2})
+        with pytest.raises(JobQueueFull):
+            manager.submit({"top_n": 3})
+        release.set()
+
+    def test_cancel_queued_job_never_runs(self):
+        started, release = threading.Event(), threading.Event()
+        ran = []
+
+        def run(job):
+            ran.append(job.config)
+            started.set()
+            release.wait(5)
+
+        manager = ScanJobManager(run)
+        first, _ = manager.submit({"top_n": 1})
+        _wait_for(started)
+        queued, _ = manager.submit({"top_n": 2})
+        manager.cancel(queued.id)
+        assert queued.status == "cancelled"
+        release.set()
+        manager.wait(first.id, timeout=5)
+        assert ran == [{"top_n": 1}]
+
+    def test_cancel_running_job_sets_event(self):
+        started = threading.Event()
+
+        def run(job):
+            started.set()
+            assert job.cancel_event.wait(5)
+            raise RuntimeError("Scan cancelled")
+
+        manager = ScanJobManager(run)
+        job, _ = manager.submit({})
+        _wait_for(started)
+        manager.cancel(job.id)
+        manager.wait(job.id, timeout=5)
+        assert job.status == "cancelled"
+        assert job.error is None
+
+    def test_shared_job_runs_until_every_submitter_cancels(self):
+        started = threading.Event()
+
+        def run(job):
+            started.set()
+            assert job.cancel_event.wait(5)
+            raise RuntimeError("Scan cancelled")
+
+        manager = ScanJobManager(run)
+        job, _ = manager.submit({})
+        joined, created = manager.submit({})
+        assert joined is job and not created
+        _wait_for(started)
+        manager.cancel(job.id)
+        assert not job.cancel_event.is_set()
+        assert job.status == "running"
+        manager.cancel(job.id)
+        manager.wait(job.id, timeout=5)
+        assert job.status == "cancelled"
+
+    def test_finished_jobs_are_pruned(self):
+        manager = ScanJobManager(lambda job: {}, keep_finished=2)
+        ids = []
+        for n in range(5):
+            job, _ = manager.submit({"top_n": n})
+            manager.wait(job.id, timeout=5)
+            ids.append(job.id)
+        manager.submit({"top_n": 99})
+        assert manager.get(ids[0]) is None
+        assert manager.get(ids[-1]) is not None
+
+
+class TestResultCache:
+    def _manager(self, ttl=60, window=None):
+        runs = []
+        window = window or {"value": "2026-02-20"}
+
+        def run(job):
+            runs.append(job.config)
+            return {"stocks": [len(runs)]}
+
+        manager = ScanJobManager(run, result_ttl=ttl,
+                                 freshness=lambda: window["value"])
+        return manager, runs, window
+
+    def test_completed_result_is_reused(self):
+        manager, runs, _ = self._manager()
+        first, _ = manager.submit({"top_n": 5})
+        manager.wait(first.id, timeout=5)
+        second, created = manager.submit({"top_n": 5})
+        assert second is first
+        assert not created
+        assert len(runs) == 1
+        assert manager.data_age(second) >= 0
+
+    def test_new_data_window_rescans(self):
+        manager, runs, window = self._manager()
+        first, _ = manager.submit({"top_n": 5})
+        manager.wait(first.id, timeout=5)
+        window["value"] = "2026-02-23"
+        second, created = manager.submit({"top_n": 5})
+        assert created
+        manager.wait(second.id, timeout=5)
+        assert len(runs) == 2
+
+    def test_expired_result_rescans(self):
+        manager, runs, _ = self._manager(ttl=60)
+        first, _ = manager.submit({"top_n": 5})
+        manager.wait(first.id, timeout=5)
+        first.finished_at -= 61
+        _, created = manager.submit({"top_n": 5})
+        assert created
+
+    def test_expired_results_of_other_configs_are_dropped(self):
+        manager, _, window = self._manager(ttl=60)
+        for top_n in range(5):
+            job, _ = manager.submit({"top_n": top_n})
+            manager.wait(job.id, timeout=5)
+        for _, job in manager._results.values():
+            job.finished_at -= 61
+        job, _ = manager.submit({"top_n": 99})
+        manager.wait(job.id, timeout=5)
+        assert list(manager._results) == [config_key({"top_n": 99})]
+        window["value"] = "2026-02-23"
+        manager.submit({"top_n": 100})
+        assert not manager._results
+
+    def test_result_count_is_capped(self):
+        manager, _, _ = self._manager(ttl=60)
+        manager.max_results = 3
+        for top_n in range(5):
+            job, _ = manager.submit({"top_n": top_n})
+            manager.wait(job.id, timeout=5)
+        assert list(manager._results) == [
+            config_key({"top_n": n}) for n in (2, 3, 4)
+        ]
+
+    def test_disabled_without_ttl(self):
+        manager, runs, _ = self._manager(ttl=0)
+        first, _ = manager.submit({"top_n": 5})
+        manager.wait(first.id, timeout=5)
+        _, created = manager.submit({"top_n": 5})
+        assert created
+
+    def test_failed_and_uncacheable_results_are_not_reused(self):
+        def run(job):
+            if job.config["top_n"] == 1:
+                raise RuntimeError("boom")
+            job.cacheable = False
+            return {}
+
+        manager = ScanJobManager(run, result_ttl=60)
+        for top_n in (1, 2):
+            job, _ = manager.submit({"top_n": top_n})
+            manager.wait(job.id, timeout=5)
+            _, created = manager.submit({"top_n": top_n})
+            assert created
+
+    def test_concurrent_submits_coalesce(self):
+        release = threading.Event()
+        runs = []
+
+        def run(job):
+            runs.append(1)
+            release.wait(5)
+            return {}
+
+        manager = ScanJobManager(run, result_ttl=60)
+        jobs = []
+        threads = [
+            threading.Thread(
+                target=lambda: jobs.append(manager.submit({"top_n": 5})[0])
+            )
+            for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        release.set()
+        manager.wait(jobs[0].id, timeout=5)
+        assert len({job.id for job in jobs}) == 1
+        assert manager.submit({"top_n": 5})[0] is jobs[0]
+        assert len(runs) == 1
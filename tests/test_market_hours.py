@@ -0,0 +1,28 @@
+from datetime import datetime, date
+from market_hours import MARKET_TZ, next_close, last_session_date
+
+
+def _ny(*args):
+    return datetime(*args, tzinfo=MARKET_TZ)
+
+
+class TestNextClose:
+    def test_same_day_before_close(self):
+        assert next_close(_ny(2026, 2, 18, 10, 0)) == _ny(2026, 2, 18, 16, 0)
+
+    def test_after_close_rolls_to_next_day(self):
+        assert next_close(_ny(2026, 2, 18, 17, 0)) == _ny(2026, 2, 19, 16, 0)
+
+    def test_skips_weekend(self):
+        assert next_close(_ny(2026, 2, 20, 17, 0)) == _ny(2026, 2, 23, 16, 0)
+
+
+class TestLastSessionDate:
+    def test_before_close_is_previous_day(self):
+        assert last_session_date(_ny(2026, 2, 18, 10, 0)) == date(2026, 2, 17)
+
+    def test_after_close_is_today(self):
+        assert last_session_date(_ny(2026, 2, 18, 16, 30)) == date(2026, 2, 18)
+
+    def test_weekend_is_friday(self):
+        assert last_session_date(_ny(2026, 2, 22, 12, 0)) == date(2026, 2, 20)
@@ -0,0 +1,93 @@
+import threading
+
+from metrics import Registry
+
+
+class TestCounter:
+    def test_unlabelled_counter_starts_at_zero(self):
+        registry = Registry()
+        registry.counter("jobs_total", "Jobs.")
+        assert "jobs_total 0" in registry.render().splitlines()
+
+    def test_labelled_counts(self):
+        registry = Registry()
+        calls = registry.counter("calls_total", "Calls.",
+                                 labels=("endpoint", "status"))
+        calls.inc(endpoint="quote", status=200)
+        calls.inc(endpoint="quote", status=200)
+        calls.inc(2, endpoint="quote", status=429)
+        lines = registry.render().splitlines()
+        assert 'calls_total{endpoint="quote",status="200"} 2' in lines
+        assert 'calls_total{endpoint="quote",status="429"} 2' in lines
+
+    def test_mixed_label_types_render(self):
+        registry = Registry()
+        calls = registry.counter("calls_total", "Calls.",
+                                 labels=("endpoint", "status"))
+        calls.inc(endpoint="quote", status=200)
+        calls.inc(endpoint="quote", status="error")
+        registry.gauge("codes", "Codes.", labels=("code",),
+                       callback=lambda: {(500,): 1, ("error",): 2})
+        lines = registry.render().splitlines()
+        assert 'calls_total{endpoint="quote",status="200"} 1' in lines
+        assert 'calls_total{endpoint="quote",status="error"} 1' in lines
+        assert 'codes{code="500"} 1' in lines
+        assert 'codes{code="error"} 2' in lines
+
+    def test_concurrent_increments_are_not_lost(self):
+        registry = Registry()
+        counter = registry.counter("n_total", "N.")
+
+        def work():
+            for _ in range(1000):
+                counter.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert "n_total 8000" in registry.render()
+
+    def test_escapes_label_values(self):
+        registry = Registry()
+        c = registry.counter("c_total", "C.", labels=("name",))
+        c.inc(name='a"b\\c')
+        assert 'c_total{name="a\\"b\\\\c"} 1' in registry.render()
+
+
+class TestGauge:
+    def test_callback_is_read_at_render(self):
+        value = {"n": 1}
+        registry = Registry()
+        registry.gauge("depth", "Depth.", callback=lambda: value["n"])
+        value["n"] = 7
+        assert "depth 7" in registry.render()
+
+    def test_labelled_callback(self):
+        registry = Registry()
+        registry.gauge("jobs", "Jobs.", labels=("status",),
+                       callback=lambda: {("queued",): 1, ("running",): 2})
+        lines = registry.render().splitlines()
+        assert 'jobs{status="queued"} 1' in lines
+        assert 'jobs{status="running"} 2' in lines
+
+    def test_none_is_skipped(self):
+        registry = Registry()
+        registry.gauge("unknown", "Unknown.", callback=lambda: None)
+        assert "# TYPE unknown gauge" in registry.render()
+        assert "unknown None" not in registry.render()
+
+
+class TestHistogram:
+    def test_cumulative_buckets(self):
+        registry = Registry()
+        h = registry.histogram("took_seconds", "Took.", buckets=(1, 5))
+        for value in (0.5, 1, 3, 10):
+            h.observe(value)
+        lines = registry.render().splitlines()
+        assert 'took_seconds_bucket{le="1"} 2' in lines
+        assert 'took_seconds_bucket{le="5"} 3' in lines
+        assert 'took_seconds_bucket{le="+Inf"} 4' in lines
+        assert "took_seconds_sum 14.5" in lines
+        assert "took_seconds_count 4" in lines
@@ -0,0 +1,232 @@
+import json
+import pytest
+from datetime import date
+import numpy as np
+from unittest.mock import Mock, patch
+from price_store import PriceStore
+
+
+def _bar(day, high):
+    return {"date": day, "open": high - 1, "high": high, "low": high - 2,
+            "close": high - 1, "volume": 1000, "symbol": "AAPL"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PriceStore(str(tmp_path / "prices"))
+
+
+class TestAppend:
+    def test_stores_oldest_first(self, store):
+        store.append("AAPL", [_bar("2026-02-19", 2), _bar("2026-02-18", 1)])
+        assert [b["date"] for b in store.get_bars("AAPL")] == [
+            "2026-02-18", "2026-02-19"
+        ]
+        assert store.last_date("AAPL") == "2026-02-19"
+
+    def test_ignores_bars_already_stored(self, store):
+        store.append("AAPL", [_bar("2026-02-18", 1)])
+        new = store.append(
+            "AAPL", [_bar("2026-02-18", 1), _bar("2026-02-19", 2)]
+        )
+        assert [b["date"] for b in new] == ["2026-02-19"]
+        assert len(store.get_bars("AAPL")) == 2
+
+    def test_persists_across_instances(self, store, tmp_path):
+        store.append("AAPL", [_bar("2026-02-18", 1)])
+        other = PriceStore(str(tmp_path / "prices"))
+        bars = other.get_bars("AAPL")
+        assert bars == [{"date": "2026-02-18", "open": 0, "high": 1,
+                         "low": -1, "close": 0, "volume": 1000}]
+
+    def test_unknown_symbol(self, store):
+        assert store.get_bars("ZZZZ") == []
+        assert store.last_date("ZZZZ") is None
+        assert len(store.get_columns("ZZZZ")["close"]) == 0
+
+    def test_missing_values_round_trip_as_none(self, store):
+        store.append("AAPL", [{"date": "2026-02-18", "high": 1.0}])
+        assert store.get_bars("AAPL")[0]["volume"] is None
+
+
+class TestColumns:
+    def test_views_are_read_only_and_zero_copy(self, store, tmp_path):
+        store.append("AAPL", [_bar("2026-02-18", 1), _bar("2026-02-19", 2)])
+        columns = store.get_columns("AAPL")
+        assert columns["high"].tolist() == [1.0, 2.0]
+        assert columns["date"].dtype == np.dtype("datetime64[D]")
+        assert not columns["high"].flags.writeable
+        assert not columns["high"].flags.owndata
+        with pytest.raises(ValueError):
+            columns["high"][0] = 5
+
+    def test_growing_past_capacity_relocates(self, store, monkeypatch):
+        monkeypatch.setattr("price_store.APPEND_SLACK", 1)
+        store.append("AAPL", [_bar("2026-02-16", 1)])
+        store.append("MSFT", [_bar("2026-02-16", 7)])
+        held = store.get_columns("AAPL")["high"]
+        store.append("AAPL", [_bar("2026-02-17", 2), _bar("2026-02-18", 3)])
+        assert store.get_columns("AAPL")["high"].tolist() == [1, 2, 3]
+        assert store.get_columns("MSFT")["high"].tolist() == [7]
+        # Views taken before the move still see the old data
+        assert held.tolist() == [1]
+
+    def test_imports_legacy_json_files(self, tmp_path):
+        directory = tmp_path / "prices"
+        directory.mkdir()
+        (directory / "AAPL.json").write_text(json.dumps({
+            "symbol": "AAPL", "synced_through": "2026-02-18",
+            "bars": [["2026-02-18", 0, 1, -1, 0, 1000]],
+        }))
+        store = PriceStore(str(directory))
+        assert store.last_date("AAPL") == "2026-02-18"
+        assert store.is_fresh("AAPL", date(2026, 2, 18))
+        assert not (directory / "AAPL.json").exists()
+        assert PriceStore(str(directory)).get_bars("AAPL")[0]["high"] == 1
+
+
+def _append_symbols(directory, symbols):
+    store = PriceStore(directory)
+    for i, symbol in enumerate(symbols):
+        store.append(symbol, [_bar("2026-02-18", i), _bar("2026-02-19", i)])
+
+
+class TestSharedDirectory:
+    def test_instances_see_each_others_writes(self, tmp_path):
+        a = PriceStore(str(tmp_path / "prices"))
+        b = PriceStore(str(tmp_path / "prices"))
+        a.append("X", [_bar("2026-02-18", 100)])
+        b.append("Y", [_bar("2026-02-18", 5)])
+        assert a.get_columns("X")["high"].tolist() == [100.0]
+        assert a.get_columns("Y")["high"].tolist() == [5.0]
+        fresh = PriceStore(str(tmp_path / "prices"))
+        assert fresh.get_columns("X")["high"].tolist() == [100.0]
+        assert fresh.get_columns("Y")["high"].tolist() == [5.0]
+
+    def test_locks_with_msvcrt_without_fcntl(self, tmp_path, monkeypatch):
+        msvcrt = Mock(LK_LOCK=1, LK_UNLCK=0)
+        monkeypatch.setattr("file_lock.fcntl", None)
+        monkeypatch.setattr("file_lock.msvcrt", msvcrt, raising=False)
+        store = PriceStore(str(tmp_path / "prices"))
+        store.append("X", [_bar("2026-02-18", 100)])
+        assert PriceStore(str(tmp_path / "prices")).get_columns("X")[
+            "high"
+        ].tolist() == [100.0]
+        modes = [c.args[1] for c in msvcrt.locking.call_args_list]
+        assert modes and modes == [1, 0] * (len(modes) // 2)
+
+    def test_concurrent_processes_never_share_rows(self, tmp_path):
+        import multiprocessing
+
+        directory = str(tmp_path / "prices")
+        groups = [[f"P{p}S{i}" for i in range(20)] for p in range(4)]
+        context = multiprocessing.get_context("fork")
+        workers = [
+            context.Process(target=_append_symbols, args=(directory, group))
+            for group in groups
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(30)
+            assert worker.exitcode == 0
+        store = PriceStore(directory)
+        for group in groups:
+            for i, symbol in enumerate(group):
+                assert store.get_columns(symbol)["high"].tolist() == [i, i]
+
+
+@patch("price_store.last_session_date", return_value=date(2026, 2, 20))
+class TestSync:
+    def test_first_sync_fetches_full_history(self, _, store):
+        client = Mock()
+        client.get_historical_prices.return_value = {"historical": [
+            _bar("2026-02-20", 3), _bar("2026-02-19", 2),
+        ]}
+        bars = store.sync(client, "AAPL")
+        client.get_historical_prices.assert_called_once_with(
+            "AAPL", timeseries=1260
+        )
+        assert len(bars) == 2
+
+    def test_later_sync_fetches_only_new_bars(self, _, store):
+        store.append("AAPL", [_bar("2026-02-18", 1)],
+                     synced_through="2026-02-18")
+        client = Mock()
+        client.get_historical_prices.return_value = {"historical": [
+            _bar("2026-02-20", 3), _bar("2026-02-19", 2),
+            _bar("2026-02-18", 1),
+        ]}
+        bars = store.sync(client, "AAPL")
+        client.get_historical_prices.assert_called_once_with(
+            "AAPL", from_date="2026-02-18", to_date="2026-02-20"
+        )
+        assert [b["date"] for b in bars] == [
+            "2026-02-18", "2026-02-19", "2026-02-20"
+        ]
+
+    def test_fresh_symbol_makes_no_call(self, _, store):
+        store.append("AAPL", [_bar("2026-02-20", 1)],
+                     synced_through="2026-02-20")
+        client = Mock()
+        store.sync(client, "AAPL")
+        client.get_historical_prices.assert_not_called()
+
+    def test_drops_in_progress_bar(self, _, store):
+        client = Mock()
+        client.get_historical_prices.return_value = {"historical": [
+            _bar("2026-02-23", 9), _bar("2026-02-20", 3),
+        ]}
+        bars = store.sync(client, "AAPL")
+        assert [b["date"] for b in bars] == ["2026-02-20"]
+
+    def test_sync_columns(self, _, store):
+        client = Mock()
+        client.get_historical_prices.return_value = {"historical": [
+            _bar("2026-02-20", 3), _bar("2026-02-19", 2),
+        ]}
+        columns = store.sync_columns(client, "AAPL")
+        assert columns["high"].tolist() == [2.0, 3.0]
+        assert str(columns["date"][-1]) == "2026-02-20"
+
+    def test_empty_sync_still_marks_fresh(self, _, store):
+        store.append("AAPL", [_bar("2026-02-19", 1)],
+                     synced_through="2026-02-19")
+        client = Mock()
+        client.get_historical_prices.return_value = {"historical": []}
+        store.sync(client, "AAPL")
+        assert store.is_fresh("AAPL", date(2026, 2, 20))
+
+    def test_revised_history_is_resynced(self, _, store):
+        store.append("AAPL", [_bar("2026-02-18", 1000)],
+                     synced_through="2026-02-18")
+        on_reset = Mock()
+        store.on_reset = on_reset
+        client = Mock()
+        # After a 10:1 split FMP returns the old bar back-adjusted
+        client.get_historical_prices.side_effect = [
+            {"historical": [_bar("2026-02-19", 101), _bar("2026-02-18", 100)]},
+            {"historical": [_bar("2026-02-19", 101), _bar("2026-02-18", 100),
+                            _bar("2026-02-17", 99)]},
+        ]
+        before = store.version("AAPL")
+        bars = store.sync(client, "AAPL")
+        assert store.version("AAPL") not in (None, before)
+        assert client.get_historical_prices.call_args_list[1].kwargs == {
+            "timeseries": 1260
+        }
+        on_reset.assert_called_once_with("AAPL")
+        assert [b["high"] for b in bars] == [99, 100, 101]
+
+    def test_unrevised_overlap_is_not_stored_twice(self, _, store):
+        store.append("AAPL", [_bar("2026-02-19", 2)],
+                     synced_through="2026-02-19")
+        store.on_reset = Mock()
+        client = Mock()
+        client.get_historical_prices.return_value = {"historical": [
+            _bar("2026-02-20", 3), _bar("2026-02-19", 2),
+        ]}
+        bars = store.sync(client, "AAPL")
+        assert client.get_historical_prices.call_count == 1
+        store.on_reset.assert_not_called()
+        assert [b["date"] for b in bars] == ["2026-02-19", "2026-02-20"]
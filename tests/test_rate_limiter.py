@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import pytest
+from rate_limiter import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+class TestTokenBucket:
+    def test_rejects_bad_settings(self):
+        with pytest.raises(ValueError):
+            TokenBucket(rate=0)
+        with pytest.raises(ValueError):
+            TokenBucket(rate=1, burst=0)
+
+    def test_burst_does_not_wait(self, clock):
+        bucket = TokenBucket(rate=10, burst=3, clock=clock, sleep=clock.sleep)
+        for _ in range(3):
+            assert bucket.acquire() == 0
+        assert clock.sleeps == []
+        assert bucket.wait_seconds == 0
+
+    def test_waits_only_when_empty(self, clock):
+        bucket = TokenBucket(rate=10, burst=1, clock=clock, sleep=clock.sleep)
+        bucket.acquire()
+        assert bucket.acquire() == pytest.approx(0.1)
+        assert clock.sleeps == [pytest.approx(0.1)]
+
+    def test_no_wait_after_idle_time(self, clock):
+        bucket = TokenBucket(rate=10, burst=1, clock=clock, sleep=clock.sleep)
+        bucket.acquire()
+        clock.now += 1.0
+        assert bucket.acquire() == 0
+        assert clock.sleeps == []
+
+    def test_refill_capped_at_burst(self, clock):
+        bucket = TokenBucket(rate=10, burst=2, clock=clock, sleep=clock.sleep)
+        clock.now += 100
+        bucket.acquire()
+        bucket.acquire()
+        assert bucket.acquire() == pytest.approx(0.1)
+
+    def test_tracks_wait_time(self, clock):
+        bucket = TokenBucket(rate=10, burst=1, clock=clock, sleep=clock.sleep)
+        for _ in range(4):
+            bucket.acquire()
+        stats = bucket.stats()
+        assert stats["acquired"] == 4
+        assert stats["waits"] == 3
+        assert stats["wait_seconds"] == pytest.approx(0.3)
+
+    def test_queued_callers_get_successive_slots(self):
+        # Simultaneous callers are promised consecutive refills.
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, burst=1, clock=clock, sleep=clock.sleep)
+        delays = [bucket._reserve() for _ in range(4)]
+        assert delays == [
+            0, pytest.approx(0.1), pytest.approx(0.2), pytest.approx(0.3)
+        ]
+
+    def test_thread_safe_accounting(self):
+        bucket = TokenBucket(rate=100000, burst=1000)
+
+        def worker():
+            for _ in range(100):
+                bucket.acquire()
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert bucket.acquired == 800
+
+    def test_async_acquire(self):
+        bucket = TokenBucket(rate=100, burst=1)
+
+        async def run():
+            return await asyncio.gather(
+                *(bucket.acquire_async() for _ in range(3))
+            )
+
+        delays = asyncio.run(run())
+        assert delays[0] == 0
+        assert sum(1 for d in delays if d > 0) == 2
+        assert bucket.waits == 2
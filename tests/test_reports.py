@@ -0,0 +1,108 @@
+import gzip
+import json
+import os
+from datetime import datetime
+import pytest
+from reports import (
+    COMPACT,
+    compact_reports,
+    main,
+    read_report,
+    report_name,
+    report_paths,
+    write_report,
+)
+
+RESULT = {
+    "stocks": [
+        {"rank": 1, "symbol": "NVDA", "sector": "Technology", "score": 80.5,
+         "price": 120.25},
+        {"rank": 2, "symbol": "XOM", "sector": "Energy", "score": 61.0,
+         "price": 99.5},
+    ],
+    "scan_metadata": {"timestamp": "2026-01-05T09:00:00",
+                      "total_candidates": 50},
+}
+
+NOW = datetime(2026, 1, 5, 9, 0, 0)
+
+
+class TestWriteAndRead:
+    def test_pretty_round_trip(self, tmp_path):
+        path = write_report(RESULT, str(tmp_path), now=NOW)
+        assert path.endswith("scan_20260105_090000_000000.json")
+        assert read_report(path) == RESULT
+
+    def test_compact_round_trip(self, tmp_path):
+        path = write_report(RESULT, str(tmp_path), COMPACT, now=NOW)
+        assert path.endswith("scan_20260105_090000_000000.json.gz")
+        assert read_report(path) == RESULT
+        stored = json.loads(gzip.decompress(open(path, "rb").read()))
+        assert stored["stock_columns"]["symbol"] == ["NVDA", "XOM"]
+
+    def test_compact_is_much_smaller(self, tmp_path):
+        big = {
+            "stocks": [dict(RESULT["stocks"][0], symbol=f"S{i:04d}",
+                            rank=i) for i in range(2000)],
+            "scan_metadata": RESULT["scan_metadata"],
+        }
+        pretty = write_report(big, str(tmp_path / "a"), now=NOW)
+        compact = write_report(big, str(tmp_path / "b"), COMPACT, now=NOW)
+        assert os.path.getsize(compact) * 10 < os.path.getsize(pretty)
+
+    def test_empty_result(self, tmp_path):
+        empty = {"stocks": [], "scan_metadata": {}}
+        path = write_report(empty, str(tmp_path), COMPACT, now=NOW)
+        assert read_report(path) == empty
+
+    def test_unknown_format(self, tmp_path):
+        with pytest.raises(ValueError):
+            write_report(RESULT, str(tmp_path), "xml")
+
+    def test_same_timestamp_gets_unique_names(self, tmp_path):
+        first = write_report(RESULT, str(tmp_path), now=NOW)
+        second = write_report(RESULT, str(tmp_path), COMPACT, now=NOW)
+        third = write_report(RESULT, str(tmp_path), now=NOW)
+        names = [report_name(p) for p in (first, second, third)]
+        assert names == ["scan_20260105_090000_000000.json",
+                         "scan_20260105_090000_000000_2.json",
+                         "scan_20260105_090000_000000_3.json"]
+        assert all(read_report(p) == RESULT for p in (first, second, third))
+
+    def test_paths_and_names(self, tmp_path):
+        write_report(RESULT, str(tmp_path), COMPACT, now=NOW)
+        write_report(RESULT, str(tmp_path), now=datetime(2026, 1, 12))
+        names = [report_name(p) for p in report_paths(str(tmp_path))]
+        assert names == ["scan_20260105_090000_000000.json",
+                         "scan_20260112_000000_000000.json"]
+
+
+class TestCompaction:
+    def test_rewrites_pretty_reports(self, tmp_path):
+        write_report(RESULT, str(tmp_path), now=NOW)
+        stats = compact_reports(str(tmp_path))
+        assert stats["compacted"] == 1
+        assert stats["bytes_after"] < stats["bytes_before"]
+        assert [p.name for p in tmp_path.iterdir()] == [
+            "scan_20260105_090000_000000.json.gz"
+        ]
+        assert read_report(
+            str(tmp_path / "scan_20260105_090000_000000.json.gz")
+        ) == RESULT
+
+    def test_cli(self, tmp_path, capsys):
+        write_report(RESULT, str(tmp_path), now=NOW)
+        main(["compact", str(tmp_path)])
+        assert "Compacted 1 report(s)" in capsys.readouterr().out
+
+    def test_archive_imports_compacted_reports_once(self, tmp_path):
+        from scan_archive import ScanArchive
+        reports = tmp_path / "output"
+        write_report(RESULT, str(reports), now=NOW)
+        archive = ScanArchive(str(tmp_path / "a.sqlite"))
+        assert archive.import_reports(str(reports)) == 1
+        compact_reports(str(reports))
+        assert archive.import_reports(str(reports)) == 0
+        write_report(RESULT, str(reports), COMPACT,
+                     now=datetime(2026, 1, 12))
+        assert archive.import_reports(str(reports)) == 1
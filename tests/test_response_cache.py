@@ -0,0 +1,98 @@
+import os
+import pytest
+from response_cache import ResponseCache, UNTIL_NEXT_CLOSE
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return ResponseCache(
+        str(tmp_path / "responses"),
+        ttls={"quote": 300, "sector-performance-snapshot": 86400},
+        clock=clock,
+    )
+
+
+class TestKeys:
+    def test_key_ignores_api_key(self):
+        a = ResponseCache.make_key("quote", {"symbol": "AAPL", "apikey": "x"})
+        b = ResponseCache.make_key("quote", {"symbol": "AAPL", "apikey": "y"})
+        assert a == b
+        assert "apikey" not in a
+
+    def test_key_ignores_param_order(self):
+        a = ResponseCache.make_key("e", {"a": 1, "b": 2})
+        b = ResponseCache.make_key("e", {"b": 2, "a": 1})
+        assert a == b
+
+
+class TestGetSet:
+    def test_miss_then_hit(self, cache):
+        assert cache.get("quote", {"symbol": "AAPL"}) == (False, None)
+        cache.set("quote", {"symbol": "AAPL"}, [{"price": 1.0}])
+        assert cache.get("quote", {"symbol": "AAPL"}) == (
+            True, [{"price": 1.0}]
+        )
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+        assert cache.stats()["hit_ratio"] == 0.5
+
+    def test_per_endpoint_ttl(self, cache, clock):
+        cache.set("quote", {"symbol": "AAPL"}, [1])
+        cache.set("sector-performance-snapshot", {"date": "d"}, [2])
+        clock.now += 301
+        assert cache.get("quote", {"symbol": "AAPL"})[0] is False
+        assert cache.get("sector-performance-snapshot", {"date": "d"})[0]
+
+    def test_uncacheable_endpoint_not_stored(self, cache):
+        cache.set("profile", {"symbol": "AAPL"}, [1])
+        assert cache.get("profile", {"symbol": "AAPL"})[0] is False
+        assert cache.size_bytes == 0
+
+    def test_persists_across_instances(self, cache, tmp_path, clock):
+        cache.set("quote", {"symbol": "AAPL"}, [1])
+        other = ResponseCache(
+            str(tmp_path / "responses"), ttls={"quote": 300}, clock=clock
+        )
+        assert other.get("quote", {"symbol": "AAPL"}) == (True, [1])
+
+    def test_until_next_close_ttl(self, tmp_path):
+        cache = ResponseCache(
+            str(tmp_path), ttls={"hist": UNTIL_NEXT_CLOSE}
+        )
+        cache.set("hist", {"symbol": "AAPL"}, [1])
+        assert cache.get("hist", {"symbol": "AAPL"}) == (True, [1])
+
+
+class TestEviction:
+    def test_evicts_least_recently_used(self, tmp_path, clock):
+        cache = ResponseCache(
+            str(tmp_path), ttls={"quote": 300}, max_bytes=250, clock=clock
+        )
+        for i, symbol in enumerate(["A", "B", "C"]):
+            cache.set("quote", {"symbol": symbol}, ["x" * 50])
+            path = cache._path(cache.make_key("quote", {"symbol": symbol}))
+            os.utime(path, (i, i))
+        cache.set("quote", {"symbol": "D"}, ["x" * 50])
+        assert cache.size_bytes <= 250
+        assert cache.evictions >= 1
+        assert cache.get("quote", {"symbol": "A"})[0] is False
+        assert cache.get("quote", {"symbol": "D"})[0] is True
+
+    def test_clear(self, cache):
+        cache.set("quote", {"symbol": "AAPL"}, [1])
+        cache.clear()
+        assert cache.size_bytes == 0
+        assert cache.get("quote", {"symbol": "AAPL"})[0] is False
@@ -0,0 +1,160 @@
+import json
+import time
+import pytest
+from scan_archive import ScanArchive, main
+
+
+def _result(timestamp, *stocks):
+    return {
+        "stocks": [
+            {"rank": i + 1, "symbol": symbol, "name": symbol,
+             "sector": sector, "score": score, "price": 100.0}
+            for i, (symbol, sector, score) in enumerate(stocks)
+        ],
+        "scan_metadata": {"timestamp": timestamp, "total_candidates": 50},
+    }
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return ScanArchive(str(tmp_path / "archive.sqlite"))
+
+
+class TestAddScan:
+    def test_round_trips_result(self, archive):
+        result = _result("2026-01-05T09:00:00",
+                         ("NVDA", "Technology", 80.0),
+                         ("XOM", "Energy", 60.0))
+        scan_id = archive.add_scan(result)
+        assert archive.get_scan(scan_id) == result
+
+    def test_scans_saved_in_the_same_second_are_kept(self, archive, tmp_path):
+        from datetime import datetime
+        from reports import report_name, write_report
+
+        now = datetime(2026, 1, 5, 9, 0, 0)
+        ids = []
+        for score in (80.0, 60.0):
+            result = _result("2026-01-05T09:00:00",
+                             ("NVDA", "Technology", score))
+            path = write_report(result, str(tmp_path / "out"), now=now)
+            ids.append(archive.add_scan(result, source=report_name(path)))
+        assert ids[0] != ids[1]
+        assert [row["score"] for row in archive.history(symbol="NVDA")] == [
+            80.0, 60.0
+        ]
+
+    def test_unknown_scan(self, archive):
+        assert archive.get_scan(42) is None
+
+
+class TestQueries:
+    @pytest.fixture
+    def filled(self, archive):
+        archive.add_scan(_result("2026-01-05T09:00:00",
+                                 ("NVDA", "Technology", 70.0),
+                                 ("XOM", "Energy", 55.0)))
+        archive.add_scan(_result("2026-01-12T09:00:00",
+                                 ("NVDA", "Technology", 82.0),
+                                 ("AAPL", "Technology", 64.0)))
+        return archive
+
+    def test_symbol_history_oldest_first(self, filled):
+        rows = filled.history(symbol="nvda")
+        assert [r["score"] for r in rows] == [70.0, 82.0]
+        assert rows[0]["scanned_at"] == "2026-01-05T09:00:00"
+
+    def test_sector_and_score_band(self, filled):
+        rows = filled.history(sector="Technology", min_score=65,
+                              max_score=80)
+        assert [(r["symbol"], r["score"]) for r in rows] == [("NVDA", 70.0)]
+
+    def test_time_range(self, filled):
+        rows = filled.history(since="2026-01-10")
+        assert {r["symbol"] for r in rows} == {"NVDA", "AAPL"}
+        scans = filled.list_scans(until="2026-01-10")
+        assert [s["scanned_at"] for s in scans] == ["2026-01-05T09:00:00"]
+
+    def test_list_scans_newest_first(self, filled):
+        assert [s["stock_count"] for s in filled.list_scans()] == [2, 2]
+        assert filled.list_scans()[0]["scanned_at"].startswith("2026-01-12")
+
+    def test_latest_and_previous(self, filled):
+        latest = filled.latest_scan_id()
+        previous = filled.previous_scan_id(latest)
+        assert filled.scan_info(latest)["scanned_at"].startswith("2026-01-12")
+        assert filled.scan_info(previous)["scanned_at"].startswith(
+            "2026-01-05"
+        )
+        assert filled.previous_scan_id(previous) is None
+
+    def test_previous_scan_has_same_config(self, archive):
+        def add(day, top_n):
+            result = _result(f"2026-01-{day}T09:00:00",
+                             ("NVDA", "Technology", 70.0))
+            result["scan_metadata"]["config"] = {"top_n": top_n, "x": 1}
+            return archive.add_scan(result)
+
+        first = add("05", 15)
+        add("06", 10)
+        latest = add("07", 15)
+        assert archive.previous_scan_id(latest) == first
+
+    def test_upgrades_archive_without_config_column(self, tmp_path):
+        import sqlite3
+        path = str(tmp_path / "old.sqlite")
+        conn = sqlite3.connect(path)
+        conn.execute(
+            "CREATE TABLE scans (id INTEGER PRIMARY KEY, scanned_at TEXT "
+            "NOT NULL, source TEXT UNIQUE, stock_count INTEGER NOT NULL, "
+            "metadata TEXT NOT NULL)"
+        )
+        conn.execute(
+            "INSERT INTO scans VALUES (1, '2026-01-05', NULL, 0, '{}')"
+        )
+        conn.commit()
+        conn.close()
+        archive = ScanArchive(path)
+        scan_id = archive.add_scan(_result("2026-01-12T09:00:00"))
+        assert archive.previous_scan_id(scan_id) == 1
+
+    def test_ranked_stocks_sorted_by_symbol(self, filled):
+        rows = filled.ranked_stocks(filled.latest_scan_id())
+        assert [r["symbol"] for r in rows] == ["AAPL", "NVDA"]
+        assert rows[1]["rank"] == 1
+
+    def test_year_of_weekly_scans_is_fast(self, archive):
+        for week in range(52):
+            archive.add_scan(_result(
+                f"2025-{week // 4 + 1:02d}-{week % 4 * 7 + 1:02d}T09:00:00",
+                *[(f"S{i:03d}", "Technology", float(i % 100))
+                  for i in range(500)],
+            ))
+        start = time.perf_counter()
+        rows = archive.history(symbol="S042")
+        assert len(rows) == 52
+        assert time.perf_counter() - start < 0.05
+
+
+class TestImport:
+    def test_imports_reports_once(self, archive, tmp_path):
+        output = tmp_path / "output"
+        output.mkdir()
+        (output / "scan_20260105_090000.json").write_text(json.dumps(
+            _result("2026-01-05T09:00:00", ("NVDA", "Technology", 70.0))
+        ))
+        (output / "notes.json").write_text("{}")
+        assert archive.import_reports(str(output)) == 1
+        assert archive.import_reports(str(output)) == 0
+        assert archive.history(symbol="NVDA")[0]["score"] == 70.0
+
+    def test_cli(self, tmp_path, capsys):
+        output = tmp_path / "output"
+        output.mkdir()
+        (output / "scan_1.json").write_text(json.dumps(
+            _result("2026-01-05T09:00:00", ("NVDA", "Technology", 70.0))
+        ))
+        path = str(tmp_path / "a.sqlite")
+        main(["import", str(output), "--archive", path])
+        assert "Imported 1 report(s)" in capsys.readouterr().out
+        assert len(ScanArchive(path).list_scans()) == 1
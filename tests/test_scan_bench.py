@@ -0,0 +1,55 @@
+import pytest
+import json
+from benchmarks.scan_bench import compare, main
+
+
+def _report(**metrics):
+    base = {"name": "synthetic-100", "wall_seconds": 1.0, "api_calls": 40,
+            "bytes_received": 1000, "peak_memory_bytes": 5000}
+    return {"results": [{**base, **metrics}]}
+
+
+class TestCompare:
+    def test_flags_regressions_over_threshold(self):
+        rows = compare(_report(), _report(wall_seconds=1.2, api_calls=41),
+                       threshold=0.1)
+        by_metric = {row["metric"]: row for row in rows}
+        assert by_metric["wall_seconds"]["regressed"]
+        assert by_metric["wall_seconds"]["change"] == pytest.approx(0.2)
+        assert not by_metric["api_calls"]["regressed"]
+
+    def test_improvements_are_not_regressions(self):
+        rows = compare(_report(), _report(wall_seconds=0.5), threshold=0.1)
+        assert not any(row["regressed"] for row in rows)
+
+    def test_skips_missing_benchmarks_and_metrics(self):
+        new = _report(name="synthetic-999", bytes_received=None)
+        assert compare(_report(), new, threshold=0.1) == []
+        rows = compare(_report(), _report(bytes_received=None), 0.1)
+        assert "bytes_received" not in {row["metric"] for row in rows}
+
+    def test_compare_command_exit_status(self, tmp_path):
+        base, new = tmp_path / "base.json", tmp_path / "new.json"
+        base.write_text(json.dumps(_report()))
+        new.write_text(json.dumps(_report(peak_memory_bytes=9000)))
+        assert main(["compare", str(base), str(base)]) == 0
+        assert main(["compare", str(base), str(new)]) == 1
+        assert main(["compare", str(base), str(new),
+                     "--threshold", "1.0"]) == 0
+
+
+class TestRun:
+    def test_small_synthetic_run(self, tmp_path, capsys):
+        output = tmp_path / "results.json"
+        assert main(["run", "--sizes", "60", "--repeat", "1",
+                     "--output", str(output)]) == 0
+        report = json.loads(output.read_text())
+        [result] = report["results"]
+        assert result["name"] == "synthetic-60"
+        assert result["symbols"] == 60
+        assert result["api_calls"] > 0
+        assert result["bytes_received"] > 0
+        assert result["peak_memory_bytes"] > 0
+        assert {"sectors", "quote", "enrich", "rank"} <= set(
+            result["stages"]
+        )
@@ -0,0 +1,59 @@
+from scan_diff import diff_scans, diff_sorted
+
+
+def _scan(*stocks):
+    return {"stocks": [
+        {"symbol": symbol, "rank": rank, "score": score, "sector": "Tech"}
+        for symbol, rank, score in stocks
+    ]}
+
+
+class TestDiffScans:
+    def test_entrants_dropouts_and_moves(self):
+        old = _scan(("NVDA", 1, 80.0), ("XOM", 2, 70.0), ("AAPL", 3, 60.0))
+        new = _scan(("AAPL", 1, 82.5), ("NVDA", 2, 79.0), ("MSFT", 3, 65.0))
+        diff = diff_scans(old, new)
+        assert [s["symbol"] for s in diff["entered"]] == ["MSFT"]
+        assert [s["symbol"] for s in diff["dropped"]] == ["XOM"]
+        assert diff["dropped"][0]["rank"] == 2
+        aapl, nvda = diff["changed"]
+        assert aapl["symbol"] == "AAPL"
+        assert aapl["rank_change"] == 2
+        assert aapl["score_delta"] == 22.5
+        assert nvda["rank_change"] == -1
+        assert diff["summary"] == {
+            "entered": 1, "dropped": 1, "moved_up": 1, "moved_down": 1,
+            "unchanged": 0,
+        }
+
+    def test_identical_scans(self):
+        scan = _scan(("NVDA", 1, 80.0), ("AAPL", 2, 60.0))
+        diff = diff_scans(scan, scan)
+        assert diff["entered"] == diff["dropped"] == []
+        assert diff["summary"]["unchanged"] == 2
+
+    def test_empty_side(self):
+        diff = diff_scans(_scan(), _scan(("NVDA", 1, 80.0)))
+        assert diff["summary"]["entered"] == 1
+        diff = diff_scans(_scan(("NVDA", 1, 80.0)), {"stocks": []})
+        assert diff["summary"]["dropped"] == 1
+
+    def test_missing_rank_or_score(self):
+        old = {"stocks": [{"symbol": "NVDA"}]}
+        new = {"stocks": [{"symbol": "NVDA", "rank": 1, "score": 80.0}]}
+        change = diff_scans(old, new)["changed"][0]
+        assert change["rank_change"] is None
+        assert change["score_delta"] is None
+
+
+class TestDiffSorted:
+    def test_large_universe_single_pass(self):
+        old = [{"symbol": f"S{i:05d}", "rank": i, "score": 50.0}
+               for i in range(0, 20000, 2)]
+        new = [{"symbol": f"S{i:05d}", "rank": i, "score": 51.0}
+               for i in range(0, 20000, 3)]
+        diff = diff_sorted(old, new)
+        both = len(range(0, 20000, 6))
+        assert len(diff["changed"]) == both
+        assert len(diff["dropped"]) == len(old) - both
+        assert len(diff["entered"]) == len(new) - both
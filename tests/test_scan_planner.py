@@ -0,0 +1,99 @@
+import json
+from scan_planner import (
+    DEFAULT_QUICK_PASS_RATE,
+    ScanStats,
+    plan_scan,
+)
+
+
+def _sector(name, perf, n, start=0):
+    return (
+        {"sector": name, "changesPercentage": str(perf)},
+        [{"symbol": f"{name[:3]}{start + i}"} for i in range(n)],
+    )
+
+
+SECTORS = [
+    _sector("Technology", 3.0, 60),
+    _sector("Energy", 2.0, 25),
+    _sector("Healthcare", 1.0, 60),
+]
+
+
+class TestPlanScan:
+    def test_takes_strongest_sectors_that_fit(self):
+        # Tech: 1 quote + 48 history; + Energy: 1 + 68; + Health: 2 + 116
+        plan = plan_scan(SECTORS, budget=100)
+        assert [s["sector"] for s in plan.sectors] == [
+            "Technology", "Energy"
+        ]
+        assert len(plan.candidates) == 85
+        assert plan.quote_calls == 1
+        assert plan.enrich_quota == 99
+        assert plan.expected_enrich_calls == 68
+        assert plan.expected_calls == 69
+
+    def test_large_budget_takes_all_sectors(self):
+        plan = plan_scan(SECTORS, budget=200)
+        assert len(plan.sectors) == 3
+        assert plan.quote_calls == 2
+
+    def test_free_symbols_make_room_for_more_sectors(self):
+        plan = plan_scan(
+            SECTORS, budget=60, is_free=lambda s: not s.startswith("Ene")
+        )
+        assert len(plan.sectors) == 3
+        assert plan.free_enrichments == 120
+        assert plan.expected_enrich_calls == 20
+
+    def test_pass_rate_changes_the_plan(self):
+        plan = plan_scan(SECTORS, budget=100, quick_pass_rate=0.3)
+        assert len(plan.sectors) == 3
+
+    def test_always_plans_one_sector(self):
+        plan = plan_scan(SECTORS, budget=10)
+        assert [s["sector"] for s in plan.sectors] == ["Technology"]
+        assert plan.enrich_quota == 9
+
+    def test_cuts_candidates_when_quotes_do_not_fit(self):
+        plan = plan_scan(SECTORS, budget=1, batch_size=20)
+        assert len(plan.candidates) == 20
+        assert plan.quote_calls == 1
+        assert plan.enrich_quota == 0
+
+    def test_zero_budget(self):
+        plan = plan_scan(SECTORS, budget=0)
+        assert plan.candidates == []
+        assert plan.enrich_quota == 0
+
+    def test_to_dict_is_json_friendly(self):
+        summary = plan_scan(SECTORS, budget=100).to_dict()
+        assert summary["sectors"] == ["Technology", "Energy"]
+        assert summary["candidates"] == 85
+        json.dumps(summary)
+
+
+class TestScanStats:
+    def test_defaults_without_history(self, tmp_path):
+        stats = ScanStats(str(tmp_path / "stats.json"))
+        assert stats.quick_pass_rate == DEFAULT_QUICK_PASS_RATE
+        assert stats.scans == 0
+
+    def test_first_scan_sets_rate_then_smooths(self, tmp_path):
+        stats = ScanStats(str(tmp_path / "stats.json"))
+        stats.record(100, 50)
+        assert stats.quick_pass_rate == 0.5
+        stats.record(100, 100)
+        assert 0.5 < stats.quick_pass_rate < 1.0
+
+    def test_persists(self, tmp_path):
+        path = str(tmp_path / "stats.json")
+        ScanStats(path).record(10, 4)
+        reloaded = ScanStats(path)
+        assert reloaded.quick_pass_rate == 0.4
+        assert reloaded.scans == 1
+
+    def test_ignores_scans_that_quoted_nothing(self, tmp_path):
+        stats = ScanStats(str(tmp_path / "stats.json"))
+        stats.record(0, 0)
+        assert stats.scans == 0
@@ -1,5 +1,8 @@
 import pytest
+from datetime import date
+import numpy as np
 from unittest.mock import Mock, patch
+from ath_index import AthIndex
 from scanner import Scanner
 
 
@@ -28,7 +31,7 @@ class TestGetWinningSectors:
         sector_names = [s["sector"] for s in sectors]
         assert "Utilities" not in sector_names
 
-    def test_limits_to_max_3_sectors(self, scanner, mock_client):
+    def test_limit_truncates_sectors(self, scanner, mock_client):
         mock_client.get_sector_performance.return_value = [
             {"sector": "Technology", "changesPercentage": "3.0"},
             {"sector": "Energy", "changesPercentage": "2.0"},
@@ -36,7 +39,8 @@ class TestGetWinningSectors:
             {"sector": "Industrials", "changesPercentage": "1.0"},
             {"sector": "Utilities", "changesPercentage": "0.5"},
         ]
-        sectors = scanner.get_winning_sectors()
+        assert len(scanner.get_winning_sectors()) == 5
+        sectors = scanner.get_winning_sectors(limit=3)
         assert len(sectors) == 3
         assert sectors[0]["sector"] == "Technology"
 
@@ -100,7 +104,38 @@ class TestQuickFilter:
         assert result is None
 
 
+class TestQuickFilterBatch:
+    def test_uses_one_batch_call(self, scanner, mock_client):
+        mock_client.get_quotes.return_value = {
+            "AAPL": {"symbol": "AAPL", "price": 150.0, "yearHigh": 200.0,
+                     "yearLow": 120.0, "volume": 5000000,
+                     "averageVolume": 4000000, "name": "Apple Inc"},
+            "FAIL": {"symbol": "FAIL", "price": 10.0, "yearHigh": 200.0,
+                     "yearLow": 5.0, "volume": 5000000,
+                     "averageVolume": 4000000, "name": "Failed Corp"},
+        }
+        candidates = [
+            {"symbol": s, "name": s, "sector": "Technology",
+             "sector_performance": 2.35}
+            for s in ["AAPL", "FAIL", "NOQUOTE"]
+        ]
+        result = scanner.quick_filter_batch(candidates)
+        mock_client.get_quotes.assert_called_once_with(
+            ["AAPL", "FAIL", "NOQUOTE"]
+        )
+        mock_client.get_quote.assert_not_called()
+        assert [r["symbol"] for r in result] == ["AAPL"]
+        assert result[0]["avgVolume"] == 4000000
+
+
 class TestEnrichCandidate:
+    CANDIDATE = {
+        "symbol": "AAPL", "name": "Apple Inc", "sector": "Technology",
+        "sector_performance": 2.35, "price": 150.0,
+        "yearHigh": 200.0, "yearLow": 120.0,
+        "volume": 5000000, "avgVolume": 4000000,
+    }
+
     def test_adds_ath_and_score(self, scanner, mock_client):
         mock_client.get_historical_prices.return_value = {
             "symbol": "AAPL",
@@ -121,17 +156,105 @@ class TestEnrichCandidate:
         assert "score" in enriched
 
 
+    def test_uses_price_store_when_configured(self, mock_client):
+        store = Mock()
+        store.sync_columns.return_value = {
+            "date": np.array(["2026-02-20"], dtype="datetime64[D]"),
+            "high": np.array([220.0]),
+        }
+        scanner = Scanner(client=mock_client, price_store=store)
+        candidate = {
+            "symbol": "AAPL", "name": "Apple Inc", "sector": "Technology",
+            "sector_performance": 2.35, "price": 150.0,
+            "yearHigh": 200.0, "yearLow": 120.0,
+            "volume": 5000000, "avgVolume": 4000000,
+        }
+        enriched = scanner.enrich_candidate(candidate)
+        store.sync_columns.assert_called_once_with(mock_client, "AAPL")
+        mock_client.get_historical_prices.assert_not_called()
+        assert enriched["ath"] == 220.0
+
+
+    def test_history_rebuilt_by_other_process_rebuilds_ath(
+        self, mock_client, tmp_path
+    ):
+        from price_store import PriceStore
+
+        def bar(day, high):
+            return {"date": day, "high": high, "close": high}
+
+        def process():
+            index = AthIndex(str(tmp_path / "ath.json"))
+            store = PriceStore(str(tmp_path / "prices"),
+                               on_reset=index.drop)
+            return Scanner(client=mock_client, price_store=store,
+                           ath_index=index)
+
+        candidate = {**self.CANDIDATE, "price": 90.0}
+        first, second = process(), process()
+        with patch("scanner.last_session_date",
+                   return_value=date(2026, 2, 19)), \
+             patch("price_store.last_session_date",
+                   return_value=date(2026, 2, 19)):
+            mock_client.get_historical_prices.return_value = {
+                "historical": [bar("2026-02-19", 1000.0)]
+            }
+            for scanner in (first, second):
+                scanner.enrich_candidate(candidate)
+                scanner.ath_index.save()
+        # FMP back-adjusts for a 10:1 split; the first process notices
+        with patch("scanner.last_session_date",
+                   return_value=date(2026, 2, 20)), \
+             patch("price_store.last_session_date",
+                   return_value=date(2026, 2, 20)):
+            mock_client.get_historical_prices.side_effect = [
+                {"historical": [bar("2026-02-20", 101.0),
+                                bar("2026-02-19", 100.0)]},
+                {"historical": [bar("2026-02-20", 101.0),
+                                bar("2026-02-19", 100.0)]},
+            ]
+            assert first.enrich_candidate(candidate)["ath"] == 101.0
+            first.ath_index.save()
+            # The second still holds the pre-split entry in memory
+            assert second.enrich_candidate(candidate)["ath"] == 101.0
+            second.ath_index.save()
+        merged = AthIndex(str(tmp_path / "ath.json"))
+        assert merged.get("AAPL")["ath"] == 101.0
+
+    @patch("scanner.last_session_date", return_value=date(2026, 2, 20))
+    def test_fresh_ath_index_skips_history(self, _, mock_client, tmp_path):
+        index = AthIndex(str(tmp_path / "ath.json"))
+        index.update("AAPL", [{"date": "2026-02-20", "high": 220.0}],
+                     synced_through="2026-02-20")
+        scanner = Scanner(client=mock_client, ath_index=index)
+        enriched = scanner.enrich_candidate(self.CANDIDATE)
+        mock_client.get_historical_prices.assert_not_called()
+        assert enriched["ath"] == 220.0
+
+    @patch("scanner.last_session_date", return_value=date(2026, 2, 20))
+    def test_stale_ath_index_is_updated(self, _, mock_client, tmp_path):
+        index = AthIndex(str(tmp_path / "ath.json"))
+        mock_client.get_historical_prices.return_value = {"historical": [
+            {"date": "2026-02-19", "high": 210.0},
+            {"date": "2026-02-20", "high": 220.0},
+        ]}
+        scanner = Scanner(client=mock_client, ath_index=index)
+        scanner.enrich_candidate(self.CANDIDATE)
+        assert index.get("AAPL")["ath"] == 220.0
+        assert index.is_fresh("AAPL", date(2026, 2, 20))
+
+
 class TestRunScan:
     @patch("scanner.get_stocks_by_sector")
     def test_full_pipeline_returns_results(self, mock_get_stocks, scanner, mock_client):
         mock_get_stocks.return_value = [
             {"symbol": "AAPL", "name": "Apple", "sector": "Information Technology"},
         ]
-        mock_client.get_quote.return_value = {
+        mock_client.get_quotes.return_value = {"AAPL": {
             "symbol": "AAPL", "price": 150.0, "yearHigh": 200.0,
             "yearLow": 120.0, "volume": 5000000, "averageVolume": 4000000,
             "name": "Apple Inc",
-        }
+        }}
         mock_client.get_historical_prices.return_value = {
             "symbol": "AAPL",
             "historical": [{"high": 220.0}],
@@ -143,3 +266,359 @@ class TestRunScan:
         assert "scan_metadata" in results
         assert results["scan_metadata"]["total_candidates"] >= 1
         assert "api_calls_used" in results["scan_metadata"]
+
+
+def _universe(n):
+    return [
+        {"symbol": f"S{i:03d}", "name": f"Stock {i}",
+         "sector": "Information Technology"}
+        for i in range(n)
+    ]
+
+
+def _quote(symbol):
+    i = int(symbol[1:])
+    return {
+        "symbol": symbol, "price": 100.0 + i, "yearHigh": 150.0 + i,
+        "yearLow": 80.0, "volume": 1000000 + i * 1000,
+        "averageVolume": 1000000, "name": symbol,
+    }
+
+
+def _history(symbol, **kw):
+    i = int(symbol[1:])
+    return {"symbol": symbol, "historical": [{"high": 160.0 + 2 * i}]}
+
+
+class TestConcurrentScan:
+    def _client(self, budget=1000):
+        client = Mock()
+        client.calls_made = 0
+        client.call_budget = budget
+        client.get_sector_performance.return_value = [
+            {"sector": "Technology", "changesPercentage": "2.35"},
+        ]
+        client.get_quotes.side_effect = lambda syms: {
+            s: _quote(s) for s in syms
+        }
+        client.get_historical_prices.side_effect = _history
+        return client
+
+    @patch("scanner.get_stocks_by_sector")
+    def test_matches_serial_results(self, mock_get_stocks):
+        mock_get_stocks.return_value = _universe(40)
+        serial = Scanner(client=self._client()).run_scan()
+        concurrent = Scanner(client=self._client(), max_workers=8).run_scan()
+        assert concurrent["stocks"] == serial["stocks"]
+        for key in ["total_candidates", "quick_filtered"]:
+            assert (
+                concurrent["scan_metadata"][key]
+                == serial["scan_metadata"][key]
+            )
+
+    @pytest.mark.parametrize("prune", [True, False])
+    @patch("scanner.get_stocks_by_sector")
+    def test_quota_goes_to_same_candidates_as_serial(
+        self, mock_get_stocks, prune
+    ):
+        import time
+        mock_get_stocks.return_value = _universe(300)
+
+        def get_quotes(symbols):
+            if symbols[0] == "S000":
+                # The first batch lands last
+                time.sleep(0.05)
+            return {s: _quote(s) for s in symbols}
+
+        serial_client = self._client(budget=30)
+        serial = Scanner(client=serial_client, prune=prune).run_scan()
+        client = self._client(budget=30)
+        client.get_quotes.side_effect = get_quotes
+        concurrent = Scanner(
+            client=client, prune=prune, max_workers=4
+        ).run_scan()
+        assert serial["scan_metadata"]["enrichment_over_quota"] > 0
+        assert concurrent["stocks"] == serial["stocks"]
+
+    @patch("scanner.get_stocks_by_sector")
+    def test_stops_cleanly_on_budget_exhausted(self, mock_get_stocks):
+        from fmp_client import BudgetExhausted
+
+        mock_get_stocks.return_value = _universe(40)
+        client = self._client()
+        calls = []
+
+        def history(symbol, **kw):
+            calls.append(symbol)
+            if len(calls) > 10:
+                raise BudgetExhausted("API call budget of 10 reached")
+            return _history(symbol)
+
+        client.get_historical_prices.side_effect = history
+        results = Scanner(client=client, max_workers=4).run_scan()
+        meta = results["scan_metadata"]
+        assert "budget_warning" in meta
+        assert meta["passed_filters"] <= 10
+        # No more work is started once the budget is gone
+        assert len(calls) <= 10 + 4
+
+
+class TestEnrichmentPruning:
+    def _client(self):
+        client = Mock()
+        client.calls_made = 0
+        client.call_budget = 1000
+        client.get_sector_performance.return_value = [
+            {"sector": "Technology", "changesPercentage": "2.35"},
+        ]
+        # Value positioning spreads widely across the universe, so
+        # optimistic bounds separate and the tail can be pruned.
+        client.get_quotes.side_effect = lambda syms: {
+            s: {**_quote(s), "price": 80.0 + int(s[1:]),
+                "yearHigh": 150.0, "yearLow": 80.0}
+            for s in syms
+        }
+        client.get_historical_prices.side_effect = lambda sym, **kw: {
+            "symbol": sym, "historical": [{"high": 160.0}],
+        }
+        return client
+
+    @patch("scanner.get_stocks_by_sector")
+    def test_same_ranking_with_fewer_history_calls(self, mock_get_stocks):
+        mock_get_stocks.return_value = _universe(60)
+        config = {"market_cap_min": 0, "volume_min": 0, "ath_min": 0.0,
+                  "ath_max": 60.0, "top_n": 5}
+        full_client = self._client()
+        full = Scanner(client=full_client, config=config, prune=False)
+        pruned_client = self._client()
+        pruned = Scanner(client=pruned_client, config=config)
+
+        full_result = full.run_scan()
+        pruned_result = pruned.run_scan()
+        assert pruned_result["stocks"] == full_result["stocks"]
+        assert (
+            pruned_client.get_historical_prices.call_count
+            < full_client.get_historical_prices.call_count
+        )
+        assert pruned_result["scan_metadata"]["enrichment_pruned"] > 0
+
+    @patch("scanner.get_stocks_by_sector")
+    def test_concurrent_pruning_same_ranking(self, mock_get_stocks):
+        mock_get_stocks.return_value = _universe(60)
+        config = {"market_cap_min": 0, "volume_min": 0, "ath_min": 0.0,
+                  "ath_max": 60.0, "top_n": 5}
+        serial = Scanner(client=self._client(), config=config).run_scan()
+        concurrent = Scanner(
+            client=self._client(), config=config, max_workers=6
+        ).run_scan()
+        assert concurrent["stocks"] == serial["stocks"]
+
+
+class TestCancellation:
+    @patch("scanner.get_stocks_by_sector")
+    def test_cancel_propagates_out_of_run_scan(self, mock_get_stocks):
+        from fmp_client import ScanCancelled
+
+        mock_get_stocks.return_value = _universe(10)
+        for workers in (1, 4):
+            client = TestConcurrentScan()._client()
+            client.get_historical_prices.side_effect = ScanCancelled("stop")
+            scanner = Scanner(client=client, max_workers=workers)
+            with pytest.raises(ScanCancelled):
+                scanner.run_scan()
+
+    @patch("scanner.get_stocks_by_sector")
+    def test_leaderboard_callback(self, mock_get_stocks):
+        mock_get_stocks.return_value = _universe(10)
+        boards = []
+        Scanner(client=TestConcurrentScan()._client()).run_scan(
+            leaderboard_callback=lambda stocks: boards.append(
+                [s["symbol"] for s in stocks]
+            )
+        )
+        assert boards
+        assert all(len(b) <= 15 for b in boards)
+
+
+class TestIterScan:
+    def _client(self):
+        return TestConcurrentScan()._client()
+
+    @patch("scanner.get_stocks_by_sector")
+    def test_yields_typed_events_ending_in_done(self, mock_get_stocks):
+        from scan_events import (
+            SectorChosen, CandidatePassed, CandidateScored,
+            LeaderboardChanged, ScanDone, Progress,
+        )
+
+        mock_get_stocks.return_value = _universe(12)
+        events = list(Scanner(client=self._client()).iter_scan())
+        kinds = {type(e) for e in events}
+        assert {SectorChosen, CandidatePassed, CandidateScored,
+                LeaderboardChanged, Progress} <= kinds
+        assert isinstance(events[-1], ScanDone)
+        assert sum(isinstance(e, ScanDone) for e in events) == 1
+        sectors = [e for e in events if isinstance(e, SectorChosen)]
+        assert sectors[0].sector == "Technology"
+        passed = [e for e in events if isinstance(e, CandidatePassed)]
+        assert len(passed) == 12
+        assert all(e.bound is not None for e in passed)
+
+    @patch("scanner.get_stocks_by_sector")
+    def test_done_matches_run_scan(self, mock_get_stocks):
+        from scan_events import ScanDone
+
+        mock_get_stocks.return_value = _universe(30)
+        done = list(Scanner(client=self._client()).iter_scan())[-1]
+        assert isinstance(done, ScanDone)
+        result = Scanner(client=self._client()).run_scan()
+        assert done.result["stocks"] == result["stocks"]
+
+    @patch("scanner.get_stocks_by_sector")
+    def test_enrichment_overlaps_quoting(self, mock_get_stocks):
+        import threading
+        from scan_events import CandidateScored
+
+        # 250 symbols = 3 quote batches; hold the last batch until an
+        # enrichment from the first batch has finished.
+        mock_get_stocks.return_value = _universe(250)
+        client = self._client()
+        enriched = threading.Event()
+        quote_batches = []
+
+        def get_quotes(symbols):
+            quote_batches.append(symbols[0])
+            if len(quote_batches) == 3:
+                assert enriched.wait(5)
+            return {s: _quote(s) for s in symbols}
+
+        def history(symbol, **kw):
+            enriched.set()
+            return _history(symbol)
+
+        client.get_quotes.side_effect = get_quotes
+        client.get_historical_prices.side_effect = history
+        events = list(Scanner(client=client, max_workers=3).iter_scan())
+        assert any(isinstance(e, CandidateScored) for e in events)
+        assert len(quote_batches) == 3
+
+    @patch("scanner.get_stocks_by_sector")
+    def test_budget_warning_event(self, mock_get_stocks):
+        from fmp_client import BudgetExhausted
+        from scan_events import BudgetWarning
+
+        mock_get_stocks.return_value = _universe(10)
+        client = self._client()
+        client.get_historical_prices.side_effect = BudgetExhausted("out")
+        events = list(Scanner(client=client).iter_scan())
+        warnings = [e for e in events if isinstance(e, BudgetWarning)]
+        assert len(warnings) == 1
+        assert warnings[0].stage == "enrich"
+        assert events[-1].result["scan_metadata"]["budget_warning"] == "out"
+
+    @patch("scanner.get_stocks_by_sector")
+    def test_budget_warning_emitted_once(self, mock_get_stocks):
+        from fmp_client import BudgetExhausted, QUOTE_BATCH_SIZE
+        from scan_events import BudgetWarning
+
+        mock_get_stocks.return_value = _universe(QUOTE_BATCH_SIZE + 5)
+        client = self._client()
+        first = {f"S{i:03d}": _quote(f"S{i:03d}")
+                 for i in range(QUOTE_BATCH_SIZE)}
+        client.get_quotes.side_effect = [first, BudgetExhausted("quotes")]
+        client.get_historical_prices.side_effect = BudgetExhausted("history")
+        events = list(Scanner(client=client).iter_scan())
+        warnings = [e for e in events if isinstance(e, BudgetWarning)]
+        assert [(w.message, w.stage) for w in warnings] == [
+            ("quotes", "quote")
+        ]
+        meta = events[-1].result["scan_metadata"]
+        assert meta["budget_warning"] == "quotes"
+
+
+class TestScanPlanning:
+    SECTORS = [
+        {"sector": "Technology", "changesPercentage": "3.0"},
+        {"sector": "Energy", "changesPercentage": "2.0"},
+        {"sector": "Healthcare", "changesPercentage": "1.0"},
+    ]
+
+    def _client(self, budget):
+        client = TestConcurrentScan()._client(budget=budget)
+        client.get_sector_performance.return_value = self.SECTORS
+        return client
+
+    @staticmethod
+    def _sector_universe(sector):
+        offset = 40 * [s["sector"] for s in TestScanPlanning.SECTORS].index(
+            sector
+        )
+        return [
+            {"symbol": f"S{offset + i:03d}", "name": f"Stock {i}",
+             "sector": sector}
+            for i in range(40)
+        ]
+
+    @patch("scanner.get_stocks_by_sector")
+    def test_budget_decides_number_of_sectors(self, mock_get_stocks):
+        mock_get_stocks.side_effect = self._sector_universe
+        small = Scanner(client=self._client(60)).run_scan()
+        large = Scanner(client=self._client(200)).run_scan()
+        assert small["scan_metadata"]["plan"]["sectors"] == ["Technology"]
+        assert len(large["scan_metadata"]["plan"]["sectors"]) == 3
+        assert large["scan_metadata"]["total_candidates"] == 120
+
+    @patch("scanner.get_stocks_by_sector")
+    def test_enrichment_stays_within_quota(self, mock_get_stocks):
+        mock_get_stocks.side_effect = self._sector_universe
+        client = self._client(20)
+        results = Scanner(client=client, prune=False).run_scan()
+        meta = results["scan_metadata"]
+        assert meta["plan"]["enrich_quota"] == 19
+        assert client.get_historical_prices.call_count == 19
+        assert meta["enrichment_over_quota"] == 21
+        assert "budget_warning" not in meta
+
+    @patch("scanner.last_session_date", return_value=date(2025, 3, 4))
+    @patch("scanner.get_stocks_by_sector")
+    def test_fresh_symbols_do_not_use_quota(
+        self, mock_get_stocks, _, tmp_path
+    ):
+        mock_get_stocks.side_effect = self._sector_universe
+        index = AthIndex(str(tmp_path / "ath.json"))
+        for i in range(10):
+            index.update(f"S{i:03d}", [{"date": "2025-03-04", "high": 200.0}],
+                         synced_through="2025-03-04")
+        client = self._client(20)
+        results = Scanner(
+            client=client, ath_index=index, prune=False
+        ).run_scan()
+        assert client.get_historical_prices.call_count == 19
+        assert results["scan_metadata"]["enrichment_over_quota"] == 11
+
+    @patch("scanner.get_stocks_by_sector")
+    def test_records_pass_rate(self, mock_get_stocks, tmp_path):
+        from scan_planner import ScanStats
+
+        mock_get_stocks.side_effect = self._sector_universe
+        stats = ScanStats(str(tmp_path / "stats.json"))
+        Scanner(client=self._client(200), stats=stats).run_scan()
+        assert stats.scans == 1
+        assert stats.quick_pass_rate == 1.0
+
+
+class TestInstrumentation:
+    @patch("scanner.get_stocks_by_sector")
+    def test_stage_timings_in_metadata(self, mock_get_stocks):
+        mock_get_stocks.return_value = _universe(30)
+        client = TestConcurrentScan()._client()
+        client.stats.return_value = {"calls": 7}
+        meta = Scanner(client=client, max_workers=3).run_scan()[
+            "scan_metadata"
+        ]
+        assert set(meta["stage_seconds"]) == {
+            "sectors", "plan", "quote", "enrich", "rank"
+        }
+        assert set(meta["stage_busy_seconds"]) == {"quote", "enrich"}
+        assert all(v >= 0 for v in meta["stage_seconds"].values())
+        assert meta["api"] == {"calls": 7}
@@ -1,11 +1,19 @@
+import random
+import numpy as np
 import pytest
 from scoring import (
     calculate_ath,
     calculate_pct_below_ath,
     calculate_upside,
     score_stock,
+    score_batch,
+    stocks_to_columns,
     rank_stocks,
     passes_filters,
+    TopNRanker,
+    SCORE_WEIGHTS,
+    max_upside_pct,
+    score_upper_bound,
 )
 
 
@@ -130,3 +138,139 @@ class TestRankStocks:
         ranked = rank_stocks(stocks, limit=10)
         assert ranked[0]["rank"] == 1
         assert ranked[1]["rank"] == 2
+
+    def test_ties_broken_by_symbol(self):
+        stocks = [
+            {"symbol": "C", "score": 70},
+            {"symbol": "A", "score": 70},
+            {"symbol": "B", "score": 70},
+        ]
+        ranked = rank_stocks(stocks, limit=2)
+        assert [s["symbol"] for s in ranked] == ["A", "B"]
+
+
+class TestTopNRanker:
+    def test_streaming_matches_full_sort(self):
+        rng = random.Random(3)
+        stocks = [
+            {"symbol": f"S{i:03d}", "score": round(rng.uniform(0, 100), 0)}
+            for i in range(300)
+        ]
+        ranker = TopNRanker(limit=15)
+        for stock in stocks:
+            ranker.add(stock)
+        expected = sorted(stocks, key=lambda s: (-s["score"], s["symbol"]))
+        assert [s["symbol"] for s in ranker.ranked()] == [
+            s["symbol"] for s in expected[:15]
+        ]
+        assert ranker.seen == 300
+        assert len(ranker) == 15
+
+    def test_order_independent(self):
+        stocks = [{"symbol": s, "score": 50} for s in "EDCBA"]
+        forward = TopNRanker(limit=3)
+        backward = TopNRanker(limit=3)
+        for stock in stocks:
+            forward.add(dict(stock))
+        for stock in reversed(stocks):
+            backward.add(dict(stock))
+        assert [s["symbol"] for s in forward.ranked()] == ["A", "B", "C"]
+        assert [s["symbol"] for s in backward.ranked()] == ["A", "B", "C"]
+
+    def test_threshold(self):
+        ranker = TopNRanker(limit=2)
+        assert ranker.threshold is None
+        ranker.add({"symbol": "A", "score": 60})
+        assert ranker.threshold is None
+        ranker.add({"symbol": "B", "score": 80})
+        assert ranker.threshold == 60
+        assert ranker.add({"symbol": "C", "score": 70}) is True
+        assert ranker.threshold == 70
+        assert ranker.add({"symbol": "D", "score": 10}) is False
+
+    def test_would_accept(self):
+        ranker = TopNRanker(limit=1)
+        assert ranker.would_accept(0)
+        ranker.add({"symbol": "M", "score": 50})
+        assert ranker.would_accept(51)
+        assert ranker.would_accept(50, "A")
+        assert not ranker.would_accept(50, "Z")
+        assert not ranker.would_accept(49)
+
+
+def _random_stocks(n, seed=7):
+    rng = random.Random(seed)
+    stocks = []
+    for i in range(n):
+        year_low = rng.uniform(10, 200)
+        year_high = year_low * rng.uniform(1.0, 2.5)
+        stocks.append({
+            "symbol": f"S{i}",
+            "price": rng.uniform(year_low, year_high),
+            "yearLow": year_low,
+            "yearHigh": year_high,
+            "volume": rng.uniform(0, 1e7),
+            "avgVolume": rng.choice([0, rng.uniform(1e5, 1e7)]),
+            "ath": year_high * rng.uniform(1.0, 3.0),
+            "sector_performance": rng.uniform(-8, 8),
+        })
+    return stocks
+
+
+def _score_like_scanner(stock, ath_min, ath_max):
+    pct_below = round(calculate_pct_below_ath(stock["price"], stock["ath"]), 1)
+    upside = round(calculate_upside(stock["price"], stock["ath"]), 1)
+    scored = {**stock, "pct_below_ath": pct_below, "upside_pct": upside}
+    return (
+        score_stock(scored),
+        passes_filters(scored, ath_min=ath_min, ath_max=ath_max),
+    )
+
+
+class TestScoreBatch:
+    def test_matches_per_stock_scoring(self):
+        stocks = _random_stocks(500)
+        result = score_batch(stocks_to_columns(stocks), 10.0, 60.0)
+        for i, stock in enumerate(stocks):
+            expected_score, expected_pass = _score_like_scanner(
+                stock, 10.0, 60.0
+            )
+            assert result["score"][i] == pytest.approx(expected_score, abs=0.1)
+            assert bool(result["passes"][i]) == expected_pass
+
+    def test_handles_zero_denominators(self):
+        stock = {"price": 0, "yearHigh": 0, "yearLow": 0, "volume": 0,
+                 "avgVolume": 0, "ath": 0, "sector_performance": 0}
+        result = score_batch(stocks_to_columns([stock]))
+        assert result["pct_below_ath"][0] == 0
+        assert result["value_score"][0] == 50
+        assert result["volume_score"][0] == 50
+        assert not result["passes"][0]
+
+    def test_multiple_weight_variants(self):
+        stocks = _random_stocks(50)
+        variants = [
+            SCORE_WEIGHTS,
+            {"upside": 1.0, "sector": 0.0, "volume": 0.0, "value": 0.0},
+        ]
+        result = score_batch(stocks_to_columns(stocks), weights=variants)
+        assert result["score"].shape == (2, 50)
+        single = score_batch(stocks_to_columns(stocks))
+        np.testing.assert_allclose(result["score"][0], single["score"])
+        np.testing.assert_allclose(
+            result["score"][1], np.clip(np.round(np.minimum(
+                result["upside_pct"], 100), 1), 0, 100)
+        )
+
+
+class TestScoreUpperBound:
+    def test_max_upside_from_ath_max(self):
+        assert max_upside_pct(50.0) == pytest.approx(100.0, abs=0.5)
+        assert max_upside_pct(20.0) == pytest.approx(25.0, abs=0.5)
+        assert max_upside_pct(100.0) == float("inf")
+
+    def test_bound_never_below_enriched_score(self):
+        for stock in _random_stocks(1000, seed=11):
+            score, passes = _score_like_scanner(stock, 10.0, 40.0)
+            if passes:
+                assert score_upper_bound(stock, ath_max=40.0) >= score